@@ -0,0 +1,188 @@
+"""
+Per-request query and timing instrumentation.
+
+``RequestTimingMiddleware`` times a sampled share of requests: total time,
+number and duration of database queries, and time spent rendering the
+response body. Views add their own spans with ``span()``. The figures go
+out as a ``Server-Timing`` header (shown in the browser's network panel)
+and as one JSON log line per request on the ``backend.instrumentation``
+logger. Requests over the query budget are logged as warnings since they
+usually mean an N+1 query crept in. Every request, sampled or not, is also
+counted in backend.metrics.
+"""
+
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_timer', default=None)
+
+
+class RequestTimer:
+    """Query count and named span durations (seconds) of one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.spans = {}
+
+    def add(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    Execute wrapper kept on every connection. It finds the request through
+    the context variable, which (unlike the thread-local connections) also
+    follows async views into the threads that run their ORM calls.
+    """
+    timer = _current.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.queries += 1
+        timer.add('db', time.perf_counter() - start)
+
+
+def install_query_counter(connection):
+    # First in line, so the LIFO pop of temporary execute_wrapper() blocks never removes it
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_query)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    install_query_counter(connection)
+
+
+def current_timer():
+    """The timer of the request being handled, or None outside a timed request"""
+    return _current.get()
+
+
+@contextmanager
+def span(name):
+    """Add the time spent in the block to the current request's ``name`` span"""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+
+def server_timing(timer):
+    """``Server-Timing`` header value, durations in milliseconds"""
+    parts = []
+    for name, seconds in timer.spans.items():
+        part = f"{name};dur={seconds * 1000:.1f}"
+        if name == 'db':
+            part += f';desc="{timer.queries} queries"'
+        parts.append(part)
+    return ', '.join(parts)
+
+
+class RequestTimingMiddleware:
+    """
+    Time ``REQUEST_TIMING_SAMPLE_PERCENT`` percent of requests and flag the
+    ones issuing more than ``REQUEST_QUERY_BUDGET`` queries. Put it first in
+    MIDDLEWARE so the total includes the other middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Connections opened before this module was imported
+        for connection in connections.all(initialized_only=True):
+            install_query_counter(connection)
+        sampled = self.sampled()
+        # Every request feeds the metrics registry; only sampled ones are reported
+        if not (sampled or metrics.enabled):
+            return self.get_response(request)
+
+        timer = RequestTimer()
+        token = _current.set(timer)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timer, time.perf_counter() - start, sampled)
+
+    async def __acall__(self, request):
+        sampled = self.sampled()
+        if not (sampled or metrics.enabled):
+            return await self.get_response(request)
+
+        timer = RequestTimer()
+        token = _current.set(timer)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timer, time.perf_counter() - start, sampled)
+
+    def sampled(self):
+        rate = getattr(settings, 'REQUEST_TIMING_SAMPLE_PERCENT', 0)
+        return rate >= 100 or (rate > 0 and random.random() * 100 < rate)
+
+    def finish(self, request, response, timer, elapsed, sampled):
+        timer.add('total', elapsed)
+        metrics.record_request(request, response, timer)
+        if sampled:
+            response['Server-Timing'] = server_timing(timer)
+            self.log(request, response, timer)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that separately
+        timer = _current.get()
+        if timer is not None:
+            start = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: timer.add('render', time.perf_counter() - start))
+        return response
+
+    def log(self, request, response, timer):
+        match = request.resolver_match
+        budget = getattr(settings, 'REQUEST_QUERY_BUDGET', None)
+        over_budget = budget is not None and timer.queries > budget
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': timer.queries,
+            'over_query_budget': over_budget,
+        }
+        record.update({f"{name}_ms": round(seconds * 1000, 1) for name, seconds in timer.spans.items()})
+        if over_budget:
+            logger.warning('Likely N+1: %s queries (budget %s) %s', timer.queries, budget, json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
@@ -0,0 +1,297 @@
+"""
+Process-local metrics aggregated across workers, in the Prometheus format.
+
+Every worker counts into its own ``MetricsRegistry`` and at most every
+``METRICS_FLUSH_INTERVAL`` seconds writes a snapshot to
+``METRICS_DIR/<pid>-<token>.json``, the token telling apart processes that
+reuse a pid. ``/api/metrics/`` sums the snapshots of all workers on the
+host, so any worker can answer a scrape and no external service is needed.
+Exited workers' counts are folded into ``dead.json`` (on exit, or by the
+next scrape for workers that were killed) and their files removed, which
+keeps the counters monotonic when gunicorn recycles workers without
+leaving a file per worker ever started.
+"""
+
+import atexit
+import bisect
+import glob
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots of exited workers are kept as they are
+    fcntl = None
+
+from django.conf import settings
+from django.http import HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# name -> (type, help)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests handled, by view, method and status'),
+    'http_request_duration_seconds': ('histogram', 'Request latency by view'),
+    'db_queries_total': ('counter', 'Database queries issued, by view'),
+    'like_toggles_total': ('counter', 'Likes and unlikes recorded, by target type'),
+    'feed_cache_requests_total': ('counter', 'Feed page cache lookups, by result'),
+    'leaderboard_cache_requests_total': ('counter', 'Leaderboard cache lookups, by result'),
+    'live_events_total': ('counter', 'Server-sent events delivered on /api/live/, by event'),
+    'live_clients_dropped_total': ('counter', 'Live update clients disconnected for not reading'),
+}
+
+# Derived gauge -> the hit/miss counter it is computed from
+HIT_RATIOS = {
+    'feed_cache_hit_ratio': 'feed_cache_requests_total',
+    'leaderboard_cache_hit_ratio': 'leaderboard_cache_requests_total',
+}
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None) or os.path.join(tempfile.gettempdir(), 'playto-metrics')
+
+
+def label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def read_snapshot(path):
+    """A snapshot file's contents, or None if it is unreadable or was removed meanwhile"""
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        # Gone, or from a worker killed mid-write
+        return None
+
+
+def merge(snapshot, counters, histograms):
+    """Add a snapshot's counters and histograms into ``counters`` and ``histograms``"""
+    for name, labels, value in snapshot['counters']:
+        counters[(name, tuple(map(tuple, labels)))] += value
+    for name, labels, values in snapshot['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        if key in histograms:
+            histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+        else:
+            histograms[key] = values
+
+
+def write_snapshot(directory, path, snapshot):
+    """Replace ``path`` atomically, so readers never see a partial file"""
+    with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as handle:
+        json.dump(snapshot, handle)
+    os.replace(handle.name, path)
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def snapshot_pid(path):
+    """The pid in a worker snapshot's file name, None for dead.json and foreign files"""
+    name = os.path.basename(path).split('-', 1)[0].removesuffix('.json')
+    return int(name) if name.isdigit() else None
+
+
+def retire(directory, paths):
+    """
+    Fold the snapshots at ``paths`` into dead.json and remove them, under a
+    lock so concurrent scrapes or exiting workers count each file once
+    """
+    if fcntl is None or not paths:
+        return
+    try:
+        with open(os.path.join(directory, 'dead.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead_path = os.path.join(directory, 'dead.json')
+            counters, histograms = defaultdict(float), {}
+            retired = []
+            for path in [dead_path, *paths]:
+                snapshot = read_snapshot(path)
+                if snapshot is not None:
+                    merge(snapshot, counters, histograms)
+                    retired.append(path)
+            write_snapshot(directory, dead_path, {
+                'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+                'histograms': [[name, labels, values] for (name, labels), values in histograms.items()],
+            })
+            for path in retired:
+                if path != dead_path:
+                    os.remove(path)
+    except OSError:
+        pass
+
+
+class MetricsRegistry:
+    """Counters and latency histograms of this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        # (name, labels) -> per-bucket counts (last one is +Inf) followed by the sum
+        self.histograms = {}
+        self.last_flush = time.monotonic()
+        self.pid = self.token = None
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'METRICS_ENABLED', True)
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[(name, label_key(labels))] += value
+        self.maybe_flush()
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.setdefault(
+                (name, label_key(labels)), [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+            )
+            histogram[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+            histogram[-1] += value
+        self.maybe_flush()
+
+    def record_request(self, request, response, timer):
+        """Count one request timed by backend.instrumentation"""
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        self.inc('http_requests_total', view=view, method=request.method, status=response.status_code)
+        self.inc('db_queries_total', timer.queries, view=view)
+        self.observe('http_request_duration_seconds', timer.spans['total'], view=view)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, values] for (name, labels), values in self.histograms.items()],
+            }
+
+    def snapshot_path(self):
+        if self.pid != os.getpid():
+            # New after a fork too, so a reused pid never overwrites another worker's file
+            self.pid, self.token = os.getpid(), uuid.uuid4().hex[:12]
+        return os.path.join(metrics_dir(), f"{self.pid}-{self.token}.json")
+
+    def flush(self):
+        """Write this worker's snapshot; metrics must never fail a request, so errors are swallowed"""
+        self.last_flush = time.monotonic()
+        directory = metrics_dir()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            write_snapshot(directory, self.snapshot_path(), self.snapshot())
+        except OSError:
+            pass
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush >= getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+            self.flush()
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def collect(self):
+        """Counters and histograms summed over every worker's latest snapshot"""
+        self.flush()
+        directory = metrics_dir()
+        if fcntl is not None:
+            # Workers that died without running their exit hook (os.kill probes are POSIX only)
+            paths = glob.glob(os.path.join(directory, '*.json'))
+            retire(directory, [path for path in paths if snapshot_pid(path) and not pid_alive(snapshot_pid(path))])
+        counters = defaultdict(float)
+        histograms = {}
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            snapshot = read_snapshot(path)
+            if snapshot is not None:
+                merge(snapshot, counters, histograms)
+        return counters, histograms
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(counters, histograms):
+    """Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+            continue
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), values[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {format_value(values[-1])}")
+            lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+
+    for name, source in HIT_RATIOS.items():
+        results = defaultdict(float)
+        for (metric, labels), value in counters.items():
+            if metric == source:
+                results[dict(labels).get('result')] += value
+        lookups = results['hit'] + results['miss']
+        lines += [f"# HELP {name} Share of {source} that were hits", f"# TYPE {name} gauge"]
+        lines.append(f"{name} {format_value(results['hit'] / lookups if lookups else 0)}")
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Scrapers must send METRICS_TOKEN as
+    ``Authorization: Bearer <token>``; without a token it only answers with
+    DEBUG on.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token and not settings.DEBUG:
+        return HttpResponse('Set METRICS_TOKEN to enable scraping\n', status=403, content_type='text/plain')
+    if token and not hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(), f"Bearer {token}".encode()
+    ):
+        return HttpResponse('Unauthorized\n', status=401, content_type='text/plain')
+    return HttpResponse(render(*metrics.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+metrics = MetricsRegistry()
+
+
+@atexit.register
+def flush_on_exit():
+    # Keep the last few seconds of counts; processes that counted nothing leave no file
+    if metrics.counters or metrics.histograms:
+        metrics.flush()
+        retire(metrics_dir(), [metrics.snapshot_path()])
@@ -0,0 +1,151 @@
+"""
+Read replica routing.
+
+When ``REPLICA_DATABASE_URL`` is set, settings add a ``replica`` database
+and name it in ``READ_REPLICA_ALIAS``. ``ReplicaRouter`` sends reads there
+only inside ``replica_reads()`` blocks. The read-heavy views open one for
+safe requests: the feed, the leaderboard, and post/comment list and detail
+(``ReplicaReadsMixin`` for DRF views). Writes and every other read go to
+the primary. The block lives in a context variable, so it also covers the
+threads async views hand their ORM calls to.
+
+Replicas lag behind the primary. ``ReplicaPinMiddleware`` answers every
+unsafe request with a short-lived cookie. For ``READ_REPLICA_PIN_SECONDS``
+after a write, that client's requests read from the primary, so it sees its
+own changes. The cookie is ``SameSite=None; Secure`` over HTTPS so that a
+frontend on another site still sends it with its credentialed requests.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'read_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replica_alias():
+    """The replica's database alias, or None when reads all go to the primary"""
+    alias = getattr(settings, 'READ_REPLICA_ALIAS', None)
+    if alias and mirrors_primary(alias):
+        # A test mirror: the primary's own connection also sees its open transaction
+        return None
+    return alias
+
+
+def mirrors_primary(alias):
+    """Whether ``alias`` is another connection to the primary's database, as test mirrors are"""
+    if alias == DEFAULT_DB_ALIAS or alias not in connections:
+        return False
+    keys = ('ENGINE', 'HOST', 'PORT', 'NAME')
+    replica, primary = connections[alias].settings_dict, connections[DEFAULT_DB_ALIAS].settings_dict
+    return all(replica.get(key) == primary.get(key) for key in keys)
+
+
+def primary_pinned(request):
+    """Whether the client wrote recently enough that it must read its own writes from the primary"""
+    if not replica_alias():
+        return False
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def use_replica(request):
+    """Whether a replica-eligible view may read from the replica for this request"""
+    return bool(replica_alias()) and request.method in SAFE_METHODS and not primary_pinned(request)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Route the reads in this block to the replica (when one is configured)"""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def reading_replica():
+    """Whether reads made here go to the replica"""
+    return _replica_reads.get() and bool(replica_alias())
+
+
+class ReplicaRouter:
+    """Replica for reads inside replica_reads(), the primary for everything else"""
+
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if not alias:
+            return None
+        return alias if _replica_reads.get() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Instances loaded from the replica are saved to the primary
+        return DEFAULT_DB_ALIAS if replica_alias() else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same rows
+        return True if replica_alias() else None
+
+
+class ReplicaReadsMixin:
+    """
+    DRF view mixin: once the request is authenticated, safe requests to
+    ``replica_actions`` (every action when None) read from the replica,
+    unless the client is pinned to the primary
+    """
+    replica_actions = None
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _replica_reads.set(False)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        action = getattr(self, 'action', None)
+        if use_replica(request) and (self.replica_actions is None or action in self.replica_actions):
+            _replica_reads.set(True)
+
+
+class ReplicaPinMiddleware:
+    """Pin clients to the primary for READ_REPLICA_PIN_SECONDS after any unsafe request"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.pin(request, await self.get_response(request))
+
+    def pin(self, request, response):
+        if replica_alias() and request.method not in SAFE_METHODS:
+            seconds = getattr(settings, 'READ_REPLICA_PIN_SECONDS', 5)
+            secure = settings.SESSION_COOKIE_SECURE
+            # The expiry is also checked server-side, for clients that keep cookies too long.
+            # The frontend may be another site (onrender.com subdomains are), so over HTTPS
+            # the cookie must be SameSite=None for its credentialed requests to carry it
+            response.set_cookie(
+                PIN_COOKIE, f"{time.time() + seconds:.3f}", max_age=seconds,
+                secure=secure, httponly=True, samesite='None' if secure else 'Lax',
+            )
+        return response
@@ -40,11 +40,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.instrumentation.RequestTimingMiddleware',  # First, so its total covers the others
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Add whitenoise
+    'backend.middleware.AsyncWhiteNoiseMiddleware',  # Whitenoise, usable under ASGI too
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'backend.replicas.ReplicaPinMiddleware',  # Read-your-writes with a read replica
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -77,7 +79,8 @@ if os.environ.get('DATABASE_URL'):
     DATABASES = {
         'default': dj_database_url.config(
             default=os.environ.get('DATABASE_URL'),
-            conn_max_age=600,
+            # Use 0 under ASGI, where every request runs its queries in a new thread
+            conn_max_age=int(os.environ.get('CONN_MAX_AGE', 600)),
             conn_health_checks=True,
         )
     }
@@ -86,9 +89,138 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # Take the write lock when a transaction starts so concurrent
+                # writers wait for each other instead of failing to upgrade
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+            # A file (not shared memory) so concurrent test threads can write
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
         }
     }
 
+# Optional read replica (a Postgres standby, or for local testing a second
+# SQLite file kept up to date with `manage.py sync_replica`). The feed,
+# leaderboard and post/comment list and detail views read from it; writes,
+# and a client's reads for READ_REPLICA_PIN_SECONDS after it writes, use the
+# primary. See backend/replicas.py.
+if os.environ.get('REPLICA_DATABASE_URL'):
+    DATABASES['replica'] = dj_database_url.config(
+        env='REPLICA_DATABASE_URL',
+        conn_max_age=int(os.environ.get('CONN_MAX_AGE', 600)),
+        conn_health_checks=True,
+    )
+    # Tests use the primary's test database, which the router then reads directly
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+READ_REPLICA_ALIAS = 'replica' if 'replica' in DATABASES else None
+READ_REPLICA_PIN_SECONDS = float(os.environ.get('READ_REPLICA_PIN_SECONDS', 5))
+DATABASE_ROUTERS = ['backend.replicas.ReplicaRouter']
+
+# Cache
+# Local memory per worker by default; point REDIS_URL at a shared Redis to share across workers
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Serialized post/comment fragments never change once written, so every
+# worker keeps its own bounded copy; when full, the least recently used
+# 1% of entries is evicted
+CACHES['fragments'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'fragments',
+    'OPTIONS': {
+        'MAX_ENTRIES': int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 20000)),
+        'CULL_FREQUENCY': 100,
+    },
+}
+FRAGMENT_CACHE_ALIAS = 'fragments'
+# Bounds how long a renamed author shows up under the old name
+FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', 600))
+
+# Leaderboard response cache (seconds), served from the cache alias below
+LEADERBOARD_CACHE_TTL = int(os.environ.get('LEADERBOARD_CACHE_TTL', 30))
+LEADERBOARD_CACHE_ALIAS = 'default'
+
+# Rendered feed pages; writes invalidate the affected pages straight away,
+# the TTL only bounds how stale author karma shown inside a page can get
+FEED_CACHE_TTL = int(os.environ.get('FEED_CACHE_TTL', 60))
+FEED_CACHE_ALIAS = 'default'
+# Invalidation bumps version tokens in that cache, which only works when every
+# worker and `process_like_events` share it: with per-process local memory the
+# other workers would keep serving stale pages for up to the TTL. So pages are
+# only cached with REDIS_URL set, unless forced on (e.g. for a single process)
+FEED_CACHE_ENABLED = os.environ.get('FEED_CACHE_ENABLED', str(bool(os.environ.get('REDIS_URL')))).lower() == 'true'
+# 'values' builds feed pages from values() rows; 'serializers' uses PostSerializer
+FEED_ENGINE = os.environ.get('FEED_ENGINE', 'values')
+
+# Serve /api/feed/ and /api/leaderboard/ with their async views; only useful
+# when running the ASGI application (see DEPLOYMENT.md)
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', 'False').lower() == 'true'
+
+# Live updates (/api/live/, ASGI only): seconds between pushes of coalesced
+# like counts, between full re-reads of every watched count (which carries
+# changes made in other processes), and between leaderboard recomputations;
+# how long a client may leave updates unread before it is dropped, and how
+# many clients one process serves
+LIVE_UPDATES_INTERVAL = float(os.environ.get('LIVE_UPDATES_INTERVAL', 0.25))
+LIVE_UPDATES_RESYNC = float(os.environ.get('LIVE_UPDATES_RESYNC', 10))
+LIVE_LEADERBOARD_INTERVAL = float(os.environ.get('LIVE_LEADERBOARD_INTERVAL', 2))
+LIVE_UPDATES_MAX_STALL = float(os.environ.get('LIVE_UPDATES_MAX_STALL', 15))
+LIVE_UPDATES_MAX_CLIENTS = int(os.environ.get('LIVE_UPDATES_MAX_CLIENTS', 1000))
+
+# Like events: apply counter/karma updates inside the request (False) or leave
+# them to `manage.py process_like_events --loop` (True)
+LIKE_EVENTS_ASYNC = os.environ.get('LIKE_EVENTS_ASYNC', 'False').lower() == 'true'
+# Processed events are kept one by one for this many days, then rolled up per
+# author and object by `manage.py compact_like_events` (run it daily)
+LIKE_EVENTS_RETENTION_DAYS = float(os.environ.get('LIKE_EVENTS_RETENTION_DAYS', 7))
+# Hourly karma buckets older than the 24h leaderboard window plus this margin
+# are deleted by `manage.py prune_karma_buckets` (run it daily)
+KARMA_BUCKET_MARGIN_HOURS = int(os.environ.get('KARMA_BUCKET_MARGIN_HOURS', 24))
+
+# Request instrumentation: percentage of requests timed (Server-Timing header
+# and a JSON log line), and the query count above which a request is logged
+# as a likely N+1 regression
+REQUEST_TIMING_SAMPLE_PERCENT = float(os.environ.get('REQUEST_TIMING_SAMPLE_PERCENT', 100 if DEBUG else 0))
+REQUEST_QUERY_BUDGET = int(os.environ.get('REQUEST_QUERY_BUDGET', 20))
+
+# Metrics for /api/metrics/ (Prometheus text format). Each worker writes its
+# counts to METRICS_DIR every METRICS_FLUSH_INTERVAL seconds and a scrape sums
+# them. Scrapes must send "Authorization: Bearer <METRICS_TOKEN>"; without a
+# token the endpoint only answers with DEBUG on
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'backend.instrumentation': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -1,9 +1,17 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from feed.views import PostViewSet, CommentViewSet, FeedView
-from leaderboard.views import LeaderboardView
+from feed.views import PostViewSet, CommentViewSet, FeedView, AsyncFeedView, BulkLikeView, LiveUpdatesView
+from leaderboard.views import LeaderboardView, AsyncLeaderboardView
 from users.views import RegisterView, LoginView, LogoutView, CurrentUserView
+from .metrics import metrics_view
+
+# The read-heavy endpoints have async twins for ASGI deployments
+if settings.ASYNC_READ_VIEWS:
+    feed_view, leaderboard_view = AsyncFeedView.as_view(), AsyncLeaderboardView.as_view()
+else:
+    feed_view, leaderboard_view = FeedView.as_view(), LeaderboardView.as_view()
 
 router = DefaultRouter()
 router.register(r'posts', PostViewSet)
@@ -12,8 +20,11 @@ router.register(r'comments', CommentViewSet)
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include(router.urls)),
-    path('api/feed/', FeedView.as_view(), name='feed'),
-    path('api/leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    path('api/feed/', feed_view, name='feed'),
+    path('api/likes/bulk/', BulkLikeView.as_view(), name='bulk_like'),
+    path('api/leaderboard/', leaderboard_view, name='leaderboard'),
+    path('api/live/', LiveUpdatesView.as_view(), name='live'),
+    path('api/metrics/', metrics_view, name='metrics'),
     
     # Auth endpoints
     path('api/auth/register/', RegisterView.as_view(), name='register'),
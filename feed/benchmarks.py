@@ -0,0 +1,117 @@
+import statistics
+import time
+import tracemalloc
+
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .models import Post, Comment
+
+# Maximum queries per request, measured with cold caches. Like toggles count
+# their savepoints and the outbox/counter/karma/bucket writes. Raising one of
+# these should be a deliberate decision made in review, never a drive-by.
+QUERY_BUDGETS = {
+    'feed_anonymous': 3,
+    'feed_authenticated': 4,
+    'feed_stream': 4,
+    'posts_list': 5,
+    'posts_retrieve': 4,
+    'comments_list': 3,
+    'comments_thread': 3,
+    'post_like': 12,
+    'comment_like': 13,
+    'leaderboard': 1,
+}
+
+
+def scenarios(user):
+    """
+    ``(name, method, path, authenticated)`` for every benchmarked endpoint,
+    aimed at the busiest post and comment so nested data is exercised.
+    """
+    post = Post.objects.order_by('-comment_count', 'id').first()
+    comment = Comment.objects.filter(post=post).order_by('-reply_count', 'id').first() if post else None
+    if post is None or comment is None:
+        raise ValueError('Benchmarks need at least one post with a comment')
+    return [
+        ('feed_anonymous', 'get', '/api/feed/', False),
+        ('feed_authenticated', 'get', '/api/feed/', True),
+        ('feed_stream', 'get', '/api/feed/?stream=1&page_size=50', True),
+        ('posts_list', 'get', '/api/posts/', True),
+        ('posts_retrieve', 'get', f'/api/posts/{post.id}/', True),
+        ('comments_list', 'get', f'/api/comments/?post_id={post.id}', True),
+        ('comments_thread', 'get', f'/api/comments/thread/?post_id={post.id}', True),
+        # Likes toggle, so an even number of runs leaves the data unchanged
+        ('post_like', 'post', f'/api/posts/{post.id}/like/', True),
+        ('comment_like', 'post', f'/api/comments/{comment.id}/like/', True),
+        ('leaderboard', 'get', '/api/leaderboard/', False),
+    ]
+
+
+def clear_caches():
+    for alias in ('default', 'fragments'):
+        caches[alias].clear()
+
+
+def request(client, method, path):
+    response = getattr(client, method)(path, secure=True, HTTP_HOST='localhost')
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def run_benchmarks(user, repeat=5, memory=True, budgets=QUERY_BUDGETS):
+    """
+    Measure every scenario with cold caches: query count, median and best
+    wall time over ``repeat`` runs and (if ``memory``) the tracemalloc peak
+    of one extra run. Returns a JSON-ready dict including the scenarios
+    that went over their query budget under ``regressions``.
+    """
+    anonymous, authenticated = APIClient(), APIClient()
+    authenticated.force_authenticate(user)
+    results = {}
+    for name, method, path, needs_user in scenarios(user):
+        client = authenticated if needs_user else anonymous
+        timings, queries, status = [], None, None
+        for _ in range(repeat):
+            clear_caches()
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = request(client, method, path)
+                timings.append(time.perf_counter() - start)
+            status = response.status_code
+            queries = len(ctx.captured_queries) if queries is None else max(queries, len(ctx.captured_queries))
+
+        result = {
+            'path': path,
+            'status': status,
+            'queries': queries,
+            'budget': budgets.get(name),
+            'ms_median': round(statistics.median(timings) * 1000, 2),
+            'ms_best': round(min(timings) * 1000, 2),
+        }
+        if memory:
+            clear_caches()
+            tracemalloc.start()
+            request(client, method, path)
+            result['peak_kib'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            tracemalloc.stop()
+        results[name] = result
+
+    regressions = [
+        name for name, result in results.items()
+        if result['status'] >= 400 or (result['budget'] is not None and result['queries'] > result['budget'])
+    ]
+    return {'results': results, 'regressions': regressions}
+
+
+def dataset_summary():
+    return {
+        'posts': Post.objects.count(),
+        'comments': Comment.objects.count(),
+        'max_depth': Comment.objects.order_by('-depth').values_list('depth', flat=True).first() or 0,
+        'max_replies': Comment.objects.annotate(n=Count('replies')).order_by('-n').values_list('n', flat=True).first() or 0,
+    }
@@ -0,0 +1,126 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from backend.metrics import metrics
+
+
+class FeedPageCache:
+    """
+    Serialized feed pages, shared by every visitor.
+
+    Pages are stored as rendered for an anonymous user together with the
+    version tokens of what they were built from: a global generation, the
+    "head" of the feed (for the first page only, which is the only page a new
+    post can land on) and every post on the page. Writes bump just the
+    tokens they affect (see feed/signals.py), and a page whose recorded
+    tokens no longer match is treated as a miss. Serving a hit costs two
+    cache round trips and no queries.
+
+    Version tokens must be seen by every process that writes, so with
+    FEED_CACHE_ENABLED off (the default without a shared cache) nothing is
+    cached and every request renders its page.
+    """
+    GENERATION = 'generation'
+    HEAD = 'head'
+
+    def __init__(self, prefix, ttl, alias='default', metric=None):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.alias = alias
+        self.metric = metric
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'FEED_CACHE_ENABLED', True)
+
+    def version_key(self, name):
+        return f"{self.prefix}:v:{name}"
+
+    def post_version(self, post_id):
+        return f"post:{post_id}"
+
+    def page_key(self, cursor, page_size):
+        return f"{self.prefix}:page:{cursor or 'head'}:{page_size}"
+
+    def get(self, cursor, page_size):
+        """Return the cached ``{'results', 'next'}`` page if it is still current, else None"""
+        if not self.enabled:
+            return None
+        entry = self.cache.get(self.page_key(cursor, page_size))
+        if entry is not None and self.cache.get_many(list(entry['versions'])) == entry['versions']:
+            self.count('hits')
+            if self.metric:
+                metrics.inc(self.metric, result='hit')
+            return entry
+        self.count('misses')
+        if self.metric:
+            metrics.inc(self.metric, result='miss')
+        return None
+
+    def set(self, cursor, page_size, results, next_cursor):
+        """
+        Store a freshly rendered page. A write that commits between the
+        page's queries and this call can go unnoticed until the TTL expires
+        or the next write to the same posts.
+        """
+        if not self.enabled:
+            return
+        names = [self.GENERATION] + ([] if cursor else [self.HEAD])
+        names += [self.post_version(post['id']) for post in results]
+        entry = {'results': results, 'next': next_cursor, 'versions': self.current_versions(names)}
+        self.cache.set(self.page_key(cursor, page_size), entry, self.ttl)
+
+    def current_versions(self, names):
+        """Version tokens for ``names``, creating the ones not seen yet"""
+        keys = [self.version_key(name) for name in names]
+        versions = self.cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # add() keeps a token a concurrent writer may have just set
+                token = uuid.uuid4().hex
+                if not self.cache.add(key, token, timeout=None):
+                    token = self.cache.get(key)
+                versions[key] = token
+        return versions
+
+    def bump(self, names):
+        """Give ``names`` new tokens, orphaning every page built from the old ones"""
+        self.cache.set_many({self.version_key(name): uuid.uuid4().hex for name in names}, timeout=None)
+
+    def invalidate_posts(self, post_ids):
+        self.bump([self.post_version(post_id) for post_id in set(post_ids)])
+
+    def invalidate_head(self):
+        self.bump([self.HEAD])
+
+    def invalidate_all(self):
+        self.bump([self.GENERATION])
+
+    def count(self, name):
+        key = f"{self.prefix}:stats:{name}"
+        self.cache.add(key, 0, timeout=None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # Evicted between add() and incr(); losing one count is fine
+            pass
+
+    def stats(self):
+        """Hit and miss counts since the cache was last cleared"""
+        names = ['hits', 'misses']
+        counts = self.cache.get_many([f"{self.prefix}:stats:{name}" for name in names])
+        return {name: counts.get(f"{self.prefix}:stats:{name}", 0) for name in names}
+
+
+feed_cache = FeedPageCache(
+    'feed',
+    ttl=getattr(settings, 'FEED_CACHE_TTL', 60),
+    alias=getattr(settings, 'FEED_CACHE_ALIAS', 'default'),
+    metric='feed_cache_requests_total',
+)
@@ -0,0 +1,106 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Post, Comment, Like
+
+_counter_signals_suppressed = ContextVar('counter_signals_suppressed', default=False)
+
+
+@contextmanager
+def suppress_counter_signals():
+    """
+    Skip the per-row comment counter and feed cache receivers in
+    feed/signals.py during bulk deletes that rebuild counters afterwards.
+    """
+    token = _counter_signals_suppressed.set(True)
+    try:
+        yield
+    finally:
+        _counter_signals_suppressed.reset(token)
+
+
+def counter_signals_suppressed():
+    return _counter_signals_suppressed.get()
+
+
+def adjust_like_count(model, object_id, delta):
+    """Atomically shift the stored like counter of one post or comment"""
+    model.objects.filter(pk=object_id).update(like_count=F('like_count') + delta)
+
+
+def adjust_like_counts(model, deltas):
+    """
+    Atomically shift the like counters of many posts or comments with one
+    UPDATE; ``deltas`` maps object id to the change.
+    """
+    deltas = {object_id: delta for object_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    if len(deltas) == 1:
+        (object_id, delta), = deltas.items()
+        return adjust_like_count(model, object_id, delta)
+    shift = Case(
+        *[When(pk=object_id, then=Value(delta)) for object_id, delta in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    model.objects.filter(pk__in=deltas).update(like_count=F('like_count') + shift)
+
+
+def adjust_comment_count(post_id, delta):
+    """Atomically shift the stored comment counter of one post"""
+    Post.objects.filter(pk=post_id).update(comment_count=F('comment_count') + delta)
+
+
+def adjust_reply_count(comment_id, delta):
+    """Atomically shift the stored direct-reply counter of one comment"""
+    Comment.objects.filter(pk=comment_id).update(reply_count=F('reply_count') + delta)
+
+
+def _count_subquery(queryset, group_field):
+    counts = queryset.order_by().values(group_field).annotate(total=Count('id')).values('total')
+    return Coalesce(Subquery(counts[:1]), Value(0))
+
+
+def rebuild_counters(post_ids=None, comment_ids=None):
+    """
+    Recompute stored counters from the Like and Comment tables.
+
+    Runs one set-based UPDATE per table, optionally restricted to the given
+    ids. Returns the number of posts and comments rewritten.
+    """
+    post_content_type = ContentType.objects.get_for_model(Post)
+    comment_content_type = ContentType.objects.get_for_model(Comment)
+
+    posts = Post.objects.all()
+    if post_ids is not None:
+        posts = posts.filter(pk__in=post_ids)
+    posts_updated = posts.update(
+        like_count=_count_subquery(
+            Like.objects.filter(content_type=post_content_type, object_id=OuterRef('pk')),
+            'object_id',
+        ),
+        comment_count=_count_subquery(
+            Comment.objects.filter(post_id=OuterRef('pk')),
+            'post_id',
+        ),
+    )
+
+    comments = Comment.objects.all()
+    if comment_ids is not None:
+        comments = comments.filter(pk__in=comment_ids)
+    comments_updated = comments.update(
+        like_count=_count_subquery(
+            Like.objects.filter(content_type=comment_content_type, object_id=OuterRef('pk')),
+            'object_id',
+        ),
+        reply_count=_count_subquery(
+            Comment.objects.filter(parent_id=OuterRef('pk')),
+            'parent_id',
+        ),
+    )
+    return posts_updated, comments_updated
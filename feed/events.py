@@ -0,0 +1,185 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import Max, OuterRef, Subquery, Sum
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .counters import adjust_like_counts
+from .models import Post, Comment, LikeEvent
+from users.models import UserProfile
+from leaderboard.models import KarmaBucket
+from backend.metrics import metrics
+
+# Karma earned by the author of the liked object
+KARMA_PER_LIKE = {Post: 5, Comment: 1}
+
+# Sent by apply_like_events with the liked model as sender and the
+# ``object_ids`` whose stored like counters it changed
+like_counts_changed = Signal()
+
+
+def events_are_async():
+    """When False (the default) events are applied inside the request that records them"""
+    return getattr(settings, 'LIKE_EVENTS_ASYNC', False)
+
+
+def build_like_event(model, object_id, author_id, liked_at, delta):
+    """Unsaved event for a like (+1) or unlike (-1) on a post or comment"""
+    return LikeEvent(
+        author_id=author_id,
+        content_type=ContentType.objects.get_for_model(model),
+        object_id=object_id,
+        delta=delta,
+        karma=KARMA_PER_LIKE[model] * delta,
+        liked_at=liked_at,
+    )
+
+
+def record_like_events(events):
+    """
+    Append events to the outbox in one insert.
+
+    In synchronous mode the events are applied straight away in the caller's
+    transaction; otherwise they wait for ``manage.py process_like_events``.
+    """
+    if not events:
+        return events
+    if not events_are_async():
+        now = timezone.now()
+        for event in events:
+            event.processed_at = now
+    if len(events) == 1:
+        events[0].save()
+    else:
+        LikeEvent.objects.bulk_create(events)
+    if not events_are_async():
+        apply_like_events(events)
+    for event in events:
+        metrics.inc(
+            'like_toggles_total',
+            target=ContentType.objects.get_for_id(event.content_type_id).model,
+            action='like' if event.delta > 0 else 'unlike',
+        )
+    return events
+
+
+def record_like_event(target, liked_at, delta):
+    """Append (and in synchronous mode apply) one event for a post or comment"""
+    event = build_like_event(type(target), target.pk, target.author_id, liked_at, delta)
+    return record_like_events([event])[0]
+
+
+def apply_like_events(events):
+    """
+    Apply a batch of events, coalescing everything that touches the same row:
+    one UPDATE per liked model, one per author and one per leaderboard bucket,
+    no matter how many events the batch holds.
+    """
+    like_counts = defaultdict(lambda: defaultdict(int))
+    karma = defaultdict(int)
+    buckets = defaultdict(lambda: [0, 0, 0])
+
+    for event in events:
+        model = ContentType.objects.get_for_id(event.content_type_id).model_class()
+        like_counts[model][event.object_id] += event.delta
+        karma[event.author_id] += event.karma
+        bucket = buckets[(event.author_id, KarmaBucket.bucket_for(event.liked_at))]
+        bucket[0] += event.karma
+        bucket[1 if model is Post else 2] += event.delta
+
+    for model, deltas in like_counts.items():
+        adjust_like_counts(model, deltas)
+        like_counts_changed.send(sender=model, object_ids=list(deltas))
+    for author_id, delta in karma.items():
+        if delta:
+            UserProfile.adjust_karma(author_id, delta)
+    for (author_id, hour), (bucket_karma, post_likes, comment_likes) in buckets.items():
+        if bucket_karma or post_likes or comment_likes:
+            KarmaBucket.record(author_id, hour, bucket_karma, post_likes=post_likes, comment_likes=comment_likes)
+
+
+def process_pending_events(batch_size=500):
+    """
+    Drain one batch of unprocessed events; returns how many were applied.
+    Concurrent workers skip each other's locked rows where the database
+    supports it.
+    """
+    with transaction.atomic():
+        pending = LikeEvent.objects.filter(processed_at__isnull=True).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        events = list(pending[:batch_size])
+        if not events:
+            return 0
+        apply_like_events(events)
+        LikeEvent.objects.filter(id__in=[event.id for event in events]).update(processed_at=timezone.now())
+    return len(events)
+
+
+def seed_like_events(likes, batch_size=1000):
+    """
+    Record one processed +1 event for every like in the ``likes`` queryset,
+    for likes written without going through the event path (bulk imports).
+    Authors are resolved in SQL and events inserted in batches. Returns the
+    number of events written.
+    """
+    now = timezone.now()
+    written = 0
+    for model, karma in KARMA_PER_LIKE.items():
+        content_type = ContentType.objects.get_for_model(model)
+        rows = likes.filter(content_type=content_type).annotate(
+            author_id=Subquery(model.objects.filter(pk=OuterRef('object_id')).values('author_id')[:1])
+        ).order_by().values_list('author_id', 'object_id', 'created_at')
+
+        batch = []
+        for author_id, object_id, created_at in rows.iterator(chunk_size=batch_size):
+            if author_id is None:
+                continue
+            batch.append(LikeEvent(
+                author_id=author_id, content_type=content_type, object_id=object_id,
+                delta=1, karma=karma, liked_at=created_at, processed_at=now,
+            ))
+            if len(batch) >= batch_size:
+                written += len(LikeEvent.objects.bulk_create(batch))
+                batch = []
+        written += len(LikeEvent.objects.bulk_create(batch))
+    return written
+
+
+def compact_like_events(before=None, batch_size=1000):
+    """
+    Roll processed events older than ``before`` (default: now minus
+    LIKE_EVENTS_RETENTION_DAYS) up into one processed event per author and
+    liked post or comment, carrying the net delta and karma, and delete the
+    originals. Sums per author and per object are unchanged, so karma
+    rebuilt from the ledger stays the same, but the table grows with the
+    content that was liked rather than with like traffic. Pending events are
+    never touched. Returns ``(events deleted, events written)``.
+    """
+    if before is None:
+        before = timezone.now() - timedelta(days=getattr(settings, 'LIKE_EVENTS_RETENTION_DAYS', 7))
+    old = LikeEvent.objects.filter(processed_at__lt=before)
+    authors = list(old.order_by('author_id').values_list('author_id', flat=True).distinct())
+    deleted = written = 0
+    now = timezone.now()
+    for start in range(0, len(authors), batch_size):
+        with transaction.atomic():
+            batch = old.filter(author_id__in=authors[start:start + batch_size])
+            rows = batch.order_by().values('author_id', 'content_type_id', 'object_id').annotate(
+                net_delta=Sum('delta'), net_karma=Sum('karma'), last_liked_at=Max('liked_at'),
+            )
+            rollups = [
+                LikeEvent(
+                    author_id=row['author_id'], content_type_id=row['content_type_id'], object_id=row['object_id'],
+                    delta=row['net_delta'], karma=row['net_karma'], liked_at=row['last_liked_at'], processed_at=now,
+                )
+                for row in rows
+                if row['net_delta'] or row['net_karma']
+            ]
+            deleted += batch.delete()[0]
+            written += len(LikeEvent.objects.bulk_create(rollups, batch_size=batch_size))
+    return deleted, written
@@ -0,0 +1,93 @@
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models
+from rest_framework import serializers
+
+# Part of every fragment key; bump when a cached serializer's output changes
+FRAGMENT_VERSION = 1
+
+
+def fragment_cache():
+    return caches[getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'default')]
+
+
+class FragmentListSerializer(serializers.ListSerializer):
+    """
+    Renders many objects at once from per-object cached fragments.
+
+    All fragments are fetched with one ``get_many``; only the misses are
+    serialized in full (and stored with one ``set_many``). Hits just have
+    their volatile fields filled in from the instance, which skips the
+    nested author serializers and field machinery entirely.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        instances = list(iterable)
+        child = self.child
+        cache = fragment_cache()
+
+        keys = [child.fragment_key(instance) for instance in instances]
+        fragments = cache.get_many(keys)
+        missing = {}
+        representations = []
+        for key, instance in zip(keys, instances):
+            fragment = fragments.get(key)
+            if fragment is not None:
+                representations.append(child.from_fragment(instance, fragment))
+            else:
+                representation = child.to_representation(instance)
+                missing[key] = child.to_fragment(representation)
+                representations.append(representation)
+        if missing:
+            cache.set_many(missing, getattr(settings, 'FRAGMENT_CACHE_TTL', 600))
+        return representations
+
+
+class FragmentCacheMixin:
+    """
+    ModelSerializer mixin for objects rendered in lists over and over.
+
+    The fragment is everything except ``volatile_fields``, which are
+    re-read from the instance on every render. A dotted name such as
+    ``author.profile.total_karma`` refreshes one value inside a nested
+    representation. Fragments are keyed on the object's ``updated_at``, so
+    an edit saved through the ORM misses the old fragment. Use
+    ``FragmentListSerializer`` as the ``Meta.list_serializer_class``.
+    """
+    volatile_fields = ()
+
+    def fragment_key(self, instance):
+        return f"{instance._meta.label_lower}:{instance.pk}:{instance.updated_at.timestamp()}:v{FRAGMENT_VERSION}"
+
+    def to_fragment(self, representation):
+        fragment = dict(representation)
+        for name in self.volatile_fields:
+            if '.' not in name:
+                # Keep the key so hits come out in the same field order
+                fragment[name] = None
+        return fragment
+
+    def from_fragment(self, instance, fragment):
+        representation = dict(fragment)
+        for name in self.volatile_fields:
+            if '.' in name:
+                self.refresh_nested(instance, representation, name)
+                continue
+            field = self.fields[name]
+            attribute = field.get_attribute(instance)
+            representation[name] = None if attribute is None else field.to_representation(attribute)
+        return representation
+
+    def refresh_nested(self, instance, representation, name):
+        *parents, leaf = name.split('.')
+        container = representation
+        for parent in parents:
+            if container.get(parent) is None:
+                return
+            # Copy on the way down so cached nested dicts are never shared
+            container[parent] = dict(container[parent])
+            container = container[parent]
+        container[leaf] = attrgetter(name)(instance)
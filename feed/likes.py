@@ -0,0 +1,258 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .events import build_like_event, record_like_event, record_like_events
+from .models import Post, Comment, Like
+
+_like_signals_suppressed = ContextVar('like_signals_suppressed', default=False)
+
+
+@contextmanager
+def suppress_like_signals():
+    """
+    Skip the per-row like event receivers in feed/signals.py while the
+    caller records the events itself.
+    """
+    token = _like_signals_suppressed.set(True)
+    try:
+        yield
+    finally:
+        _like_signals_suppressed.reset(token)
+
+
+def like_signals_suppressed():
+    return _like_signals_suppressed.get()
+
+
+@transaction.atomic
+def toggle_like(user, target):
+    """
+    Like ``target`` for ``user``, or unlike it if already liked.
+
+    The Like row is the only thing decided here: the delete reports how many
+    rows it actually removed and the insert is guarded by the unique
+    constraint, so concurrent toggles never record an event twice. Counters
+    and karma are derived from the event (see feed/events.py).
+    Returns True if the target is liked after the call.
+    """
+    content_type = ContentType.objects.get_for_model(target)
+    existing = Like.objects.filter(user=user, content_type=content_type, object_id=target.pk)
+
+    with suppress_like_signals():
+        like = existing.only('id', 'created_at').first()
+        if like is not None:
+            deleted, _ = Like.objects.filter(pk=like.pk).delete()
+            if deleted:
+                record_like_event(target, like.created_at, -1)
+            return False
+
+        try:
+            with transaction.atomic():
+                like = Like.objects.create(user=user, content_type=content_type, object_id=target.pk)
+        except IntegrityError:
+            # A concurrent request inserted the same like first
+            return True
+        record_like_event(target, like.created_at, 1)
+        return True
+
+
+# Model behind each ``type`` accepted by the bulk like API
+LIKE_TARGET_TYPES = {'post': Post, 'comment': Comment}
+
+
+def bulk_set_likes(user, operations):
+    """
+    Apply many ``{'type', 'id', 'liked'}`` operations for ``user`` at once.
+
+    Targets and the user's existing likes are read with one query per type,
+    new likes go in with a single ``bulk_create(ignore_conflicts=True)``,
+    removed likes with a single delete, and the resulting events (only for
+    rows this call actually inserted or deleted) are applied
+    with one grouped UPDATE per affected object, author and leaderboard hour.
+    When an object appears more than once, the last operation wins.
+
+    Returns one result dict per operation, in order.
+    """
+    desired = {}
+    for op in operations:
+        desired[(op['type'], op['id'])] = op['liked']
+
+    # Authors of every referenced object, one query per type
+    authors = {}
+    for type_name, model in LIKE_TARGET_TYPES.items():
+        ids = [object_id for (t, object_id) in desired if t == type_name]
+        if ids:
+            for object_id, author_id in model.objects.filter(id__in=ids).values_list('id', 'author_id'):
+                authors[(type_name, object_id)] = author_id
+
+    content_types = {
+        type_name: ContentType.objects.get_for_model(model)
+        for type_name, model in LIKE_TARGET_TYPES.items()
+    }
+    type_names = {content_type.id: type_name for type_name, content_type in content_types.items()}
+
+    targets = Q()
+    for type_name, content_type in content_types.items():
+        ids = [object_id for (t, object_id) in authors if t == type_name]
+        if ids:
+            targets |= Q(content_type=content_type, object_id__in=ids)
+
+    def like_rows(queryset):
+        return {
+            (type_names[content_type_id], object_id): (like_id, created_at)
+            for like_id, content_type_id, object_id, created_at in queryset.values_list(
+                'id', 'content_type_id', 'object_id', 'created_at'
+            )
+        }
+
+    created, deleted = {}, {}
+    with transaction.atomic(), suppress_like_signals():
+        # Locked, so a concurrent unlike cannot remove them before this delete does
+        existing = like_rows(Like.objects.filter(targets, user=user).select_for_update()) if authors else {}
+        to_create = [key for key in authors if desired[key] and key not in existing]
+        deleted = {key: existing[key] for key in authors if not desired[key] and key in existing}
+
+        new_likes = {
+            (type_name, object_id): Like(user=user, content_type=content_types[type_name], object_id=object_id)
+            for type_name, object_id in to_create
+        }
+        Like.objects.bulk_create(new_likes.values(), ignore_conflicts=True)
+        if new_likes:
+            # A concurrent like of the same target wins the unique constraint and
+            # the insert silently skips ours; only rows stamped by this insert count
+            inserted = Q()
+            for (type_name, object_id), like in new_likes.items():
+                inserted |= Q(content_type=content_types[type_name], object_id=object_id, created_at=like.created_at)
+            created = like_rows(Like.objects.filter(inserted, user=user))
+        if deleted:
+            Like.objects.filter(id__in=[like_id for like_id, _ in deleted.values()]).delete()
+
+        events = [
+            build_like_event(LIKE_TARGET_TYPES[key[0]], key[1], authors[key], created_at, 1)
+            for key, (_, created_at) in created.items()
+        ] + [
+            build_like_event(LIKE_TARGET_TYPES[key[0]], key[1], authors[key], created_at, -1)
+            for key, (_, created_at) in deleted.items()
+        ]
+        record_like_events(events)
+
+    changed = set(created) | set(deleted)
+    results = []
+    for op in operations:
+        key = (op['type'], op['id'])
+        if key not in authors:
+            results.append({'type': op['type'], 'id': op['id'], 'error': 'Not found'})
+        else:
+            results.append({
+                'type': op['type'],
+                'id': op['id'],
+                'liked': desired[key],
+                'changed': key in changed,
+            })
+    return results
+
+
+def liked_context(user, post_ids=(), comment_ids=()):
+    """
+    Resolve which of the given posts and comments ``user`` has liked.
+
+    Returns serializer context entries ``liked_post_ids`` and
+    ``liked_comment_ids``; the serializers read ``has_liked`` from these sets
+    instead of querying once per object. Both sets are filled by a single
+    query, and anonymous users cost no query at all.
+    """
+    post_ids, comment_ids = list(post_ids), list(comment_ids)
+    if not user or not user.is_authenticated or not (post_ids or comment_ids):
+        return liked_sets((), {})
+
+    content_types = ContentType.objects.get_for_models(Post, Comment)
+    return liked_sets(liked_rows(user, post_ids or None, comment_ids or None, content_types), content_types)
+
+
+async def aliked_context(user, post_ids=None, comment_ids=None):
+    """liked_context for async views; the ids may also be subqueries, None skips a type"""
+    if not user or not user.is_authenticated or (post_ids is None and comment_ids is None):
+        return liked_sets((), {})
+
+    content_types = await sync_to_async(ContentType.objects.get_for_models)(Post, Comment)
+    rows = [row async for row in liked_rows(user, post_ids, comment_ids, content_types)]
+    return liked_sets(rows, content_types)
+
+
+def liked_rows(user, post_ids, comment_ids, content_types):
+    """``(content_type_id, object_id)`` of the user's likes among the given ids (None skips a type)"""
+    targets = Q()
+    if post_ids is not None:
+        targets |= Q(content_type=content_types[Post], object_id__in=post_ids)
+    if comment_ids is not None:
+        targets |= Q(content_type=content_types[Comment], object_id__in=comment_ids)
+    return Like.objects.filter(targets, user=user).values_list('content_type_id', 'object_id')
+
+
+def liked_sets(rows, content_types):
+    context = {'liked_post_ids': set(), 'liked_comment_ids': set()}
+    for content_type_id, object_id in rows:
+        if content_type_id == content_types[Post].id:
+            context['liked_post_ids'].add(object_id)
+        else:
+            context['liked_comment_ids'].add(object_id)
+    return context
+
+
+def serialized_comments(posts):
+    """Every comment nested anywhere in serialized feed posts"""
+    comments = []
+    pending = [comment for post in posts for comment in post['comments']]
+    while pending:
+        comment = pending.pop()
+        comments.append(comment)
+        pending.extend(comment['replies'])
+    return comments
+
+
+def apply_liked(posts, context):
+    """Set ``has_liked`` in serialized feed posts and their comments from liked_context sets"""
+    for post in posts:
+        post['has_liked'] = post['id'] in context['liked_post_ids']
+    for comment in serialized_comments(posts):
+        comment['has_liked'] = comment['id'] in context['liked_comment_ids']
+    return posts
+
+
+def mark_liked(posts, user):
+    """
+    Set ``has_liked`` in already serialized feed posts and their nested
+    comments for ``user``, e.g. on a page rendered once for everybody.
+    Costs the single liked_context query.
+    """
+    comment_ids = [comment['id'] for comment in serialized_comments(posts)]
+    return apply_liked(posts, liked_context(user, [post['id'] for post in posts], comment_ids))
+
+
+async def amark_liked(posts, user):
+    """mark_liked for async views"""
+    comment_ids = [comment['id'] for comment in serialized_comments(posts)]
+    return apply_liked(posts, await aliked_context(user, [post['id'] for post in posts], comment_ids))
+
+
+class LikedSetMixin:
+    """
+    ViewSet mixin that adds the current user's liked-id sets to the
+    serializer context for whatever is being serialized, so a list page
+    resolves ``has_liked`` with one query regardless of its size. Views
+    define ``get_liked_ids(instances)``, returning the ``(post_ids,
+    comment_ids)`` rendered for those instances.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if args and args[0] is not None:
+            instances = args[0] if kwargs.get('many') else [args[0]]
+            post_ids, comment_ids = self.get_liked_ids(instances)
+            serializer.context.update(liked_context(self.request.user, post_ids, comment_ids))
+        return serializer
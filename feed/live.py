@@ -0,0 +1,257 @@
+"""
+Live like counts and leaderboard for server-sent event clients.
+
+``LiveHub`` is an in-process pub/sub. The like paths publish the ids whose
+counters changed once their transaction commits (see feed/signals.py), and
+every ``LIVE_UPDATES_INTERVAL`` seconds a task on the event loop reads the
+new counts of the ids some client watches, one query per model however
+many likes arrived, and offers each client the values it has not seen.
+
+Updates coalesce per client instead of queueing: a client that reads
+slowly gets fewer, larger events and never more pending state than the
+ids it watches. One that has not read anything for
+``LIVE_UPDATES_MAX_STALL`` seconds is dropped; EventSource reconnects and
+starts again from a fresh snapshot.
+
+A hub only hears the likes its own process handles. Every
+``LIVE_UPDATES_RESYNC`` seconds it also re-reads every watched count and
+the cached leaderboard, so clients of other workers (or of
+``process_like_events``) catch up within that delay.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from backend.metrics import metrics
+from leaderboard.cache import leaderboard_cache
+from leaderboard.views import format_leaderboard, leaderboard_rows
+from .models import Post, Comment
+from .streaming import dumps
+
+logger = logging.getLogger(__name__)
+
+# Query parameter / event payload key -> model
+KINDS = {'posts': Post, 'comments': Comment}
+
+# Seconds between keep-alive comments on an idle stream, so proxies keep it open
+HEARTBEAT = 15
+# Reconnect delay suggested to EventSource, in milliseconds
+RETRY_MS = 3000
+# Ids read per query when refreshing counts
+CHUNK_SIZE = 500
+
+
+def setting(name, default):
+    return getattr(settings, name, default)
+
+
+def event(name, data):
+    return b'event: ' + name.encode() + b'\ndata: ' + dumps(data) + b'\n\n'
+
+
+async def read_counts(model, ids):
+    """``{id: like_count}`` of the rows among ``ids`` that still exist"""
+    ids = sorted(ids)
+    counts = {}
+    for start in range(0, len(ids), CHUNK_SIZE):
+        rows = model.objects.filter(id__in=ids[start:start + CHUNK_SIZE]).values_list('id', 'like_count')
+        async for object_id, like_count in rows:
+            counts[object_id] = like_count
+    return counts
+
+
+async def compute_leaderboard():
+    return format_leaderboard([row async for row in leaderboard_rows()])
+
+
+class Subscriber:
+    """One connected client: what it watches, what it was sent and what it has not read yet"""
+
+    def __init__(self, posts=(), comments=(), leaderboard=False):
+        self.watched = {'posts': frozenset(posts), 'comments': frozenset(comments)}
+        self.leaderboard = leaderboard
+        self.sent = {kind: {} for kind in KINDS}
+        self.sent_etag = None
+        self.pending = {kind: {} for kind in KINDS}
+        self.pending_leaderboard = None
+        # When the oldest unread update was offered
+        self.waiting_since = None
+        self.closed = False
+        self.wakeup = asyncio.Event()
+
+    def has_pending(self):
+        return any(self.pending.values()) or self.pending_leaderboard is not None
+
+    def offer(self, counts, leaderboard=None, now=None):
+        """
+        Merge ``{kind: {id: count}}`` and a leaderboard cache entry into the
+        unread updates, keeping only values that differ from what the client
+        will otherwise end up with
+        """
+        for kind, values in counts.items():
+            for object_id, count in values.items():
+                if object_id not in self.watched[kind]:
+                    continue
+                if count == self.sent[kind].get(object_id):
+                    self.pending[kind].pop(object_id, None)
+                else:
+                    self.pending[kind][object_id] = count
+        if leaderboard is not None and self.leaderboard:
+            if leaderboard['etag'] == self.sent_etag:
+                self.pending_leaderboard = None
+            else:
+                self.pending_leaderboard = leaderboard
+
+        if self.has_pending():
+            if self.waiting_since is None:
+                self.waiting_since = time.monotonic() if now is None else now
+            self.wakeup.set()
+
+    def take(self):
+        """The unread updates as SSE events; they count as sent from here on"""
+        chunks = []
+        likes = {kind: values for kind, values in self.pending.items() if values}
+        if likes:
+            chunks.append(event('likes', likes))
+            for kind, values in likes.items():
+                self.sent[kind].update(values)
+            metrics.inc('live_events_total', event='likes')
+        if self.pending_leaderboard is not None:
+            chunks.append(event('leaderboard', self.pending_leaderboard['data']))
+            self.sent_etag = self.pending_leaderboard['etag']
+            metrics.inc('live_events_total', event='leaderboard')
+        self.pending = {kind: {} for kind in KINDS}
+        self.pending_leaderboard = None
+        self.waiting_since = None
+        self.wakeup.clear()
+        return chunks
+
+    def stalled(self, now, max_stall):
+        return self.waiting_since is not None and now - self.waiting_since > max_stall
+
+    def close(self):
+        self.closed = True
+        self.wakeup.set()
+
+
+class LiveHub:
+    """The subscribers of this process and the changes published since the last flush"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.changed = {kind: set() for kind in KINDS}
+        self.leaderboard_changed = False
+        self.last_resync = 0.0
+        self.last_leaderboard = 0.0
+        self.task = None
+
+    def publish(self, model, object_ids):
+        """Note that the like counters of ``object_ids`` changed; safe from any thread"""
+        if not self.subscribers:
+            return
+        kind = 'posts' if model is Post else 'comments'
+        with self.lock:
+            self.changed[kind].update(object_ids)
+            # Every like moves some author's karma
+            self.leaderboard_changed = True
+
+    def full(self):
+        return len(self.subscribers) >= setting('LIVE_UPDATES_MAX_CLIENTS', 1000)
+
+    def subscribe(self, subscriber):
+        self.subscribers.add(subscriber)
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.task = loop.create_task(self.run())
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def clear(self):
+        with self.lock:
+            self.subscribers.clear()
+            self.changed = {kind: set() for kind in KINDS}
+            self.leaderboard_changed = False
+            self.last_resync = self.last_leaderboard = 0.0
+
+    async def run(self):
+        """Flush every interval while anyone is subscribed"""
+        while self.subscribers:
+            await asyncio.sleep(setting('LIVE_UPDATES_INTERVAL', 0.25))
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception('Live update flush failed')
+
+    async def flush(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            changed, self.changed = self.changed, {kind: set() for kind in KINDS}
+            leaderboard_changed, self.leaderboard_changed = self.leaderboard_changed, False
+        subscribers = list(self.subscribers)
+        if not subscribers:
+            return
+
+        watched = {kind: set().union(*(s.watched[kind] for s in subscribers)) for kind in KINDS}
+        resync = now - self.last_resync >= setting('LIVE_UPDATES_RESYNC', 10)
+        if resync:
+            self.last_resync = now
+            changed = watched
+        counts = {}
+        for kind, model in KINDS.items():
+            ids = changed[kind] & watched[kind]
+            counts[kind] = await read_counts(model, ids) if ids else {}
+
+        leaderboard = None
+        if any(s.leaderboard for s in subscribers):
+            if leaderboard_changed and now - self.last_leaderboard >= setting('LIVE_LEADERBOARD_INTERVAL', 2):
+                # Recompute rather than wait out the cache TTL; pollers get the fresh entry too
+                self.last_leaderboard = now
+                leaderboard = await leaderboard_cache.arefresh(compute_leaderboard)
+            else:
+                if leaderboard_changed:
+                    with self.lock:
+                        self.leaderboard_changed = True
+                if resync:
+                    leaderboard = await leaderboard_cache.aget(compute_leaderboard)
+
+        max_stall = setting('LIVE_UPDATES_MAX_STALL', 15)
+        for subscriber in subscribers:
+            if subscriber.stalled(now, max_stall):
+                # Its connection is not draining; stop buffering for it
+                subscriber.close()
+                self.unsubscribe(subscriber)
+                metrics.inc('live_clients_dropped_total')
+                continue
+            subscriber.offer(counts, leaderboard, now)
+
+    async def stream(self, subscriber):
+        """The SSE body for one client, from a snapshot of what it watches to disconnection"""
+        self.subscribe(subscriber)
+        try:
+            yield f"retry: {RETRY_MS}\n\n".encode()
+            # Start from the current values, on reconnects too
+            counts = {kind: await read_counts(model, subscriber.watched[kind]) for kind, model in KINDS.items()}
+            leaderboard = await leaderboard_cache.aget(compute_leaderboard) if subscriber.leaderboard else None
+            subscriber.offer(counts, leaderboard)
+            while not subscriber.closed:
+                if not subscriber.has_pending():
+                    try:
+                        await asyncio.wait_for(subscriber.wakeup.wait(), HEARTBEAT)
+                    except asyncio.TimeoutError:
+                        yield b': keep-alive\n\n'
+                        continue
+                    if subscriber.closed:
+                        break
+                for chunk in subscriber.take():
+                    yield chunk
+        finally:
+            self.unsubscribe(subscriber)
+
+
+live_hub = LiveHub()
@@ -0,0 +1,59 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from feed.benchmarks import QUERY_BUDGETS, dataset_summary, run_benchmarks
+from feed.synthetic import populate
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the feed, post, comment, like and leaderboard endpoints (queries, latency, peak memory) '
+        'on a seeded synthetic dataset that is rolled back afterwards; fails if a query budget is exceeded'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--max-depth', type=int, default=6, help='Deepest reply level')
+        parser.add_argument('--fan-out', type=int, default=5, help='Most direct replies per comment')
+        parser.add_argument('--like-density', type=float, default=0.02,
+                            help='Probability that a user likes a given post or comment')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--no-memory', action='store_false', dest='memory', help='Skip the tracemalloc run')
+        parser.add_argument('--budgets', help='JSON file of query budgets overriding the built-in ones')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        budgets = dict(QUERY_BUDGETS)
+        if options['budgets']:
+            with open(options['budgets']) as handle:
+                budgets.update(json.load(handle))
+
+        scale = {key: options[key] for key in (
+            'users', 'posts', 'comments', 'max_depth', 'fan_out', 'like_density', 'seed',
+        )}
+        with transaction.atomic():
+            populate(
+                options['posts'], options['comments'], users=options['users'],
+                max_depth=options['max_depth'], fan_out=options['fan_out'],
+                like_density=options['like_density'], seed=options['seed'],
+            )
+            user = User.objects.get(username=f"synthetic-{options['seed']}-0")
+            report = {'scale': scale, 'dataset': dataset_summary()}
+            report.update(run_benchmarks(user, repeat=options['repeat'], memory=options['memory'], budgets=budgets))
+            transaction.set_rollback(True)
+
+        body = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(body + '\n')
+        else:
+            self.stdout.write(body)
+
+        if report['regressions']:
+            raise CommandError(f"Over query budget or failing: {', '.join(report['regressions'])}")
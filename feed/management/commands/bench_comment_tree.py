@@ -0,0 +1,47 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from feed.tree import build_comment_forest
+
+
+def synthetic_comments(count, posts, seed=0):
+    """Serialized-comment dicts spread over ``posts`` posts, replies pointing to earlier comments"""
+    rng = random.Random(seed)
+    comments = []
+    for comment_id in range(1, count + 1):
+        if comments and rng.random() < 0.7:
+            parent = rng.choice(comments)
+            post_id, parent_id = parent['post'], parent['id']
+        else:
+            post_id, parent_id = rng.randint(1, posts), None
+        comments.append({'id': comment_id, 'post': post_id, 'parent': parent_id})
+    return comments
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark for build_comment_forest showing linear scaling'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 20000, 40000, 80000])
+        parser.add_argument('--posts', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'comments':>10} {'best ms':>10} {'us/comment':>12}")
+        for size in options['sizes']:
+            best = float('inf')
+            for _ in range(options['repeat']):
+                comments = synthetic_comments(size, options['posts'])
+                start = time.perf_counter()
+                build_comment_forest(comments)
+                best = min(best, time.perf_counter() - start)
+            self.stdout.write(f"{size:>10} {best * 1000:>10.2f} {best / size * 1e6:>12.3f}")
+
+        # A single chain far deeper than the interpreter recursion limit
+        depth = options['sizes'][-1]
+        chain = [{'id': i, 'post': 1, 'parent': i - 1 or None} for i in range(1, depth + 1)]
+        start = time.perf_counter()
+        build_comment_forest(chain)
+        self.stdout.write(f"chain of depth {depth}: {(time.perf_counter() - start) * 1000:.2f} ms")
@@ -0,0 +1,61 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from feed.fragments import fragment_cache
+from feed.synthetic import populate
+from feed.views import FeedView
+
+
+class Command(BaseCommand):
+    help = (
+        'Peak Python memory (tracemalloc) of rendering one feed page with each FeedView engine, '
+        'on a synthetic feed that is rolled back afterwards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--keep', action='store_true', help='Commit the synthetic data instead of rolling back')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            start = time.perf_counter()
+            populate(options['posts'], options['comments'])
+            self.stdout.write(
+                f"Inserted {options['posts']} posts and {options['comments']} comments "
+                f"in {time.perf_counter() - start:.1f}s"
+            )
+            self.measure(options['page_size'], options['repeat'])
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+    def measure(self, page_size, repeat):
+        self.stdout.write(f"{'engine':<14} {'peak KiB':>10} {'KiB/post':>10} {'best ms':>10}")
+        for engine in ['serializers', 'values']:
+            peak = best = float('inf')
+            for _ in range(repeat):
+                # Each request starts cold: fragments would hide the serializer cost
+                fragment_cache().clear()
+                view = FeedView(engine=engine)
+                request = Request(APIRequestFactory().get(
+                    '/api/feed/', {'page_size': page_size}, HTTP_HOST='localhost'
+                ))
+                paginator = view.pagination_class()
+
+                tracemalloc.start()
+                started = time.perf_counter()
+                view.render_page(paginator, request)
+                elapsed = time.perf_counter() - started
+                peak = min(peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+                best = min(best, elapsed)
+            self.stdout.write(
+                f"{engine:<14} {peak / 1024:>10.0f} {peak / 1024 / page_size:>10.1f} {best * 1000:>10.1f}"
+            )
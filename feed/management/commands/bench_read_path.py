@@ -0,0 +1,163 @@
+import asyncio
+import json
+import statistics
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client, override_settings
+from django.urls import path
+
+import backend.urls
+from feed.views import AsyncFeedView, FeedView
+from leaderboard.views import AsyncLeaderboardView, LeaderboardView
+
+
+def urlconf(name, urlpatterns):
+    module = types.ModuleType(name)
+    module.urlpatterns = urlpatterns
+    return module
+
+
+# backend.urls with the sync or async read views in front, whatever ASYNC_READ_VIEWS says
+sync_urls = urlconf('bench_sync_urls', [
+    path('api/feed/', FeedView.as_view(), name='feed'),
+    path('api/leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    *backend.urls.urlpatterns,
+])
+async_urls = urlconf('bench_async_urls', [
+    path('api/feed/', AsyncFeedView.as_view(), name='feed'),
+    path('api/leaderboard/', AsyncLeaderboardView.as_view(), name='leaderboard'),
+    *backend.urls.urlpatterns,
+])
+
+
+@contextmanager
+def database_latency(seconds):
+    """Sleep before every query, like the round trip to a database on another host"""
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        if delay not in connection.execute_wrappers:
+            connection.execute_wrappers.append(delay)
+
+    for connection in connections.all(initialized_only=True):
+        install(None, connection)
+    connection_created.connect(install)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(install)
+        for connection in connections.all(initialized_only=True):
+            if delay in connection.execute_wrappers:
+                connection.execute_wrappers.remove(delay)
+
+
+def summarize(timings, statuses, elapsed):
+    timings = sorted(timings)
+    quantiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+    return {
+        'requests': len(timings),
+        'errors': sum(1 for code in statuses if code >= 400),
+        'requests_per_second': round(len(timings) / elapsed, 1),
+        'ms_p50': round(quantiles[49] * 1000, 2),
+        'ms_p95': round(quantiles[94] * 1000, 2),
+        'ms_p99': round(quantiles[98] * 1000, 2),
+    }
+
+
+def run_wsgi(paths, total, concurrency):
+    """``total`` requests from ``concurrency`` threads (think sync workers) through the WSGI handler"""
+    client = Client()
+
+    def one(index):
+        start = time.perf_counter()
+        response = client.get(paths[index % len(paths)], secure=True)
+        return time.perf_counter() - start, response.status_code
+
+    with override_settings(ROOT_URLCONF=sync_urls), ThreadPoolExecutor(concurrency) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(one, range(total)))
+        elapsed = time.perf_counter() - start
+    return summarize([r[0] for r in results], [r[1] for r in results], elapsed)
+
+
+async def run_asgi(paths, total, concurrency):
+    """``total`` requests, at most ``concurrency`` in flight, through the ASGI handler"""
+    client = AsyncClient()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(index):
+        # Like ASGIHandler, and unlike the bare test client, give each request
+        # its own thread for sync work instead of sharing one with every other
+        async with slots, ThreadSensitiveContext():
+            start = time.perf_counter()
+            response = await client.get(paths[index % len(paths)], secure=True)
+            return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(index) for index in range(total)))
+    elapsed = time.perf_counter() - start
+    return summarize([r[0] for r in results], [r[1] for r in results], elapsed)
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test the feed and leaderboard in one process: the WSGI handler with the sync views '
+        '(one request at a time, like a gunicorn sync worker) versus the ASGI handler with the async '
+        'views (--concurrency requests in flight, like a uvicorn worker), on the current database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per path and handler')
+        parser.add_argument('--concurrency', type=int, default=20, help='Requests in flight')
+        parser.add_argument('--wsgi-threads', type=int, default=1,
+                            help='Threads serving the WSGI path; 1 is one gunicorn sync worker')
+        parser.add_argument('--db-latency', type=float, default=0.0,
+                            help='Milliseconds added to every query, to mimic a database on another host')
+        parser.add_argument('--cold', action='store_true', help='Bypass the feed page cache')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to request (repeatable); defaults to the feed and leaderboard')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/api/feed/', '/api/leaderboard/']
+        total, concurrency = options['requests'], options['concurrency']
+        threads = options['wsgi_threads']
+        report = {
+            'concurrency': concurrency, 'wsgi_threads': threads,
+            'db_latency_ms': options['db_latency'], 'cold': options['cold'], 'wsgi': {}, 'asgi': {},
+        }
+
+        with ExitStack() as stack:
+            # The test clients always send Host: testserver
+            stack.enter_context(override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']))
+            stack.enter_context(database_latency(options['db_latency'] / 1000))
+            # In one process the local memory cache is shared, so measure it like a shared one.
+            # --cold only bypasses the feed pages: the leaderboard keeps its cache, since with no
+            # entry ever stored its single-flight waiters would only measure their lock timeout
+            stack.enter_context(override_settings(FEED_CACHE_ENABLED=not options['cold']))
+            for url in paths:
+                # Warm up both paths (caches, connections) before measuring
+                run_wsgi([url], threads, threads)
+                report['wsgi'][url] = run_wsgi([url], total, threads)
+                # A bare event loop, as under an ASGI server: inside async_to_sync every
+                # thread-sensitive call would be sent back to this one thread
+                with override_settings(ROOT_URLCONF=async_urls):
+                    asyncio.run(run_asgi([url], concurrency, concurrency))
+                    report['asgi'][url] = asyncio.run(run_asgi([url], total, concurrency))
+
+        body = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(body + '\n')
+        else:
+            self.stdout.write(body)
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory
+
+from feed.fragments import fragment_cache
+from feed.likes import liked_context
+from feed.models import Post
+from feed.rows import fetch_previews, post_rows, render_posts
+from feed.serializers import PostSerializer
+from feed.threads import comment_preview_prefetches
+
+
+class Command(BaseCommand):
+    help = 'Compare PostSerializer with the values() row renderer on the newest posts in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100, help='How many of the newest posts to render')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        ids = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True)[:options['posts']])
+        if not ids:
+            raise CommandError('No posts to render; create some data first')
+        request = APIRequestFactory().get('/api/feed/', HTTP_HOST='localhost')
+        # Rendered for an anonymous visitor, like the shared feed page cache
+        context = {'request': request, **liked_context(None)}
+        posts = Post.objects.filter(id__in=ids).order_by('-created_at', '-id')
+
+        def orm_fetch():
+            return list(posts.select_related('author', 'author__profile').prefetch_related(
+                *comment_preview_prefetches()
+            ))
+
+        def orm_render(instances):
+            return PostSerializer(instances, many=True, context=context).data
+
+        def rows_fetch():
+            rows = post_rows(posts)
+            return rows, fetch_previews([row['id'] for row in rows])
+
+        def rows_render(fetched):
+            return render_posts(*fetched, request=request)
+
+        def cold_orm_render(instances):
+            fragment_cache().clear()
+            return orm_render(instances)
+
+        instances, fetched = orm_fetch(), rows_fetch()
+        cases = [
+            ('serializers, cold fragments', lambda: cold_orm_render(instances)),
+            ('serializers, warm fragments', lambda: orm_render(instances)),
+            ('row renderer', lambda: rows_render(fetched)),
+            ('fetch + serializers, cold', lambda: cold_orm_render(orm_fetch())),
+            ('fetch + row renderer', lambda: rows_render(rows_fetch())),
+        ]
+
+        self.stdout.write(f"{len(ids)} posts, best of {options['repeat']}")
+        self.stdout.write(f"{'path':<30} {'best ms':>10} {'us/post':>10}")
+        for name, run in cases:
+            best = float('inf')
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                run()
+                best = min(best, time.perf_counter() - start)
+            self.stdout.write(f"{name:<30} {best * 1000:>10.2f} {best / len(ids) * 1e6:>10.1f}")
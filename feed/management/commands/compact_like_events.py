@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from feed.events import compact_like_events
+
+
+class Command(BaseCommand):
+    help = (
+        'Roll processed like events older than the retention window up into one net event per author '
+        'and liked post or comment, so the event table stops growing with like traffic'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=None,
+                            help='Keep events processed in the last DAYS as they are '
+                                 '(default: LIKE_EVENTS_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Authors compacted per transaction')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is None:
+            days = getattr(settings, 'LIKE_EVENTS_RETENTION_DAYS', 7)
+        deleted, written = compact_like_events(timezone.now() - timedelta(days=days), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Compacted {deleted} like events into {written}"))
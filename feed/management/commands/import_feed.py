@@ -0,0 +1,87 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from feed.cache import feed_cache
+from feed.counters import rebuild_counters
+from feed.events import seed_like_events
+from feed.models import Post, Comment, Like
+from feed.ndjson import LIKE_TARGETS, MODELS, build_instance, open_dump, preserve_timestamps
+from leaderboard.ledger import rebuild_ledger
+from users.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = (
+        'Load an export_feed NDJSON dump into an empty database with bulk inserts, '
+        'then rebuild counters, karma and the leaderboard ledger'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', nargs='?', default='-',
+                            help="File to read ('-' for stdin, '.gz' if compressed)")
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per bulk INSERT')
+
+    def handle(self, *args, **options):
+        # Primary keys are kept so comment parents, paths and likes stay valid
+        for model in (User, Post, Comment, Like):
+            if model.objects.exists():
+                raise CommandError(
+                    f"import_feed loads into an empty database, but {model._meta.verbose_name_plural} already exist"
+                )
+
+        start = time.perf_counter()
+        content_types = {name: ContentType.objects.get_for_model(model).id for name, model in LIKE_TARGETS.items()}
+        batch_size = options['batch_size']
+        counts = dict.fromkeys(MODELS, 0)
+        pending = {record_type: [] for record_type in MODELS}
+
+        def flush(record_type):
+            batch = pending[record_type]
+            if batch:
+                # Rows arrive in dependency order, so everything a batch refers to is already written
+                for earlier in MODELS:
+                    if earlier == record_type:
+                        break
+                    flush(earlier)
+                MODELS[record_type].objects.bulk_create(batch)
+                counts[record_type] += len(batch)
+                pending[record_type] = []
+
+        with transaction.atomic(), preserve_timestamps(*MODELS.values()), open_dump(options['input'], 'r') as source:
+            for number, line in enumerate(source, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record_type, instance = build_instance(json.loads(line), content_types)
+                except (ValueError, KeyError, TypeError) as e:
+                    raise CommandError(f"Line {number}: {e}")
+                pending[record_type].append(instance)
+                if len(pending[record_type]) >= batch_size:
+                    flush(record_type)
+            for record_type in MODELS:
+                flush(record_type)
+
+            self.reset_sequences()
+            rebuild_counters()
+            seed_like_events(Like.objects.all(), batch_size=batch_size)
+            UserProfile.rebuild_karma()
+            rebuild_ledger()
+        feed_cache.invalidate_all()
+
+        summary = ', '.join(f"{count} {record_type}s" for record_type, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Imported {summary} in {time.perf_counter() - start:.1f}s"))
+
+    def reset_sequences(self):
+        """Move id sequences past the imported keys (needed on PostgreSQL)"""
+        statements = connection.ops.sequence_reset_sql(no_style(), list(MODELS.values()))
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from feed.events import process_pending_events
+
+
+class Command(BaseCommand):
+    help = 'Apply pending like events to counters, karma and leaderboard buckets in coalesced batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new events instead of exiting when drained')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to sleep between polls when idle (with --loop)')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = process_pending_events(options['batch_size'])
+            total += processed
+            if processed:
+                continue
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} like events"))
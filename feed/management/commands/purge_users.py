@@ -0,0 +1,71 @@
+import time
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from feed.purge import purge_users
+
+
+def start_of_day(value):
+    date = parse_date(value)
+    if date is None:
+        raise CommandError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+    return timezone.make_aware(datetime.combine(date, datetime.min.time()))
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete users matching a username pattern and/or join date range with all their posts, '
+        'comments and likes, then recompute the affected karma and counters in bulk'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', action='append', default=[],
+                            help='Exact username to delete (repeatable)')
+        parser.add_argument('--username-regex', help='Delete usernames matching this regular expression')
+        parser.add_argument('--joined-after', help='Only users who joined on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--joined-before', help='Only users who joined before this date (YYYY-MM-DD)')
+        parser.add_argument('--include-staff', action='store_true',
+                            help='Also delete matching staff and superusers (skipped by default)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Users deleted per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+        parser.add_argument('--no-input', action='store_false', dest='interactive',
+                            help='Do not ask for confirmation')
+
+    def handle(self, *args, **options):
+        if not (options['username'] or options['username_regex']
+                or options['joined_after'] or options['joined_before']):
+            raise CommandError('Give at least one of --username, --username-regex, --joined-after, --joined-before')
+
+        users = User.objects.all()
+        if options['username']:
+            users = users.filter(username__in=options['username'])
+        if options['username_regex']:
+            users = users.filter(username__regex=options['username_regex'])
+        if options['joined_after']:
+            users = users.filter(date_joined__gte=start_of_day(options['joined_after']))
+        if options['joined_before']:
+            users = users.filter(date_joined__lt=start_of_day(options['joined_before']))
+        if not options['include_staff']:
+            users = users.filter(is_staff=False, is_superuser=False)
+
+        count = users.count()
+        if not count:
+            self.stdout.write('No matching users')
+            return
+        if options['interactive'] and not options['dry_run']:
+            answer = input(f"Delete {count} users and everything they created? [y/N] ")
+            if answer.strip().lower() != 'y':
+                raise CommandError('Purge cancelled')
+
+        start = time.perf_counter()
+        deleted = purge_users(users, chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+        for label, rows in sorted(deleted.items()):
+            self.stdout.write(f"  {label}: {rows}")
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {count} users in {time.perf_counter() - start:.1f}s"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from feed.cache import feed_cache
+from feed.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored like/comment counters on posts and comments from the Like and Comment tables'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            posts, comments = rebuild_counters()
+        feed_cache.invalidate_all()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt counters for {posts} posts and {comments} comments"
+        ))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from backend.replicas import replica_alias
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database over the replica file, to try the read replica locally. '
+        'With --loop the copy repeats, so the replica lags the primary like a real one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep copying until interrupted')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds between copies with --loop (the simulated replication lag)')
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if not alias:
+            raise CommandError('No replica configured; set REPLICA_DATABASE_URL.')
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError(
+                'sync_replica only copies SQLite files. Feed a Postgres replica with streaming '
+                'replication (or pg_dump | psql for a one-off copy).'
+            )
+
+        while True:
+            start = time.perf_counter()
+            self.copy(primary, replica)
+            self.stdout.write(f"Replica synced in {(time.perf_counter() - start) * 1000:.0f} ms")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def copy(self, primary, replica):
+        primary.ensure_connection()
+        replica.ensure_connection()
+        # The backup API copies a consistent snapshot, even while the primary takes writes
+        primary.connection.backup(replica.connection)
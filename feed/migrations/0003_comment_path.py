@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_comment_paths(apps, schema_editor):
+    """Compute path/depth for existing comments; parents always have lower ids"""
+    Comment = apps.get_model('feed', 'Comment')
+    positions = {}
+    batch = []
+    for comment in Comment.objects.order_by('id').only('id', 'parent_id').iterator(chunk_size=2000):
+        if comment.parent_id:
+            parent_path, parent_depth = positions[comment.parent_id]
+            comment.path = f"{parent_path}{comment.parent_id:010d}/"
+            comment.depth = parent_depth + 1
+        else:
+            comment.path = ''
+            comment.depth = 0
+        positions[comment.id] = (comment.path, comment.depth)
+        batch.append(comment)
+        if len(batch) >= 1000:
+            Comment.objects.bulk_update(batch, ['path', 'depth'])
+            batch = []
+    if batch:
+        Comment.objects.bulk_update(batch, ['path', 'depth'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0002_comment_feed_commen_post_id_59c5d7_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=1100),
+        ),
+        migrations.RunPython(backfill_comment_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['path'], name='feed_commen_path_96ec85_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:14
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Post = apps.get_model('feed', 'Post')
+    Comment = apps.get_model('feed', 'Comment')
+    Like = apps.get_model('feed', 'Like')
+
+    def count_of(queryset, group_field):
+        counts = queryset.order_by().values(group_field).annotate(total=Count('id')).values('total')
+        return Coalesce(Subquery(counts[:1]), Value(0))
+
+    post_type = ContentType.objects.filter(app_label='feed', model='post').first()
+    comment_type = ContentType.objects.filter(app_label='feed', model='comment').first()
+
+    Post.objects.update(comment_count=count_of(Comment.objects.filter(post_id=OuterRef('pk')), 'post_id'))
+    if post_type:
+        Post.objects.update(like_count=count_of(
+            Like.objects.filter(content_type=post_type, object_id=OuterRef('pk')), 'object_id'
+        ))
+    if comment_type:
+        Comment.objects.update(like_count=count_of(
+            Like.objects.filter(content_type=comment_type, object_id=OuterRef('pk')), 'object_id'
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0003_comment_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='like_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
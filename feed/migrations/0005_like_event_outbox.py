@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+def seed_events_from_likes(apps, schema_editor):
+    """One processed +1 event per existing like, so karma can be reconciled from events"""
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Like = apps.get_model('feed', 'Like')
+    LikeEvent = apps.get_model('feed', 'LikeEvent')
+    now = timezone.now()
+    for model_name, karma in (('post', 5), ('comment', 1)):
+        content_type = ContentType.objects.filter(app_label='feed', model=model_name).first()
+        if content_type is None:
+            continue
+        model = apps.get_model('feed', model_name)
+        likes = Like.objects.filter(content_type=content_type).annotate(
+            author_id=Subquery(model.objects.filter(pk=OuterRef('object_id')).values('author_id')[:1])
+        ).values_list('author_id', 'object_id', 'created_at')
+        batch = []
+        for author_id, object_id, created_at in likes.iterator(chunk_size=2000):
+            if author_id is None:
+                continue
+            batch.append(LikeEvent(
+                author_id=author_id, content_type=content_type, object_id=object_id,
+                delta=1, karma=karma, liked_at=created_at, processed_at=now,
+            ))
+            if len(batch) >= 1000:
+                LikeEvent.objects.bulk_create(batch)
+                batch = []
+        LikeEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('feed', '0004_denormalized_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LikeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('delta', models.SmallIntegerField()),
+                ('karma', models.IntegerField()),
+                ('liked_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='like_events', to=settings.AUTH_USER_MODEL)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['processed_at', 'id'], name='feed_likeev_process_553316_idx'), models.Index(fields=['author', 'processed_at'], name='feed_likeev_author__60f6b3_idx')],
+            },
+        ),
+        migrations.RunPython(seed_events_from_likes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:22
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_reply_counts(apps, schema_editor):
+    Comment = apps.get_model('feed', 'Comment')
+    replies = Comment.objects.filter(parent_id=OuterRef('pk')).order_by().values('parent_id').annotate(
+        total=Count('id')
+    ).values('total')
+    Comment.objects.update(reply_count=Coalesce(Subquery(replies[:1]), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0005_like_event_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_reply_counts, migrations.RunPython.noop),
+    ]
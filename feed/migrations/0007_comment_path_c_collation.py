@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def set_path_collation(collation):
+    def apply(apps, schema_editor):
+        """
+        Comment.descendants() scans a range of paths, which relies on bytewise
+        order. SQLite compares text that way by default; PostgreSQL columns
+        follow the database locale, where punctuation such as the '/'
+        separator is ignored at first, so the column gets the C collation.
+        """
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        Comment = apps.get_model('feed', 'Comment')
+        field = Comment._meta.get_field('path')
+        schema_editor.execute('ALTER TABLE {} ALTER COLUMN {} TYPE {} COLLATE {}'.format(
+            schema_editor.quote_name(Comment._meta.db_table),
+            schema_editor.quote_name(field.column),
+            field.db_type(schema_editor.connection),
+            schema_editor.quote_name(collation),
+        ))
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0006_comment_reply_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_path_collation('C'), set_path_collation('default')),
+    ]
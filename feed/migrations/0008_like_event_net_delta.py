@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0007_comment_path_c_collation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='likeevent',
+            name='delta',
+            field=models.IntegerField(),
+        ),
+    ]
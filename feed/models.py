@@ -10,6 +10,9 @@ class Post(models.Model):
     """Post model for the community feed"""
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     content = models.TextField(max_length=5000)
+    # Denormalized counters, kept in sync with F() updates (see feed/counters.py)
+    like_count = models.IntegerField(default=0, editable=False)
+    comment_count = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -26,26 +29,32 @@ class Post(models.Model):
     def __str__(self):
         return f"Post by {self.author.username}: {self.content[:50]}..."
     
-    @property
-    def like_count(self):
-        """Optimized like count"""
-        return self.likes.count()
-    
-    @property
-    def comment_count(self):
-        """Optimized comment count"""
-        return self.comments.count()
 
 
 class Comment(models.Model):
     """
     Comment model with hierarchical structure for nested threads.
+
+    The position in the thread is stored as a materialized path: ``path``
+    holds the zero padded ids of all ancestors (root first), so depth,
+    ancestor and subtree lookups are single indexed queries instead of
+    walks up the parent chain.
     """
+    PATH_STEP = 11  # 10 digit id + '/' separator
+    PATH_MAX_LENGTH = 1100
+    # Deepest reply whose path still fits the column
+    MAX_DEPTH = PATH_MAX_LENGTH // PATH_STEP
+
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, 
                               related_name='replies')
     content = models.TextField(max_length=2000)
+    path = models.CharField(max_length=PATH_MAX_LENGTH, blank=True, default='', editable=False)
+    depth = models.PositiveIntegerField(default=0, editable=False)
+    # Denormalized counters, kept in sync with F() updates (see feed/counters.py)
+    like_count = models.IntegerField(default=0, editable=False)
+    reply_count = models.IntegerField(default=0, editable=False)  # direct replies only
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -58,6 +67,7 @@ class Comment(models.Model):
             models.Index(fields=['post', 'parent']),
             models.Index(fields=['post', 'created_at']),
             models.Index(fields=['author', 'created_at']),
+            models.Index(fields=['path']),
         ]
     
     def __str__(self):
@@ -68,19 +78,56 @@ class Comment(models.Model):
         if self.parent and self.parent.post != self.post:
             raise ValidationError("Parent comment must belong to the same post.")
     
-    def depth(self):
-        """Calculate comment depth for nested display"""
-        depth = 0
-        parent = self.parent
-        while parent:
-            depth += 1
-            parent = parent.parent
-        return depth
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.set_tree_position()
+        super().save(*args, **kwargs)
+    
+    def set_tree_position(self):
+        """Derive path and depth from the parent; replies never move"""
+        if self.parent_id:
+            parent = self.parent
+            self.path = parent.path + self.path_segment(parent.id)
+            self.depth = parent.depth + 1
+        else:
+            self.path = ''
+            self.depth = 0
+    
+    @staticmethod
+    def path_segment(comment_id):
+        return f"{comment_id:010d}/"
     
     @property
-    def like_count(self):
-        """Optimized like count"""
-        return self.likes.count()
+    def ancestor_ids(self):
+        """Ancestor ids from the thread root down to the direct parent"""
+        return [int(segment) for segment in self.path.split('/') if segment]
+    
+    @property
+    def descendant_path(self):
+        """Path prefix shared by every reply below this comment"""
+        return self.path + self.path_segment(self.id)
+    
+    def ancestors(self):
+        """All ancestors, root first, in one query"""
+        return Comment.objects.filter(id__in=self.ancestor_ids).order_by('depth')
+    
+    def descendants(self):
+        """
+        All replies below this comment in one indexed range scan.
+        '0' is the character right after the '/' separator, so the range
+        [prefix, prefix-with-'0') covers exactly the paths starting with prefix.
+        That holds in bytewise order only: SQLite compares that way, and
+        migration 0007 gives the column the C collation on PostgreSQL.
+        """
+        prefix = self.descendant_path
+        return Comment.objects.filter(path__gte=prefix, path__lt=prefix[:-1] + '0')
+    
+    def subtree(self):
+        """This comment and all of its replies in one query"""
+        prefix = self.descendant_path
+        return Comment.objects.filter(
+            models.Q(id=self.id) | models.Q(path__gte=prefix, path__lt=prefix[:-1] + '0')
+        )
 
 
 class Like(models.Model):
@@ -105,4 +152,34 @@ class Like(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.user.username} liked {self.content_object}"
\ No newline at end of file
+        return f"{self.user.username} liked {self.content_object}"
+
+
+class LikeEvent(models.Model):
+    """
+    Append-only outbox of like/unlike events.
+
+    The like paths only insert a Like row and an event; counters, karma and
+    leaderboard buckets are derived from the events, either inline or by the
+    ``process_like_events`` worker (see feed/events.py). Processed events
+    older than LIKE_EVENTS_RETENTION_DAYS are rolled up into one net event
+    per author and object by ``compact_like_events``.
+    """
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='like_events')
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    delta = models.IntegerField()  # +1 like, -1 unlike (the net change once compacted)
+    karma = models.IntegerField()  # karma change for the author
+    liked_at = models.DateTimeField()  # creation time of the Like, picks the leaderboard bucket
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['processed_at', 'id']),
+            models.Index(fields=['author', 'processed_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.delta:+d} on {self.content_type_id}:{self.object_id} for {self.author_id}"
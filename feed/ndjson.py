@@ -0,0 +1,106 @@
+import datetime
+import gzip
+import json
+import sys
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_datetime
+
+from .models import Post, Comment, Like
+from users.models import UserProfile
+
+# (record type, model, exported columns) in dependency order: every row
+# only refers to rows of earlier types, or for comments to earlier comments
+RECORD_TYPES = (
+    ('user', User, (
+        'id', 'username', 'email', 'password', 'first_name', 'last_name',
+        'is_active', 'is_staff', 'is_superuser', 'date_joined', 'last_login',
+    )),
+    ('profile', UserProfile, ('id', 'user_id', 'created_at', 'updated_at')),
+    ('post', Post, ('id', 'author_id', 'content', 'created_at', 'updated_at')),
+    ('comment', Comment, (
+        'id', 'post_id', 'author_id', 'parent_id', 'content', 'path', 'depth', 'created_at', 'updated_at',
+    )),
+    ('like', Like, ('id', 'user_id', 'target', 'object_id', 'created_at')),
+)
+MODELS = {record_type: model for record_type, model, _ in RECORD_TYPES}
+DATETIME_COLUMNS = {'date_joined', 'last_login', 'created_at', 'updated_at'}
+
+# Likes refer to their target by name, content type ids differ between databases
+LIKE_TARGETS = {'post': Post, 'comment': Comment}
+
+
+class DumpEncoder(DjangoJSONEncoder):
+    """Keeps full microsecond timestamps, which the feed cursors order on"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+@contextmanager
+def open_dump(path, mode):
+    """Open ``path`` for NDJSON text, '-' meaning stdin/stdout and '.gz' gzip"""
+    if path == '-':
+        yield sys.stdout if mode == 'w' else sys.stdin
+    elif path.endswith('.gz'):
+        with gzip.open(path, mode + 't', encoding='utf-8') as handle:
+            yield handle
+    else:
+        with open(path, mode, encoding='utf-8') as handle:
+            yield handle
+
+
+def export_queryset(record_type, model, columns):
+    """Rows to export for one record type, parents before children"""
+    if record_type == 'like':
+        content_types = {
+            ContentType.objects.get_for_model(target).id: name for name, target in LIKE_TARGETS.items()
+        }
+        return Like.objects.filter(content_type__in=content_types).order_by('id').values(
+            'id', 'user_id', 'content_type_id', 'object_id', 'created_at'
+        ), content_types
+    # Replies always sit deeper than their parents
+    ordering = ('depth', 'id') if model is Comment else ('id',)
+    return model.objects.order_by(*ordering).values(*columns), None
+
+
+def dump_records(record_type, model, columns, chunk_size):
+    """Yield one NDJSON line per row of ``record_type``, read in chunks"""
+    rows, content_types = export_queryset(record_type, model, columns)
+    for row in rows.iterator(chunk_size=chunk_size):
+        if content_types is not None:
+            row['target'] = content_types[row.pop('content_type_id')]
+        yield json.dumps({'type': record_type, **row}, cls=DumpEncoder, ensure_ascii=False) + '\n'
+
+
+def build_instance(record, content_types):
+    """Unsaved model instance for one parsed NDJSON record"""
+    record_type = record.pop('type')
+    for column in DATETIME_COLUMNS.intersection(record):
+        if record[column] is not None:
+            record[column] = parse_datetime(record[column])
+    if record_type == 'like':
+        record['content_type_id'] = content_types[record.pop('target')]
+    return record_type, MODELS[record_type](**record)
+
+
+@contextmanager
+def preserve_timestamps(*models):
+    """Let bulk_create keep imported created_at/updated_at values instead of stamping now()"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
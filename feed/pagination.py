@@ -0,0 +1,138 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CreatedAtCursorPagination(BasePagination):
+    """
+    Keyset pagination keyed on (created_at, id).
+
+    Each page is a single range scan on a created_at index, so fetching
+    page N costs the same as fetching page 1 regardless of table size.
+    The cursor is opaque to clients: a base64 encoded position of the last
+    row on the previous page.
+    """
+    descending = True
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 10)
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = self.after(queryset, self.decode_cursor(request))
+
+        # Fetch one extra row to find out whether a next page exists
+        return self.set_page(list(queryset[:self.page_size + 1]))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset for async views, reading the page with the async ORM"""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = self.after(queryset, self.decode_cursor(request))
+        return self.set_page([row async for row in queryset[:self.page_size + 1]])
+
+    def set_page(self, results):
+        """Keep the page from ``results``, which hold up to one lookahead row"""
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        self.next_cursor = self.encode_cursor(self.page[-1]) if self.has_next else None
+        return self.page
+
+    def restore_page(self, request, next_cursor):
+        """Prepare links for a page served from cache instead of paginate_queryset"""
+        self.request = request
+        self.next_cursor = next_cursor
+
+    def after(self, queryset, position):
+        """Order ``queryset`` and keep the rows after ``position`` (if any)"""
+        if self.descending:
+            queryset = queryset.order_by('-created_at', '-id')
+        else:
+            queryset = queryset.order_by('created_at', 'id')
+        if position is None:
+            return queryset
+        created_at, pk = position
+        if self.descending:
+            return queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        return queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    @staticmethod
+    def encode_cursor(obj):
+        """Cursor after a model instance or a ``.values()`` row"""
+        if isinstance(obj, dict):
+            return CreatedAtCursorPagination.encode_position(obj['created_at'], obj['id'])
+        return CreatedAtCursorPagination.encode_position(obj.created_at, obj.id)
+
+    @staticmethod
+    def encode_position(created_at, pk):
+        raw = f"{created_at.isoformat()}|{pk}"
+        return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            created_at_raw, pk_raw = raw.rsplit('|', 1)
+            created_at = parse_datetime(created_at_raw)
+            pk = int(pk_raw)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+
+class FeedCursorPagination(CreatedAtCursorPagination):
+    """Newest posts first, on the -created_at index"""
+    descending = True
+
+
+class ThreadCursorPagination(CreatedAtCursorPagination):
+    """Oldest comments first, on the (post, parent) / parent indexes"""
+    descending = False
+    page_size_query_param = 'limit'
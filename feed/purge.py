@@ -0,0 +1,116 @@
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import router, transaction
+from django.db.models.deletion import Collector
+from django.utils import timezone
+
+from .cache import feed_cache
+from .counters import rebuild_counters, suppress_counter_signals
+from .events import build_like_event
+from .likes import suppress_like_signals
+from .models import Post, Comment, Like, LikeEvent
+from leaderboard.ledger import rebuild_ledger
+from users.models import UserProfile
+
+
+def chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def purge_users(users, chunk_size=500, dry_run=False):
+    """
+    Delete the ``users`` queryset and everything that cascades from it.
+
+    Each chunk of users is collected and deleted with set-based DELETEs
+    while the per-row like, counter and cache receivers are suppressed.
+    Unlikes of content whose author survives are written as processed -1
+    events, so the event ledger stays the source of truth for karma. Once
+    all chunks are gone, karma, counters and the leaderboard window are
+    rebuilt in aggregate for just the surviving rows that were affected.
+
+    Returns deleted row counts by model label (what would be deleted if
+    ``dry_run``).
+    """
+    user_ids = list(users.order_by('id').values_list('id', flat=True))
+    purged = set(user_ids)
+    deleted = Counter()
+    authors, post_ids, comment_ids = set(), set(), set()
+
+    for chunk in chunks(user_ids, chunk_size):
+        with transaction.atomic(), suppress_like_signals(), suppress_counter_signals():
+            collector = Collector(using=router.db_for_write(User))
+            collector.collect(User.objects.filter(id__in=chunk))
+            if dry_run:
+                for model, instances in collector.data.items():
+                    deleted[model._meta.label] += len(instances)
+                for queryset in collector.fast_deletes:
+                    deleted[queryset.model._meta.label] += queryset.count()
+                continue
+
+            events, touched_posts, touched_comments = unlike_events(collector, purged)
+            post_ids |= touched_posts
+            comment_ids |= touched_comments
+            authors.update(event.author_id for event in events)
+
+            LikeEvent.objects.bulk_create(events, batch_size=1000)
+            _, counts = collector.delete()
+            deleted.update(counts)
+
+    if not dry_run and user_ids:
+        with transaction.atomic():
+            for ids in chunks(authors, chunk_size):
+                UserProfile.rebuild_karma(user_ids=ids)
+            for ids in chunks(post_ids, chunk_size):
+                rebuild_counters(post_ids=ids, comment_ids=[])
+            for ids in chunks(comment_ids, chunk_size):
+                rebuild_counters(post_ids=[], comment_ids=ids)
+            rebuild_ledger()
+        feed_cache.invalidate_all()
+    return dict(deleted)
+
+
+def unlike_events(collector, purged):
+    """
+    Processed -1 events for every collected like whose target's author is
+    not being purged, plus the ids of surviving posts and comments whose
+    stored counters the deletion changes.
+    """
+    doomed = {
+        Post: {post.id: post.author_id for post in collector.data.get(Post, ())},
+        Comment: {comment.id: comment.author_id for comment in collector.data.get(Comment, ())},
+    }
+    likes = collector.data.get(Like, ())
+    targets = {Post: set(), Comment: set()}
+    for like in likes:
+        model = ContentType.objects.get_for_id(like.content_type_id).model_class()
+        if model in targets:
+            targets[model].add(like.object_id)
+
+    # Authors of liked content that survives the purge
+    authors = {}
+    for model, ids in targets.items():
+        authors[model] = dict(doomed[model])
+        for batch in chunks(ids - doomed[model].keys(), 1000):
+            authors[model].update(model.objects.filter(id__in=batch).values_list('id', 'author_id'))
+
+    now = timezone.now()
+    events = []
+    for like in likes:
+        model = ContentType.objects.get_for_id(like.content_type_id).model_class()
+        author_id = authors.get(model, {}).get(like.object_id)
+        if author_id is None or author_id in purged:
+            continue
+        event = build_like_event(model, like.object_id, author_id, like.created_at, -1)
+        event.processed_at = now
+        events.append(event)
+
+    comments = collector.data.get(Comment, ())
+    touched_posts = (targets[Post] | {comment.post_id for comment in comments}) - doomed[Post].keys()
+    touched_comments = (
+        targets[Comment] | {comment.parent_id for comment in comments if comment.parent_id}
+    ) - doomed[Comment].keys()
+    return events, touched_posts, touched_comments
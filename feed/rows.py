@@ -0,0 +1,175 @@
+"""
+Read-only rendering of feed posts and comments from ``.values()`` rows.
+
+Produces exactly what PostSerializer / CommentSerializer emit for a feed
+page (same keys, order and formatting) without building model instances
+or running DRF field introspection per object: each row goes through one
+plain function. The equivalence is pinned by a golden test in
+feed/tests.py; keep the two in step when either output changes.
+"""
+from collections import defaultdict
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from rest_framework import serializers
+from rest_framework.reverse import reverse
+from rest_framework.utils.urls import replace_query_param
+
+from .models import Comment
+from .pagination import ThreadCursorPagination
+from .threads import PREVIEW_REPLIES, PREVIEW_ROOTS
+
+AUTHOR_COLUMNS = (
+    'author_id', 'author__username',
+    'author__profile__id', 'author__profile__total_karma', 'author__profile__created_at',
+)
+POST_COLUMNS = ('id', 'content', 'created_at', 'like_count', 'comment_count') + AUTHOR_COLUMNS
+COMMENT_COLUMNS = (
+    'id', 'post_id', 'parent_id', 'content', 'created_at', 'like_count', 'reply_count', 'depth',
+) + AUTHOR_COLUMNS
+
+# One shared field instance formats every timestamp exactly like the serializers
+format_datetime = serializers.DateTimeField().to_representation
+
+
+def post_rows(queryset):
+    return list(queryset.values(*POST_COLUMNS))
+
+
+def first_rows(queryset, partition, limit):
+    """
+    The first ``limit`` rows (oldest first) of every ``partition`` group in
+    one windowed query, the same query a sliced Prefetch runs.
+    """
+    return queryset.annotate(
+        position=Window(RowNumber(), partition_by=[F(partition)], order_by=[F('created_at'), F('id')])
+    ).filter(position__lte=limit).order_by('created_at', 'id').values(*COMMENT_COLUMNS)
+
+
+def preview_roots(post_ids, roots):
+    return first_rows(Comment.objects.filter(post_id__in=post_ids, parent__isnull=True), 'post_id', roots + 1)
+
+
+def preview_replies(root_ids, replies):
+    return first_rows(Comment.objects.filter(parent_id__in=root_ids), 'parent_id', replies)
+
+
+def group_rows(rows, key):
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row[key]].append(row)
+    return grouped
+
+
+def shown_root_ids(roots_by_post, roots):
+    return [row['id'] for rows in roots_by_post.values() for row in rows[:roots]]
+
+
+def fetch_previews(post_ids, roots=PREVIEW_ROOTS, replies=PREVIEW_REPLIES):
+    """
+    Rows for the thread preview of each post, as comment_preview_prefetches
+    loads them: ``({post_id: first roots + 1 root rows}, {root_id: reply rows})``.
+    """
+    roots_by_post = group_rows(preview_roots(post_ids, roots), 'post_id')
+    shown = shown_root_ids(roots_by_post, roots)
+    replies_by_parent = defaultdict(list)
+    if shown and replies > 0:
+        replies_by_parent = group_rows(preview_replies(shown, replies), 'parent_id')
+    return roots_by_post, replies_by_parent
+
+
+async def afetch_previews(post_ids, roots=PREVIEW_ROOTS, replies=PREVIEW_REPLIES):
+    """fetch_previews with the async ORM; ``post_ids`` may also be a subquery"""
+    roots_by_post = group_rows([row async for row in preview_roots(post_ids, roots)], 'post_id')
+    shown = shown_root_ids(roots_by_post, roots)
+    replies_by_parent = defaultdict(list)
+    if shown and replies > 0:
+        replies_by_parent = group_rows([row async for row in preview_replies(shown, replies)], 'parent_id')
+    return roots_by_post, replies_by_parent
+
+
+def preview_comment_ids(previews, roots=PREVIEW_ROOTS):
+    """Ids of the comments render_posts will show, for liked_context"""
+    roots_by_post, replies_by_parent = previews
+    ids = []
+    for rows in roots_by_post.values():
+        for row in rows[:roots]:
+            ids.append(row['id'])
+            ids.extend(reply['id'] for reply in replies_by_parent.get(row['id'], ()))
+    return ids
+
+
+def render_author(row):
+    if row['author__profile__id'] is None:
+        profile = None
+    else:
+        profile = {
+            'total_karma': row['author__profile__total_karma'],
+            'created_at': format_datetime(row['author__profile__created_at']),
+        }
+    return {'id': row['author_id'], 'username': row['author__username'], 'profile': profile}
+
+
+def render_comment(row, request, liked_comment_ids, loaded_replies):
+    more_replies = None
+    if row['reply_count'] > len(loaded_replies):
+        more_replies = reverse('comment-replies', args=[row['id']], request=request)
+        if loaded_replies:
+            last = loaded_replies[-1]
+            more_replies = replace_query_param(
+                more_replies, 'cursor', ThreadCursorPagination.encode_position(last['created_at'], last['id'])
+            )
+    return {
+        'id': row['id'],
+        'post': row['post_id'],
+        'author': render_author(row),
+        'parent': row['parent_id'],
+        'content': row['content'],
+        'created_at': format_datetime(row['created_at']),
+        'like_count': row['like_count'],
+        'replies': [],
+        'reply_count': row['reply_count'],
+        'more_replies': more_replies,
+        'depth': row['depth'],
+        'has_liked': row['id'] in liked_comment_ids,
+    }
+
+
+def render_posts(rows, previews, request=None, liked_post_ids=(), liked_comment_ids=(), roots=PREVIEW_ROOTS):
+    """Post dicts for ``rows`` with their thread previews, as PostSerializer(many=True) renders them"""
+    roots_by_post, replies_by_parent = previews
+    thread_url = None
+    posts = []
+    for row in rows:
+        loaded_roots = roots_by_post.get(row['id'], [])
+        comments = []
+        for root in loaded_roots[:roots]:
+            loaded_replies = replies_by_parent.get(root['id'], [])
+            comment = render_comment(root, request, liked_comment_ids, loaded_replies)
+            comment['replies'] = [
+                render_comment(reply, request, liked_comment_ids, ()) for reply in loaded_replies
+            ]
+            comments.append(comment)
+
+        more_comments = None
+        if len(loaded_roots) > roots:
+            if thread_url is None:
+                thread_url = reverse('comment-thread', request=request)
+            last = loaded_roots[roots - 1]
+            more_comments = replace_query_param(
+                replace_query_param(thread_url, 'post_id', row['id']),
+                'cursor', ThreadCursorPagination.encode_position(last['created_at'], last['id']),
+            )
+
+        posts.append({
+            'id': row['id'],
+            'author': render_author(row),
+            'content': row['content'],
+            'created_at': format_datetime(row['created_at']),
+            'like_count': row['like_count'],
+            'comment_count': row['comment_count'],
+            'has_liked': row['id'] in liked_post_ids,
+            'comments': comments,
+            'more_comments': more_comments,
+        })
+    return posts
@@ -1,6 +1,12 @@
 from rest_framework import serializers
+from rest_framework.reverse import reverse
+from rest_framework.utils.urls import replace_query_param
 from django.contrib.auth.models import User
+from .fragments import FragmentCacheMixin, FragmentListSerializer
 from .models import Post, Comment, Like
+from .pagination import ThreadCursorPagination
+from .threads import flatten_preview, preview_comments
+from .tree import build_comment_forest
 from users.models import UserProfile
 from django.contrib.contenttypes.models import ContentType
 
@@ -19,33 +25,50 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'profile']
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(FragmentCacheMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
-    like_count = serializers.SerializerMethodField()
     replies = serializers.SerializerMethodField()
-    depth = serializers.SerializerMethodField()
+    more_replies = serializers.SerializerMethodField()
     has_liked = serializers.SerializerMethodField()
     
     class Meta:
         model = Comment
         fields = ['id', 'post', 'author', 'parent', 'content', 
-                 'created_at', 'like_count', 'replies', 'depth', 'has_liked']
-        read_only_fields = ['author', 'created_at', 'like_count', 'depth']
+                 'created_at', 'like_count', 'replies', 'reply_count', 'more_replies',
+                 'depth', 'has_liked']
+        read_only_fields = ['author', 'created_at', 'like_count', 'reply_count', 'depth']
+        list_serializer_class = FragmentListSerializer
     
-    def get_like_count(self, obj):
-        # Use cached value if available
-        if hasattr(obj, '_like_count'):
-            return obj._like_count
-        return obj.like_count
+    volatile_fields = ['like_count', 'replies', 'reply_count', 'more_replies', 'has_liked',
+                       'author.profile.total_karma']
+    
+    def validate(self, attrs):
+        parent = attrs.get('parent')
+        if parent is not None and parent.depth >= Comment.MAX_DEPTH:
+            raise serializers.ValidationError(
+                {'parent': f'Replies can be nested at most {Comment.MAX_DEPTH} levels deep.'}
+            )
+        return attrs
     
     def get_replies(self, obj):
         # Replies are populated by the view layer
         return getattr(obj, 'serialized_replies', [])
     
-    def get_depth(self, obj):
-        return obj.depth()
+    def get_more_replies(self, obj):
+        """Link to the direct replies not included in this response, if any"""
+        loaded = getattr(obj, 'preview_replies', [])
+        if obj.reply_count <= len(loaded):
+            return None
+        url = reverse('comment-replies', args=[obj.id], request=self.context.get('request'))
+        if loaded:
+            url = replace_query_param(url, 'cursor', ThreadCursorPagination.encode_cursor(loaded[-1]))
+        return url
     
     def get_has_liked(self, obj):
+        # Use the liked-id set resolved by the view if available
+        liked_ids = self.context.get('liked_comment_ids')
+        if liked_ids is not None:
+            return obj.id in liked_ids
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             # Check if user has liked this comment
@@ -53,34 +76,54 @@ class CommentSerializer(serializers.ModelSerializer):
         return False
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(FragmentCacheMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
-    like_count = serializers.SerializerMethodField()
-    comment_count = serializers.SerializerMethodField()
     has_liked = serializers.SerializerMethodField()
-    comments = CommentSerializer(many=True, read_only=True)
+    comments = serializers.SerializerMethodField()
+    more_comments = serializers.SerializerMethodField()
     
     class Meta:
         model = Post
         fields = ['id', 'author', 'content', 'created_at', 
-                 'like_count', 'comment_count', 'has_liked', 'comments']
+                 'like_count', 'comment_count', 'has_liked', 'comments', 'more_comments']
         read_only_fields = ['author', 'created_at', 'like_count', 'comment_count']
+        list_serializer_class = FragmentListSerializer
+    
+    volatile_fields = ['like_count', 'comment_count', 'has_liked', 'comments', 'more_comments',
+                       'author.profile.total_karma']
     
-    def get_like_count(self, obj):
-        # Use cached value if available
-        if hasattr(obj, '_like_count'):
-            return obj._like_count
-        return obj.like_count
+    def get_comments(self, obj):
+        """Bounded preview of the thread, prefetched by the view (see feed/threads.py)"""
+        roots, _ = preview_comments(obj)
+        data = CommentSerializer(flatten_preview(roots), many=True, context=self.context).data
+        return build_comment_forest(data).get(obj.id, [])
     
-    def get_comment_count(self, obj):
-        # Use cached value if available
-        if hasattr(obj, '_comment_count'):
-            return obj._comment_count
-        return obj.comment_count
+    def get_more_comments(self, obj):
+        """Link to the remaining top-level comments when the preview is cut off"""
+        roots, has_more = preview_comments(obj)
+        if not has_more:
+            return None
+        url = reverse('comment-thread', request=self.context.get('request'))
+        url = replace_query_param(url, 'post_id', obj.id)
+        return replace_query_param(url, 'cursor', ThreadCursorPagination.encode_cursor(roots[-1]))
     
     def get_has_liked(self, obj):
+        # Use the liked-id set resolved by the view if available
+        liked_ids = self.context.get('liked_post_ids')
+        if liked_ids is not None:
+            return obj.id in liked_ids
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             # Check if user has liked this post
             return obj.likes.filter(user=request.user).exists()
-        return False
\ No newline at end of file
+        return False
+
+
+class LikeOperationSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=['post', 'comment'])
+    id = serializers.IntegerField(min_value=1)
+    liked = serializers.BooleanField()
+
+
+class BulkLikeSerializer(serializers.Serializer):
+    operations = LikeOperationSerializer(many=True, allow_empty=False, max_length=200)
@@ -1,38 +1,83 @@
+from django.db import transaction
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.contrib.contenttypes.models import ContentType
 from .models import Like, Post, Comment
-from users.models import UserProfile
+from .cache import feed_cache
+from .counters import adjust_comment_count, adjust_reply_count, counter_signals_suppressed
+from .events import like_counts_changed, record_like_event
+from .likes import like_signals_suppressed
+from .live import live_hub
+
+# Likes created or deleted through feed.likes.toggle_like record their own
+# events; these receivers cover every other path (admin, cascades, shell).
 
 @receiver(post_save, sender=Like)
 def update_karma_on_like_create(sender, instance, created, **kwargs):
-    if created:
+    if created and not like_signals_suppressed():
         content_object = instance.content_object
-        if isinstance(content_object, Post):
-            author = content_object.author
-            karma_increment = 5
-        elif isinstance(content_object, Comment):
-            author = content_object.author
-            karma_increment = 1
-        else:
-            return
-        
-        profile, _ = UserProfile.objects.get_or_create(user=author)
-        profile.total_karma += karma_increment
-        profile.save()
+        if isinstance(content_object, (Post, Comment)):
+            record_like_event(content_object, instance.created_at, 1)
 
 @receiver(post_delete, sender=Like)
 def update_karma_on_like_delete(sender, instance, **kwargs):
+    if like_signals_suppressed():
+        return
     content_object = instance.content_object
-    if isinstance(content_object, Post):
-        author = content_object.author
-        karma_decrement = 5
-    elif isinstance(content_object, Comment):
-        author = content_object.author
-        karma_decrement = 1
+    if isinstance(content_object, (Post, Comment)):
+        record_like_event(content_object, instance.created_at, -1)
+
+@receiver(post_save, sender=Comment)
+def update_comment_count_on_create(sender, instance, created, **kwargs):
+    if created and not counter_signals_suppressed():
+        adjust_comment_count(instance.post_id, 1)
+        if instance.parent_id:
+            adjust_reply_count(instance.parent_id, 1)
+
+@receiver(post_delete, sender=Comment)
+def update_comment_count_on_delete(sender, instance, **kwargs):
+    if counter_signals_suppressed():
+        return
+    adjust_comment_count(instance.post_id, -1)
+    if instance.parent_id:
+        adjust_reply_count(instance.parent_id, -1)
+
+# Feed page cache: bump only the versions a write affects, once it commits
+# so a concurrent reader cannot cache the page again from pre-write data.
+# Bulk operations that suppress counter signals invalidate the whole cache.
+
+@receiver(post_save, sender=Post)
+def invalidate_feed_on_post_save(sender, instance, created, **kwargs):
+    if counter_signals_suppressed():
+        return
+    if created:
+        # A new post can only appear on the first page
+        transaction.on_commit(feed_cache.invalidate_head)
     else:
+        transaction.on_commit(lambda: feed_cache.invalidate_posts([instance.id]))
+
+@receiver(post_delete, sender=Post)
+def invalidate_feed_on_post_delete(sender, instance, **kwargs):
+    if counter_signals_suppressed():
+        return
+    transaction.on_commit(lambda: feed_cache.invalidate_posts([instance.id]))
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_feed_on_comment_change(sender, instance, **kwargs):
+    if counter_signals_suppressed():
         return
-    
-    profile, _ = UserProfile.objects.get_or_create(user=author)
-    profile.total_karma -= karma_decrement
-    profile.save()
\ No newline at end of file
+    transaction.on_commit(lambda: feed_cache.invalidate_posts([instance.post_id]))
+
+@receiver(like_counts_changed)
+def invalidate_feed_on_like_counts(sender, object_ids, **kwargs):
+    if sender is Post:
+        post_ids = list(object_ids)
+    else:
+        post_ids = list(Comment.objects.filter(id__in=object_ids).values_list('post_id', flat=True))
+    transaction.on_commit(lambda: feed_cache.invalidate_posts(post_ids))
+
+@receiver(like_counts_changed)
+def publish_like_counts(sender, object_ids, **kwargs):
+    # Server-sent event clients hear about it once the counts are committed
+    object_ids = list(object_ids)
+    transaction.on_commit(lambda: live_hub.publish(sender, object_ids))
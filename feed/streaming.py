@@ -0,0 +1,99 @@
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from .likes import liked_context
+from .models import Comment
+from .rows import COMMENT_COLUMNS, POST_COLUMNS, fetch_previews, preview_comment_ids, render_comment, render_posts
+
+# Rows fetched per database round trip (and per preview/has_liked lookup)
+CHUNK_SIZE = 500
+
+
+def dumps(value):
+    """Compact UTF-8 JSON, formatted like DRF's JSONRenderer"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def json_response(chunks, request):
+    """
+    Stream ``chunks`` as a JSON response. Under ASGI, Django would read a
+    synchronous iterator to the end before sending anything, so there each
+    chunk is produced in a worker thread and sent as soon as it is ready.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = aiterate(chunks)
+    return StreamingHttpResponse(chunks, content_type='application/json')
+
+
+async def aiterate(chunks):
+    """Async iterator over a synchronous one, fetching each item with sync_to_async"""
+    iterator = iter(chunks)
+    # Thread-sensitive, so every chunk (and its server-side cursor) uses the same connection
+    fetch = sync_to_async(next)
+    try:
+        while (chunk := await fetch(iterator, None)) is not None:
+            yield chunk
+    finally:
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close)()
+
+
+def stream_feed_page(paginator, request, queryset, page_size):
+    """
+    Yield one feed page as JSON, ``{"results": [...], "next": ...}``, a
+    chunk of posts at a time.
+
+    Posts are read through a server-side cursor and rendered from values()
+    rows with one preview and one has_liked lookup per chunk, so memory
+    stays flat however large ``page_size`` is. ``results`` come first
+    because ``next`` is only known once the page has been read.
+    """
+    rows = paginator.after(queryset, paginator.decode_cursor(request)).values(*POST_COLUMNS)
+    rows = rows[:page_size + 1].iterator(chunk_size=CHUNK_SIZE)
+
+    yield b'{"results":['
+    sent, last, has_next = 0, None, False
+    for chunk in chunked(rows, CHUNK_SIZE):
+        if sent + len(chunk) > page_size:
+            # The lookahead row only tells us there is a next page
+            has_next = True
+            chunk = chunk[:page_size - sent]
+        if not chunk:
+            break
+        previews = fetch_previews([row['id'] for row in chunk])
+        liked = liked_context(request.user, [row['id'] for row in chunk], preview_comment_ids(previews))
+        posts = render_posts(chunk, previews, request, liked['liked_post_ids'], liked['liked_comment_ids'])
+        yield (b',' if sent else b'') + b','.join(dumps(post) for post in posts)
+        sent += len(chunk)
+        last = chunk[-1]
+
+    paginator.restore_page(request, paginator.encode_cursor(last) if has_next else None)
+    yield b'],"next":' + dumps(paginator.get_next_link()) + b'}'
+
+
+def stream_thread(request, post_id):
+    """
+    Yield every comment of a post as a JSON array in CommentSerializer
+    shape, oldest first, so parents always come before their replies.
+    """
+    rows = Comment.objects.filter(post_id=post_id).order_by('created_at', 'id').values(*COMMENT_COLUMNS)
+
+    yield b'['
+    first = True
+    for chunk in chunked(rows.iterator(chunk_size=CHUNK_SIZE), CHUNK_SIZE):
+        liked = liked_context(request.user, comment_ids=[row['id'] for row in chunk])['liked_comment_ids']
+        yield (b'' if first else b',') + b','.join(
+            dumps(render_comment(row, request, liked, ())) for row in chunk
+        )
+        first = False
+    yield b']'
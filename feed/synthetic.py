@@ -0,0 +1,117 @@
+import math
+import random
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+
+from .counters import rebuild_counters
+from .events import seed_like_events
+from .models import Post, Comment, Like
+from leaderboard.ledger import rebuild_ledger
+from users.models import UserProfile
+
+
+def populate(posts, comments, users=100, max_depth=6, fan_out=5, reply_ratio=0.6, like_density=0.0,
+             seed=0, batch_size=5000):
+    """
+    Bulk insert a deterministic synthetic feed for benchmarks.
+
+    ``users`` authors with profiles write ``posts`` posts and ``comments``
+    comments. Roughly ``reply_ratio`` of the comments reply to an earlier
+    comment of the same post, never deeper than ``max_depth`` and with at
+    most ``fan_out`` direct replies per comment. Every user likes each post
+    and comment with probability ``like_density``.
+
+    The same arguments always produce the same rows (usernames are derived
+    from ``seed``, so use a new seed to populate the same database twice).
+    Rows go in with ``bulk_create`` batches (no signals); comment paths are
+    derived in memory, and counters, like events, karma and the leaderboard
+    window are rebuilt once at the end. Returns the created posts' ids.
+    """
+    rng = random.Random(seed)
+    prefix = f"synthetic-{seed}-"
+
+    authors = User.objects.bulk_create(
+        [User(username=f"{prefix}{i}") for i in range(users)], batch_size=batch_size
+    )
+    UserProfile.objects.bulk_create([UserProfile(user=user) for user in authors], batch_size=batch_size)
+    author_ids = [user.id for user in authors]
+
+    post_ids = []
+    for start in range(0, posts, batch_size):
+        batch = [
+            Post(author_id=rng.choice(author_ids), content=f"Synthetic post {i}. " + 'Lorem ipsum. ' * rng.randint(1, 20))
+            for i in range(start, min(start + batch_size, posts))
+        ]
+        post_ids.extend(post.id for post in Post.objects.bulk_create(batch))
+
+    # Shape the forest in memory first: (post_id, parent index, depth) per comment
+    planned = []
+    # Indexes of comments that may still get replies, and how many each has
+    open_parents, replies = [], {}
+    for i in range(comments):
+        parent = None
+        if open_parents and rng.random() < reply_ratio:
+            slot = rng.randrange(len(open_parents))
+            parent = open_parents[slot]
+            replies[parent] += 1
+            if replies[parent] >= fan_out:
+                # Swap-remove keeps picking O(1)
+                open_parents[slot] = open_parents[-1]
+                open_parents.pop()
+        if parent is None:
+            planned.append((rng.choice(post_ids), None, 0))
+        else:
+            planned.append((planned[parent][0], parent, planned[parent][2] + 1))
+        if planned[i][2] < max_depth and fan_out > 0:
+            open_parents.append(i)
+            replies[i] = 0
+
+    # Insert one level at a time so every parent has its id (and path) first
+    ids, paths = [None] * comments, [None] * comments
+    by_depth = {}
+    for i, (_, _, depth) in enumerate(planned):
+        by_depth.setdefault(depth, []).append(i)
+    for depth in sorted(by_depth):
+        level = by_depth[depth]
+        for start in range(0, len(level), batch_size):
+            indexes = level[start:start + batch_size]
+            batch = []
+            for i in indexes:
+                post_id, parent, _ = planned[i]
+                path = '' if parent is None else paths[parent] + Comment.path_segment(ids[parent])
+                batch.append(Comment(
+                    post_id=post_id, author_id=rng.choice(author_ids),
+                    parent_id=None if parent is None else ids[parent],
+                    content=f"Synthetic comment {i}", path=path, depth=depth,
+                ))
+            for i, comment in zip(indexes, Comment.objects.bulk_create(batch)):
+                ids[i], paths[i] = comment.id, comment.path
+    comment_ids = ids
+
+    if like_density > 0:
+        likes = []
+        for model, ids in ((Post, post_ids), (Comment, comment_ids)):
+            content_type = ContentType.objects.get_for_model(model)
+            mean = like_density * users
+            for object_id in ids:
+                count = min(users, max(0, round(rng.gauss(mean, math.sqrt(mean)))))
+                likes.extend(
+                    Like(user_id=user_id, content_type=content_type, object_id=object_id)
+                    for user_id in rng.sample(author_ids, count)
+                )
+                if len(likes) >= batch_size:
+                    Like.objects.bulk_create(likes)
+                    likes = []
+        Like.objects.bulk_create(likes)
+
+    # Subqueries rather than id lists, which could exceed the database's parameter limit
+    rebuild_counters(
+        post_ids=Post.objects.filter(author_id__in=author_ids).values('id'),
+        comment_ids=Comment.objects.filter(author_id__in=author_ids).values('id'),
+    )
+    if like_density > 0:
+        seed_like_events(Like.objects.filter(user_id__in=author_ids), batch_size=batch_size)
+        UserProfile.rebuild_karma(user_ids=author_ids)
+        rebuild_ledger()
+    return post_ids
@@ -1,3 +1,1171 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import close_old_connections, connection, router, transaction
+from django.db.models import Max
+from django.test import AsyncClient, AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from backend.metrics import flush_on_exit, metrics
+from backend.replicas import PIN_COOKIE, reading_replica, replica_reads
+from .benchmarks import QUERY_BUDGETS, run_benchmarks
+from .cache import feed_cache
+from .live import Subscriber, live_hub
+from .serializers import PostSerializer, UserSerializer
+from .models import Post, Comment, Like, LikeEvent
+from .rows import fetch_previews, post_rows, preview_comment_ids, render_posts
+from .threads import comment_preview_prefetches
+from .views import AsyncFeedView, FeedView, LiveUpdatesView
+from .likes import bulk_set_likes, liked_context, suppress_like_signals, toggle_like
+from .synthetic import populate
+from .tree import build_comment_forest
+from leaderboard.views import AsyncLeaderboardView
+from users.models import UserProfile
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, FEED_CACHE_ENABLED=True)
+class FeedTestCase(TestCase):
+    """Shared fixtures for feed API tests"""
+
+    def setUp(self):
+        cache.clear()
+        caches['fragments'].clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        UserProfile.objects.create(user=self.author)
+
+
+class FeedPaginationTests(FeedTestCase):
+
+    def test_cursor_walks_every_post_once(self):
+        posts = [Post.objects.create(author=self.author, content=f'post {i}') for i in range(5)]
+
+        seen = []
+        url = '/api/feed/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(post['id'] for post in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(seen, [post.id for post in reversed(posts)])
+
+    def test_page_cost_does_not_grow_with_table_size(self):
+        def page_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get('/api/feed/?page_size=2')
+            self.assertEqual(len(response.data['results']), 2)
+            return len(ctx.captured_queries)
+
+        for i in range(2):
+            post = Post.objects.create(author=self.author, content=f'post {i}')
+            Comment.objects.create(post=post, author=self.author, content='comment')
+        baseline = page_queries()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(10):
+                post = Post.objects.create(author=self.author, content=f'more {i}')
+                Comment.objects.create(post=post, author=self.author, content='comment')
+        self.assertEqual(page_queries(), baseline)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/feed/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class CommentTreePathTests(FeedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.create(author=self.author, content='thread')
+        self.root = Comment.objects.create(post=self.post, author=self.author, content='root')
+        self.child = Comment.objects.create(post=self.post, author=self.author, parent=self.root, content='child')
+        self.leaf = Comment.objects.create(post=self.post, author=self.author, parent=self.child, content='leaf')
+        self.sibling = Comment.objects.create(post=self.post, author=self.author, content='other root')
+
+    def test_depth_is_stored_at_create_time(self):
+        depths = dict(Comment.objects.values_list('id', 'depth'))
+        self.assertEqual(depths[self.root.id], 0)
+        self.assertEqual(depths[self.child.id], 1)
+        self.assertEqual(depths[self.leaf.id], 2)
+
+    def test_subtrees_of_siblings_with_different_digit_lengths(self):
+        # Only byte order keeps the ranges of '0000900007/' and '0009000070/' apart;
+        # a locale collation that ignores the '/' separators mixes them up
+        def reply(comment_id, parent=None):
+            return Comment.objects.create(id=comment_id, post=self.post, author=self.author, parent=parent,
+                                          content=str(comment_id))
+
+        short, long = reply(900007), reply(9000070)
+        child, other_child = reply(9000700, short), reply(9000071, long)
+        grandchild = reply(90007000, child)
+
+        self.assertEqual(set(short.subtree()), {short, child, grandchild})
+        self.assertEqual(set(short.descendants()), {child, grandchild})
+        self.assertEqual(set(long.subtree()), {long, other_child})
+        self.assertEqual(set(child.descendants()), {grandchild})
+
+    def test_replies_past_the_maximum_depth_are_rejected(self):
+        Comment.objects.filter(id=self.leaf.id).update(depth=Comment.MAX_DEPTH)
+        self.client.force_authenticate(self.author)
+        response = self.client.post('/api/comments/', {'post': self.post.id, 'parent': self.leaf.id, 'content': 'deeper'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('parent', response.json())
+        response = self.client.post('/api/comments/', {'post': self.post.id, 'parent': self.child.id, 'content': 'ok'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_ancestors_in_one_query(self):
+        leaf = Comment.objects.get(id=self.leaf.id)
+        with self.assertNumQueries(1):
+            ancestors = list(leaf.ancestors())
+        self.assertEqual(ancestors, [self.root, self.child])
+
+    def test_subtree_in_one_query(self):
+        with self.assertNumQueries(1):
+            subtree = set(self.root.subtree())
+        self.assertEqual(subtree, {self.root, self.child, self.leaf})
+        self.assertEqual(set(self.child.descendants()), {self.leaf})
+
+
+class CommentForestTests(FeedTestCase):
+
+    def test_deep_thread_does_not_recurse(self):
+        chain = [{'id': i, 'post': 1, 'parent': i - 1 or None} for i in range(1, 5001)]
+        forest = build_comment_forest(chain)
+        node, depth = forest[1][0], 0
+        while node['replies']:
+            node, depth = node['replies'][0], depth + 1
+        self.assertEqual(depth, 4999)
+
+    def test_retrieve_nests_replies(self):
+        post = Post.objects.create(author=self.author, content='thread')
+        root = Comment.objects.create(post=post, author=self.author, content='root')
+        reply = Comment.objects.create(post=post, author=self.author, parent=root, content='reply')
+
+        response = self.client.get(f'/api/posts/{post.id}/')
+
+        self.assertEqual([c['id'] for c in response.data['comments']], [root.id])
+        self.assertEqual([c['id'] for c in response.data['comments'][0]['replies']], [reply.id])
+
+
+class LikedSetTests(FeedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        UserProfile.objects.create(user=self.reader)
+        self.client.force_authenticate(self.reader)
+
+    def create_page(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_page(count)
+
+    def _create_page(self, count):
+        for i in range(count):
+            post = Post.objects.create(author=self.author, content=f'post {i}')
+            comment = Comment.objects.create(post=post, author=self.author, content='comment')
+            Like.objects.create(user=self.reader, content_object=post)
+            Like.objects.create(user=self.reader, content_object=comment)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_list_pages_cost_constant_queries(self):
+        ContentType.objects.get_for_models(Post, Comment)
+        for url in ['/api/posts/', '/api/comments/', '/api/feed/']:
+            with self.subTest(url=url):
+                Like.objects.all().delete()
+                Comment.objects.all().delete()
+                Post.objects.all().delete()
+                self.create_page(2)
+                small, _ = self.count_queries(url)
+                self.create_page(6)
+                large, response = self.count_queries(url)
+                self.assertEqual(small, large)
+                self.assertTrue(all(item['has_liked'] for item in response.data['results']))
+
+
+class CounterTests(FeedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.create(author=self.author, content='counted')
+
+    def test_counters_follow_likes_and_comments(self):
+        comment = Comment.objects.create(post=self.post, author=self.author, content='comment')
+        reply = Comment.objects.create(post=self.post, author=self.author, parent=comment, content='reply')
+        like = Like.objects.create(user=self.author, content_object=self.post)
+        Like.objects.create(user=self.author, content_object=reply)
+        self.post.refresh_from_db()
+        reply.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count, reply.like_count), (1, 2, 1))
+
+        like.delete()
+        comment.delete()  # cascades to the reply
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (0, 0))
+
+    def test_rebuild_counters_command_repairs_drift(self):
+        Comment.objects.create(post=self.post, author=self.author, content='comment')
+        Like.objects.create(user=self.author, content_object=self.post)
+        Post.objects.update(like_count=42, comment_count=42)
+
+        call_command('rebuild_counters', stdout=StringIO())
+
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+
+
+class LikeEventTests(FeedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.create(author=self.author, content='liked')
+        self.fans = [User.objects.create_user(username=f'fan{i}') for i in range(4)]
+
+    def like_as(self, fan):
+        self.client.force_authenticate(fan)
+        return self.client.post(f'/api/posts/{self.post.id}/like/')
+
+    @override_settings(LIKE_EVENTS_ASYNC=True)
+    def test_worker_applies_coalesced_events(self):
+        for fan in self.fans:
+            self.like_as(fan)
+        self.like_as(self.fans[0])  # unlike again
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertEqual(LikeEvent.objects.filter(processed_at__isnull=True).count(), 5)
+
+        # One UPDATE each for the post counter, the author's karma and the bucket
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('process_like_events', stdout=StringIO())
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 4)  # + marking the batch processed
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 3)
+        self.assertEqual(UserProfile.objects.get(user=self.author).total_karma, 15)
+        self.assertFalse(LikeEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_update_total_karma_reconciles_from_events(self):
+        for fan in self.fans:
+            self.like_as(fan)
+        UserProfile.objects.filter(user=self.author).update(total_karma=-7)
+
+        profile = UserProfile.objects.get(user=self.author)
+        self.assertEqual(profile.update_total_karma(), 20)
+
+    @override_settings(LIKE_EVENTS_ASYNC=True)
+    def test_old_processed_events_are_compacted(self):
+        comment = Comment.objects.create(post=self.post, author=self.author, content='liked too')
+        for fan in self.fans:
+            self.like_as(fan)
+        self.like_as(self.fans[0])  # unlike again
+        self.client.post(f'/api/comments/{comment.id}/like/')
+        self.client.post(f'/api/comments/{comment.id}/like/')
+        call_command('process_like_events', stdout=StringIO())
+        LikeEvent.objects.update(processed_at=timezone.now() - timedelta(days=8))
+        self.like_as(self.fans[1])  # queued: never compacted
+
+        out = StringIO()
+        call_command('compact_like_events', stdout=out)
+        self.assertIn('Compacted 7 like events into 1', out.getvalue())
+        # The roll-up itself is recent, so a second run keeps it
+        out = StringIO()
+        call_command('compact_like_events', stdout=out)
+        self.assertIn('Compacted 0 like events into 0', out.getvalue())
+
+        rollup = LikeEvent.objects.get(processed_at__isnull=False)
+        self.assertEqual((rollup.object_id, rollup.delta, rollup.karma), (self.post.id, 3, 15))
+        self.assertEqual(LikeEvent.objects.filter(processed_at__isnull=True).count(), 1)
+        profile = UserProfile.objects.get(user=self.author)
+        self.assertEqual(profile.update_total_karma(), 15)
+
+
+class BulkLikeTests(FeedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.fan = User.objects.create_user(username='fan')
+        self.client.force_authenticate(self.fan)
+        self.posts = [Post.objects.create(author=self.author, content=f'post {i}') for i in range(3)]
+        self.comment = Comment.objects.create(post=self.posts[0], author=self.author, content='comment')
+
+    def test_applies_operations_and_reports_each(self):
+        Like.objects.create(user=self.fan, content_object=self.posts[2])
+        operations = [
+            {'type': 'post', 'id': self.posts[0].id, 'liked': True},
+            {'type': 'post', 'id': self.posts[1].id, 'liked': False},
+            {'type': 'post', 'id': self.posts[2].id, 'liked': False},
+            {'type': 'comment', 'id': self.comment.id, 'liked': True},
+            {'type': 'comment', 'id': 999999, 'liked': True},
+        ]
+
+        response = self.client.post('/api/likes/bulk/', {'operations': operations}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([r.get('changed') for r in results], [True, False, True, True, None])
+        self.assertEqual(results[-1]['error'], 'Not found')
+        self.assertEqual(
+            set(Like.objects.filter(user=self.fan).values_list('object_id', flat=True)),
+            {self.posts[0].id, self.comment.id},
+        )
+        self.assertEqual(UserProfile.objects.get(user=self.author).total_karma, 6)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def run(liked):
+            operations = [{'type': 'post', 'id': post.id, 'liked': liked} for post in self.posts]
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.post('/api/likes/bulk/', {'operations': operations[:size]}, format='json')
+            return len(ctx.captured_queries)
+
+        size = 1
+        run(True), run(False)  # warm the content type cache
+        small = run(True), run(False)
+        size = 3
+        self.assertEqual((run(True), run(False)), small)
+        self.assertEqual(Post.objects.filter(like_count=0).count(), 3)
+
+    def test_concurrent_like_is_not_counted_twice(self):
+        bulk_create = Like.objects.bulk_create
+
+        def race(likes, **kwargs):
+            # Another request likes the same post just before this insert
+            with self.captureOnCommitCallbacks(execute=True):
+                toggle_like(self.fan, self.posts[0])
+            return bulk_create(likes, **kwargs)
+
+        operations = [{'type': 'post', 'id': post.id, 'liked': True} for post in self.posts[:2]]
+        with mock.patch.object(Like.objects, 'bulk_create', side_effect=race):
+            results = bulk_set_likes(self.fan, operations)
+
+        self.assertEqual([result['changed'] for result in results], [False, True])
+        self.assertEqual(Like.objects.filter(user=self.fan).count(), 2)
+        self.assertEqual(list(Post.objects.filter(id__in=[p.id for p in self.posts[:2]])
+                              .order_by('id').values_list('like_count', flat=True)), [1, 1])
+        self.assertEqual(UserProfile.objects.get(user=self.author).total_karma, 10)
+
+
+class ThreadPaginationTests(FeedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.create(author=self.author, content='viral')
+        self.roots = [
+            Comment.objects.create(post=self.post, author=self.author, content=f'root {i}') for i in range(7)
+        ]
+        self.replies = [
+            Comment.objects.create(post=self.post, author=self.author, parent=self.roots[0], content=f'reply {i}')
+            for i in range(5)
+        ]
+        Comment.objects.create(post=self.post, author=self.author, parent=self.replies[0], content='deep')
+
+    def test_feed_embeds_a_bounded_preview(self):
+        post = self.client.get('/api/feed/').data['results'][0]
+
+        self.assertEqual(post['comment_count'], 13)
+        self.assertEqual(len(post['comments']), 5)
+        self.assertIsNotNone(post['more_comments'])
+        first = post['comments'][0]
+        self.assertEqual([r['id'] for r in first['replies']], [r.id for r in self.replies[:3]])
+        self.assertEqual(first['reply_count'], 5)
+        self.assertEqual(first['replies'][0]['replies'], [])
+        self.assertIsNotNone(first['replies'][0]['more_replies'])
+
+    def test_more_links_load_the_rest_on_demand(self):
+        post = self.client.get(f'/api/posts/{self.post.id}/').data
+
+        more_roots = self.client.get(post['more_comments']).data
+        self.assertEqual([c['id'] for c in more_roots['results']], [c.id for c in self.roots[5:]])
+
+        more_replies = self.client.get(post['comments'][0]['more_replies']).data
+        self.assertEqual([c['id'] for c in more_replies['results']], [r.id for r in self.replies[3:]])
+        self.assertIsNone(more_replies['next'])
+
+    def test_thread_page_cost_is_bounded(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/comments/thread/?post_id={self.post.id}&limit=2&replies=2')
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(len(response.data['results'][0]['replies']), 2)
+        self.assertLessEqual(len(ctx.captured_queries), 3)
+
+
+class FeedCacheTests(FeedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        UserProfile.objects.create(user=self.reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts = [Post.objects.create(author=self.author, content=f'post {i}') for i in range(4)]
+
+    def get(self, url='/api/feed/?page_size=2'):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_repeat_request_is_served_from_cache(self):
+        first, _ = self.get()
+        second, queries = self.get()
+
+        self.assertEqual(first['X-Feed-Cache'], 'MISS')
+        self.assertEqual(second['X-Feed-Cache'], 'HIT')
+        self.assertEqual(queries, 0)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(feed_cache.stats(), {'hits': 1, 'misses': 1})
+
+    @override_settings(FEED_CACHE_ENABLED=False)
+    def test_process_local_cache_is_not_used(self):
+        # Without a shared cache other workers would never see the invalidations
+        self.get()
+        response, queries = self.get()
+        self.assertEqual(response['X-Feed-Cache'], 'MISS')
+        self.assertGreater(queries, 0)
+        self.assertEqual(cache.get(feed_cache.page_key(None, 2)), None)
+
+    def test_writes_invalidate_only_affected_pages(self):
+        head = self.get()[0]
+        second_page = self.get(head.data['next'])[0]
+        self.assertEqual(self.get()[0]['X-Feed-Cache'], 'HIT')
+
+        # A comment on a first-page post leaves the second page cached
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.posts[3], author=self.author, content='hi')
+        response = self.get()[0]
+        self.assertEqual(response['X-Feed-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['comment_count'], 1)
+        self.assertEqual(self.get(head.data['next'])[0]['X-Feed-Cache'], 'HIT')
+
+        # So does a like on a second-page post for the first page
+        self.client.force_authenticate(self.reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.posts[0].id}/like/')
+        self.assertEqual(self.get()[0]['X-Feed-Cache'], 'HIT')
+        response = self.get(head.data['next'])[0]
+        self.assertEqual(response['X-Feed-Cache'], 'MISS')
+        self.assertNotEqual(response.data, second_page.data)
+        self.assertEqual(response.data['results'][-1]['like_count'], 1)
+
+        # A new post only lands on the first page
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(author=self.author, content='new')
+        self.assertEqual(self.get()[0]['X-Feed-Cache'], 'MISS')
+
+    def test_signed_in_users_get_their_own_likes(self):
+        Like.objects.create(user=self.reader, content_object=self.posts[3])
+        anonymous = self.get()[0]
+        self.assertFalse(anonymous.data['results'][0]['has_liked'])
+
+        self.client.force_authenticate(self.reader)
+        ContentType.objects.get_for_models(Post, Comment)  # cached in any longer-running process
+        response, queries = self.get()
+        self.assertEqual(response['X-Feed-Cache'], 'HIT')
+        self.assertEqual(queries, 1)
+        self.assertEqual([post['has_liked'] for post in response.data['results']], [True, False])
+
+        self.client.force_authenticate(None)
+        self.assertFalse(self.get()[0].data['results'][0]['has_liked'])
+
+
+class FragmentCacheTests(FeedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            post = Post.objects.create(author=self.author, content=f'post {i}')
+            Comment.objects.create(post=post, author=self.author, content='comment')
+
+    def render(self):
+        posts = self.client.get('/api/posts/').data['results']
+        return [dict(post) for post in posts]
+
+    def test_warm_posts_skip_nested_serializers(self):
+        cold = self.render()
+        with mock.patch.object(UserSerializer, 'to_representation', side_effect=AssertionError):
+            warm = self.render()
+        self.assertEqual(warm, cold)
+        self.assertEqual(list(warm[0]), PostSerializer.Meta.fields)
+
+    def test_volatile_fields_are_fresh(self):
+        self.render()
+        post = Post.objects.latest('created_at')
+        post.content = 'edited'
+        post.save()
+        Like.objects.create(user=self.author, content_object=post)
+
+        first = self.render()[0]
+        self.assertEqual(first['like_count'], 1)
+        self.assertEqual(first['author']['profile']['total_karma'], 5)
+        self.assertEqual(first['comments'][0]['author']['profile']['total_karma'], 5)
+        self.assertEqual(first['content'], 'edited')
+
+
+class RowRenderingTests(FeedTestCase):
+    """The values() read path must render byte-for-byte what the serializers do"""
+
+    def setUp(self):
+        super().setUp()
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        UserProfile.objects.create(user=self.reader)
+        no_profile = User.objects.create_user(username='noprofile')
+
+        busy = Post.objects.create(author=self.author, content='busy "quoted" \u00e9')
+        roots = [Comment.objects.create(post=busy, author=self.reader, content=f'root {i}') for i in range(7)]
+        replies = [
+            Comment.objects.create(post=busy, author=no_profile, parent=roots[0], content=f'reply {i}')
+            for i in range(4)
+        ]
+        Comment.objects.create(post=busy, author=self.author, parent=replies[0], content='deep')
+        Comment.objects.create(post=busy, author=self.author, parent=roots[1], content='only reply')
+        Post.objects.create(author=User.objects.create_user(username='ghost'), content='quiet')
+
+        Like.objects.create(user=self.reader, content_object=busy)
+        Like.objects.create(user=self.reader, content_object=roots[0])
+        Like.objects.create(user=self.reader, content_object=replies[1])
+
+    def test_matches_serializer_output(self):
+        request = APIRequestFactory().get('/api/feed/')
+        posts = list(Post.objects.select_related('author', 'author__profile').prefetch_related(
+            *comment_preview_prefetches()
+        ).order_by('-created_at', '-id'))
+        comment_ids = [c.id for c in Comment.objects.all()]
+        context = {'request': request}
+        context.update(liked_context(self.reader, [post.id for post in posts], comment_ids))
+        expected = JSONRenderer().render(PostSerializer(posts, many=True, context=context).data)
+
+        rows = post_rows(Post.objects.order_by('-created_at', '-id'))
+        previews = fetch_previews([row['id'] for row in rows])
+        liked = liked_context(self.reader, [row['id'] for row in rows], preview_comment_ids(previews))
+        rendered = render_posts(
+            rows, previews, request, liked['liked_post_ids'], liked['liked_comment_ids']
+        )
+
+        self.assertEqual(JSONRenderer().render(rendered), expected)
+        self.assertIn(b'"more_comments":"http', expected)
+        self.assertIn(b'"has_liked":true', expected)
+        self.assertIn(b'"profile":null', expected)
+
+    def test_feed_engines_agree(self):
+        self.client.force_authenticate(self.reader)
+        pages = []
+        for engine in ['serializers', 'values']:
+            cache.clear()
+            with override_settings(FEED_ENGINE=engine):
+                pages.append(self.client.get('/api/feed/?page_size=1').content)
+        self.assertEqual(pages[0], pages[1])
+
+    @override_settings(FEED_ENGINE='serializers')
+    def test_feed_engine_setting_is_read_per_request(self):
+        view = FeedView()
+        with mock.patch.object(FeedView, 'render_serializer_page', wraps=view.render_serializer_page) as render:
+            self.assertEqual(self.client.get('/api/feed/').status_code, 200)
+        render.assert_called_once()
+
+
+@mock.patch('feed.streaming.CHUNK_SIZE', 2)
+class StreamingTests(FeedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        UserProfile.objects.create(user=self.reader)
+        self.posts = [Post.objects.create(author=self.author, content=f'post {i}') for i in range(5)]
+        self.comments = [
+            Comment.objects.create(post=self.posts[0], author=self.reader, content=f'comment {i}') for i in range(3)
+        ]
+        Comment.objects.create(post=self.posts[0], author=self.author, parent=self.comments[0], content='reply')
+        Like.objects.create(user=self.reader, content_object=self.posts[1])
+        Like.objects.create(user=self.reader, content_object=self.comments[1])
+        self.client.force_authenticate(self.reader)
+
+    def stream(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_streamed_pages_match_regular_pages(self):
+        regular, streamed = [], []
+        url = '/api/feed/?page_size=3'
+        while url:
+            page = self.client.get(url).json()
+            regular.append(page['results'])
+            url = page['next']
+        url = '/api/feed/?page_size=3&stream=1'
+        while url:
+            page = self.stream(url)
+            streamed.append(page['results'])
+            url = page['next']
+
+        self.assertEqual(len(regular), 2)
+        self.assertEqual(streamed, regular)
+        self.assertTrue(regular[-1][0]['has_liked'])
+
+    def test_stream_allows_pages_beyond_the_regular_limit(self):
+        Post.objects.bulk_create([Post(author=self.author, content=f'bulk {i}') for i in range(150)])
+        self.assertEqual(len(self.client.get('/api/feed/?page_size=500').json()['results']), 100)
+        self.assertEqual(len(self.stream('/api/feed/?page_size=500&stream=1')['results']), 155)
+
+    def test_thread_export(self):
+        self.assertEqual(self.client.get(f'/api/posts/{self.posts[0].id}/export/').status_code, 403)
+
+        self.reader.is_staff = True
+        self.reader.save()
+        exported = self.stream(f'/api/posts/{self.posts[0].id}/export/')
+        listed = self.client.get(f'/api/comments/?post_id={self.posts[0].id}').json()['results']
+        self.assertEqual(len(exported), 4)
+        self.assertEqual(sorted(exported, key=lambda c: c['id']), sorted(listed, key=lambda c: c['id']))
+
+
+class FeedDumpTests(FeedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.fan = User.objects.create_user(username='fan', password='pass12345')
+        self.post = Post.objects.create(author=self.author, content='exported \u00e9')
+        root = Comment.objects.create(post=self.post, author=self.fan, content='root')
+        self.reply = Comment.objects.create(post=self.post, author=self.author, parent=root, content='reply')
+        Like.objects.create(user=self.fan, content_object=self.post)
+        Like.objects.create(user=self.fan, content_object=self.reply)
+
+    def snapshot(self):
+        return {
+            'users': list(User.objects.order_by('id').values_list('id', 'username', 'password', 'date_joined')),
+            'posts': list(Post.objects.values_list('id', 'author_id', 'content', 'created_at', 'like_count', 'comment_count')),
+            'comments': list(Comment.objects.order_by('id').values_list(
+                'id', 'post_id', 'parent_id', 'path', 'depth', 'created_at', 'like_count', 'reply_count'
+            )),
+            'likes': sorted(Like.objects.values_list('user_id', 'content_type_id', 'object_id', 'created_at')),
+            'karma': sorted(UserProfile.objects.values_list('user_id', 'total_karma')),
+        }
+
+    def test_round_trip(self):
+        before = self.snapshot()
+        self.assertEqual(before['karma'], [(self.author.id, 6)])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'feed.ndjson.gz')
+            call_command('export_feed', path, '--chunk-size', '2', stdout=StringIO())
+
+            with self.assertRaises(CommandError):
+                call_command('import_feed', path, stdout=StringIO())
+            # Cascaded like deletions would otherwise record unlike events for the vanishing authors
+            with suppress_like_signals():
+                User.objects.all().delete()
+            self.assertFalse(Post.objects.exists())
+
+            call_command('import_feed', path, '--batch-size', '2', stdout=StringIO())
+
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(LikeEvent.objects.filter(processed_at__isnull=False).count(), 2)
+        self.assertEqual(self.client.get('/api/feed/').json()['results'][0]['comments'][0]['replies'][0]['id'],
+                         self.reply.id)
+
+
+class PurgeUsersTests(FeedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.fan = User.objects.create_user(username='fan')
+        self.post = Post.objects.create(author=self.author, content='keeper post')
+        self.comment = Comment.objects.create(post=self.post, author=self.author, content='keeper comment')
+        Like.objects.create(user=self.fan, content_object=self.post)
+
+        self.testers = [User.objects.create_user(username=f'tester{i}') for i in range(3)]
+        for tester in self.testers:
+            Like.objects.create(user=tester, content_object=self.post)
+            Like.objects.create(user=tester, content_object=self.comment)
+            Comment.objects.create(post=self.post, author=tester, parent=self.comment, content='test reply')
+            doomed = Post.objects.create(author=tester, content='test post')
+            # A survivor's comment on a purged post, liked by another survivor
+            orphan = Comment.objects.create(post=doomed, author=self.author, content='lost')
+            Like.objects.create(user=self.fan, content_object=orphan)
+        self.staff = User.objects.create_user(username='tester-staff', is_staff=True)
+
+    def purge(self, *args):
+        out = StringIO()
+        call_command('purge_users', '--username-regex', '^tester', '--no-input', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_deletes_nothing(self):
+        output = self.purge('--dry-run')
+        self.assertIn('auth.User: 3', output)
+        self.assertIn('feed.Like: 9', output)
+        self.assertEqual(User.objects.filter(username__startswith='tester').count(), 4)
+
+    def test_purge_keeps_survivors_consistent(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.purge('--chunk-size', '2')
+
+        self.assertEqual(list(User.objects.filter(username__startswith='tester')), [self.staff])
+        self.post.refresh_from_db()
+        self.comment.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+        self.assertEqual((self.comment.like_count, self.comment.reply_count), (0, 0))
+
+        # Karma matches both the remaining likes and the event ledger
+        profile = UserProfile.objects.get(user=self.author)
+        self.assertEqual(profile.total_karma, 5)
+        self.assertEqual(profile.update_total_karma(), 5)
+
+        # No per-row karma writes: profiles are rebuilt in one statement
+        profile_updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "users_userprofile"')]
+        self.assertEqual(len(profile_updates), 1)
+
+
+class BenchmarkTests(FeedTestCase):
+
+    def test_query_budgets_hold_on_synthetic_data(self):
+        populate(20, 200, users=15, max_depth=3, fan_out=3, like_density=0.2, seed=1)
+        self.assertEqual(Comment.objects.filter(author__username__startswith='synthetic-1-').aggregate(
+            depth=Max('depth'))['depth'], 3)
+        self.assertTrue(Like.objects.filter(user__username__startswith='synthetic-1-').exists())
+
+        report = run_benchmarks(User.objects.get(username='synthetic-1-0'), repeat=2, memory=False)
+        self.assertEqual(report['regressions'], [], report['results'])
+        self.assertEqual(set(report['results']), set(QUERY_BUDGETS))
+        json.dumps(report)
+
+    def test_populate_is_deterministic(self):
+        def shape():
+            with transaction.atomic():
+                populate(5, 40, users=4, like_density=0.5, seed=2)
+                comments = Comment.objects.filter(author__username__startswith='synthetic-2-').order_by('id')
+                rows = [(c.author.username, c.content, c.depth, c.like_count, c.reply_count) for c in comments]
+                transaction.set_rollback(True)
+            return rows
+        self.assertEqual(shape(), shape())
+
+
+@override_settings(REQUEST_TIMING_SAMPLE_PERCENT=100, REQUEST_QUERY_BUDGET=20)
+class RequestTimingTests(FeedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.create(author=self.author, content='timed')
+        Comment.objects.create(post=self.post, author=self.author, content='comment')
+
+    def timings(self, response):
+        return {part.split(';')[0]: part for part in response['Server-Timing'].split(', ')}
+
+    def test_feed_reports_spans_and_queries(self):
+        with self.assertLogs('backend.instrumentation', 'INFO') as logs:
+            response = self.client.get('/api/feed/')
+        timings = self.timings(response)
+        self.assertTrue({'total', 'db', 'feed-cache', 'feed-page', 'render'} <= set(timings))
+        self.assertIn('desc="3 queries"', timings['db'])
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['view'], record['queries'], record['over_query_budget']), ('feed', 3, False))
+
+    def test_like_spans_and_query_budget(self):
+        self.client.force_authenticate(self.author)
+        with override_settings(REQUEST_QUERY_BUDGET=2), self.assertLogs('backend.instrumentation') as logs:
+            response = self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.assertTrue({'toggle-like', 'read-counters'} <= set(self.timings(response)))
+        self.assertEqual(logs.records[0].levelname, 'WARNING')
+        self.assertIn('Likely N+1', logs.records[0].getMessage())
+
+    def test_asgi_requests_are_timed(self):
+        # Under ASGI the view's queries run in a worker thread, not the middleware's
+        with self.assertLogs('backend.instrumentation', 'INFO'):
+            response = async_to_sync(AsyncClient().get)('/api/feed/')
+        self.assertIn('desc="3 queries"', self.timings(response)['db'])
+
+    @override_settings(REQUEST_TIMING_SAMPLE_PERCENT=0)
+    def test_unsampled_requests_are_untouched(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/feed/'))
+
+
+class MetricsTests(FeedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(METRICS_DIR=self.directory, METRICS_TOKEN='s3cret')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        metrics.clear()
+        self.post = Post.objects.create(author=self.author, content='measured')
+
+    def scrape(self):
+        response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_counts_are_summed_across_workers(self):
+        self.client.get('/api/feed/')
+        self.client.get('/api/feed/')
+        self.client.get('/api/leaderboard/')
+        self.client.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.post.id}/like/')
+
+        # Another worker's snapshot, as written by its MetricsRegistry.flush()
+        with open(os.path.join(self.directory, '1.json'), 'w') as handle:
+            json.dump({
+                'counters': [['like_toggles_total', [['action', 'like'], ['target', 'post']], 4]],
+                'histograms': [['http_request_duration_seconds', [['view', 'feed']], [1] + [0] * 11 + [0.001]]],
+            }, handle)
+
+        samples = self.scrape()
+        self.assertEqual(samples['like_toggles_total{action="like",target="post"}'], 5)
+        self.assertEqual(samples['feed_cache_hit_ratio'], 0.5)
+        self.assertEqual(samples['leaderboard_cache_hit_ratio'], 0)
+        self.assertEqual(samples['http_request_duration_seconds_count{view="feed"}'], 3)
+        self.assertEqual(samples['http_request_duration_seconds_bucket{view="feed",le="+Inf"}'], 3)
+        self.assertEqual(samples['http_requests_total{method="GET",status="200",view="feed"}'], 2)
+        self.assertGreater(samples['db_queries_total{view="feed"}'], 0)
+
+    def test_token_is_required(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 401)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.scrape()
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.client.get('/api/metrics/').status_code, 200)
+
+    def test_exited_workers_are_folded_into_one_file(self):
+        dead = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                              capture_output=True, text=True, check=True)
+        with open(os.path.join(self.directory, f'{dead.stdout.strip()}-0a1b2c.json'), 'w') as handle:
+            json.dump({'counters': [['live_clients_dropped_total', [], 4]], 'histograms': []}, handle)
+        # This worker exits too
+        metrics.inc('live_clients_dropped_total')
+        flush_on_exit()
+        metrics.clear()
+
+        for _ in range(2):
+            self.assertEqual(self.scrape()['live_clients_dropped_total'], 5)
+        self.assertEqual(sorted(name for name in os.listdir(self.directory) if name.endswith('.json')),
+                         sorted(['dead.json', os.path.basename(metrics.snapshot_path())]))
+
+
+class AsyncReadViewTests(FeedTestCase):
+    """The async feed and leaderboard must answer exactly like the WSGI views"""
+
+    def setUp(self):
+        super().setUp()
+        self.fan = User.objects.create_user(username='fan')
+        self.token = Token.objects.create(user=self.fan)
+        posts = [Post.objects.create(author=self.author, content=f'post {i}') for i in range(5)]
+        for post in posts[::2]:
+            root = Comment.objects.create(post=post, author=self.author, content='root')
+            Comment.objects.create(post=post, author=self.fan, parent=root, content='reply')
+            with self.captureOnCommitCallbacks(execute=True):
+                toggle_like(self.fan, post)
+                toggle_like(self.fan, root)
+
+    def call_async(self, view, path, **headers):
+        request = AsyncRequestFactory().get(path, headers=headers)
+        return async_to_sync(view.as_view())(request)
+
+    def assertSameFeed(self, path, **headers):
+        for clear in (True, False):
+            if clear:
+                cache.clear()
+            response = self.call_async(AsyncFeedView, path, **headers)
+            self.assertEqual(response['X-Feed-Cache'], 'MISS' if clear else 'HIT')
+            cache.clear()
+            expected = self.client.get(path, headers=headers).json()
+            self.assertEqual(json.loads(response.content), expected)
+        return expected
+
+    def test_feed_matches_sync_view(self):
+        data = self.assertSameFeed('/api/feed/?page_size=2')
+        self.assertSameFeed('/api/feed/?page_size=2&cursor=' + data['next'].split('cursor=')[1])
+
+        data = self.assertSameFeed('/api/feed/', authorization=f'Token {self.token.key}')
+        self.assertEqual([post['has_liked'] for post in data['results']], [True, False, True, False, True])
+        self.assertTrue(data['results'][0]['comments'][0]['has_liked'])
+
+        self.assertEqual(self.call_async(AsyncFeedView, '/api/feed/?cursor=bogus').status_code, 404)
+
+    def test_streamed_feed_is_sent_chunk_by_chunk(self):
+        response = self.call_async(AsyncFeedView, '/api/feed/?stream=1')
+        # A synchronous iterator would make Django buffer the whole body
+        self.assertTrue(response.is_async)
+
+        async def read():
+            return [chunk async for chunk in response.streaming_content]
+
+        with mock.patch('feed.streaming.CHUNK_SIZE', 2):
+            chunks = async_to_sync(read)()
+        self.assertGreater(len(chunks), 3)
+        expected = b''.join(self.client.get('/api/feed/?stream=1').streaming_content)
+        self.assertEqual(b''.join(chunks), expected)
+
+    def test_leaderboard_matches_sync_view(self):
+        response = self.call_async(AsyncLeaderboardView, '/api/leaderboard/')
+        cache.clear()
+        expected = self.client.get('/api/leaderboard/')
+        self.assertEqual(json.loads(response.content), expected.json())
+        self.assertEqual(response['ETag'], expected['ETag'])
+
+        response = self.call_async(AsyncLeaderboardView, '/api/leaderboard/', if_none_match=expected['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(LIVE_UPDATES_INTERVAL=60, LIVE_LEADERBOARD_INTERVAL=0)
+class LiveUpdatesTests(FeedTestCase):
+    """Server-sent like counts and leaderboard; the hub is flushed by hand"""
+
+    def setUp(self):
+        super().setUp()
+        live_hub.clear()
+        self.addCleanup(live_hub.clear)
+        self.fan = User.objects.create_user(username='fan')
+        self.posts = [Post.objects.create(author=self.author, content=f'post {i}') for i in range(2)]
+
+    async def read_event(self, stream):
+        name, data = (await anext(stream)).decode().rstrip('\n').split('\n')
+        return name.removeprefix('event: '), json.loads(data.removeprefix('data: '))
+
+    async def test_stream_sends_snapshot_then_coalesced_changes(self):
+        first, second = (str(post.id) for post in self.posts)
+        response = await AsyncClient().get(f'/api/live/?posts={first},{second}&leaderboard=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        self.assertEqual(await self.read_event(stream), ('likes', {'posts': {first: 0, second: 0}}))
+        self.assertEqual(await self.read_event(stream), ('leaderboard', []))
+
+        # Several changes before a flush go out as one event with the latest count
+        for count in (1, 2, 3):
+            await Post.objects.filter(id=first).aupdate(like_count=count)
+            live_hub.publish(Post, [int(first)])
+        await live_hub.flush()
+        self.assertEqual(await self.read_event(stream), ('likes', {'posts': {first: 3}}))
+        self.assertEqual(len(live_hub.subscribers), 1)
+
+    def test_likes_publish_after_commit(self):
+        subscriber = Subscriber(posts=[self.posts[0].id], leaderboard=True)
+        live_hub.subscribers.add(subscriber)
+        with self.captureOnCommitCallbacks() as callbacks:
+            toggle_like(self.fan, self.posts[0])
+        self.assertEqual(live_hub.changed['posts'], set())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(live_hub.changed['posts'], {self.posts[0].id})
+
+        async_to_sync(live_hub.flush)()
+        self.assertEqual(subscriber.pending['posts'], {self.posts[0].id: 1})
+        self.assertEqual(subscriber.pending_leaderboard['data'][0]['daily_karma'], 5)
+
+    @override_settings(LIVE_UPDATES_MAX_STALL=5)
+    def test_slow_clients_are_coalesced_then_dropped(self):
+        post = self.posts[0]
+        subscriber = Subscriber(posts=[post.id])
+        live_hub.subscribers.add(subscriber)
+        for now, count in ((100, 1), (101, 2), (102, 3)):
+            Post.objects.filter(id=post.id).update(like_count=count)
+            live_hub.publish(Post, [post.id])
+            async_to_sync(live_hub.flush)(now=now)
+        # Unread updates never grow past one value per watched id
+        self.assertEqual(subscriber.pending, {'posts': {post.id: 3}, 'comments': {}})
+        self.assertFalse(subscriber.closed)
+
+        async_to_sync(live_hub.flush)(now=106)
+        self.assertTrue(subscriber.closed)
+        self.assertNotIn(subscriber, live_hub.subscribers)
+
+    def test_rejects_bad_requests(self):
+        # The WSGI handler cannot hold streams open
+        self.assertEqual(self.client.get('/api/live/?posts=1').status_code, 503)
+        request = AsyncRequestFactory().get('/api/live/?posts=1,x')
+        self.assertEqual(async_to_sync(LiveUpdatesView.as_view())(request).status_code, 400)
+        ids = ','.join(map(str, range(LiveUpdatesView.MAX_WATCHED + 1)))
+        request = AsyncRequestFactory().get(f'/api/live/?posts={ids}')
+        self.assertEqual(async_to_sync(LiveUpdatesView.as_view())(request).status_code, 400)
+
+
+class ReplicaRoutingTests(FeedTestCase):
+    """
+    Which reads go to the read replica. The test database has no replica, so
+    the replica alias points at the primary and queries record whether they
+    were routed as replica reads.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.fan = User.objects.create_user(username='fan')
+        self.token = Token.objects.create(user=self.fan)
+        self.post = Post.objects.create(author=self.author, content='hello')
+        Comment.objects.create(post=self.post, author=self.author, content='first')
+
+    def replica_reads_of(self, method, path, **kwargs):
+        """(response, [whether each query was a replica read]); method 'async' calls AsyncFeedView"""
+        routed = []
+
+        def record(execute, sql, params, many, context):
+            routed.append(reading_replica())
+            return execute(sql, params, many, context)
+
+        with override_settings(READ_REPLICA_ALIAS='default'), connection.execute_wrapper(record):
+            if method == 'async':
+                response = async_to_sync(AsyncFeedView.as_view())(AsyncRequestFactory().get(path, **kwargs))
+            else:
+                response = getattr(self.client, method)(path, **kwargs)
+        return response, routed
+
+    @override_settings(READ_REPLICA_ALIAS='standby')
+    def test_router_sends_only_scoped_reads_to_the_replica(self):
+        self.assertEqual(router.db_for_read(Post), 'default')
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Post), 'standby')
+            self.assertEqual(router.db_for_write(Post), 'default')
+        with override_settings(READ_REPLICA_ALIAS=None), replica_reads():
+            self.assertEqual(router.db_for_read(Post), 'default')
+
+    @override_settings(FEED_CACHE_ENABLED=False)
+    def test_read_views_use_the_replica(self):
+        for path in ('/api/feed/', '/api/leaderboard/', '/api/posts/', f'/api/posts/{self.post.id}/',
+                     f'/api/comments/?post_id={self.post.id}'):
+            cache.clear()
+            response, routed = self.replica_reads_of('get', path)
+            self.assertEqual(response.status_code, 200, path)
+            self.assertTrue(routed and all(routed), path)
+
+        # Other reads and every write stay on the primary
+        response, routed = self.replica_reads_of('get', f'/api/comments/thread/?post_id={self.post.id}')
+        self.assertFalse(any(routed))
+        with self.captureOnCommitCallbacks(execute=True):
+            response, routed = self.replica_reads_of(
+                'post', f'/api/posts/{self.post.id}/like/', headers={'authorization': f'Token {self.token.key}'}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any(routed))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_pages_filling_the_cache_are_read_from_the_primary(self):
+        render_page = FeedView.render_page
+
+        def lagging_replica(view, paginator, request):
+            page = render_page(view, paginator, request)
+            if reading_replica():
+                # The replica has not seen the like yet
+                for post in page:
+                    post['like_count'] = 0
+            return page
+
+        with mock.patch.object(FeedView, 'render_page', lagging_replica):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.replica_reads_of('post', f'/api/posts/{self.post.id}/like/',
+                                      headers={'authorization': f'Token {self.token.key}'})
+            # Another visitor, not pinned, misses and then hits the cache
+            self.client = APIClient()
+            for cached in ('MISS', 'HIT'):
+                response, _ = self.replica_reads_of('get', '/api/feed/')
+                self.assertEqual(response['X-Feed-Cache'], cached)
+                self.assertEqual(response.json()['results'][0]['like_count'], 1)
+
+        cache.clear()
+        response, routed = self.replica_reads_of('async', '/api/feed/')
+        self.assertEqual(response['X-Feed-Cache'], 'MISS')
+        self.assertTrue(routed)
+        self.assertFalse(any(routed))
+
+    @override_settings(SESSION_COOKIE_SECURE=True)
+    def test_pin_cookie_is_sent_cross_site_over_https(self):
+        # The frontend and API are different sites on a public suffix such as onrender.com
+        with self.captureOnCommitCallbacks(execute=True):
+            response, _ = self.replica_reads_of(
+                'post', f'/api/posts/{self.post.id}/like/', headers={'authorization': f'Token {self.token.key}'}
+            )
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie['samesite'], 'None')
+        self.assertTrue(cookie['secure'])
+
+    def test_writers_read_their_writes_from_the_primary(self):
+        self.replica_reads_of('get', '/api/feed/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.replica_reads_of('post', f'/api/posts/{self.post.id}/like/',
+                                  headers={'authorization': f'Token {self.token.key}'})
+        self.replica_reads_of('get', '/api/feed/')
+
+        # The pin cookie skips the replica, and the page cache it may have filled
+        response, routed = self.replica_reads_of('get', '/api/feed/')
+        self.assertFalse(any(routed))
+        self.assertEqual(response['X-Feed-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['like_count'], 1)
+
+        self.client.cookies[PIN_COOKIE] = str(time.time() - 1)
+        response, routed = self.replica_reads_of('get', '/api/feed/')
+        self.assertEqual(response['X-Feed-Cache'], 'HIT')
+        self.assertTrue(all(routed))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ConcurrentLikeTests(TransactionTestCase):
+    """Many users toggling likes on one post at the same time"""
+    workers = 8
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        UserProfile.objects.create(user=self.author)
+        self.post = Post.objects.create(author=self.author, content='popular')
+        self.fans = [User.objects.create_user(username=f'fan{i}') for i in range(self.workers)]
+
+    def hammer(self, toggles_per_fan):
+        errors = []
+        barrier = threading.Barrier(self.workers)
+
+        def run(fan):
+            client = APIClient()
+            client.force_authenticate(fan)
+            barrier.wait()
+            try:
+                for _ in range(toggles_per_fan):
+                    response = client.post(f'/api/posts/{self.post.id}/like/')
+                    if response.status_code != 200:
+                        errors.append(response.status_code)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=run, args=(fan,)) for fan in self.fans]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_counters_and_karma_stay_exact(self):
+        self.hammer(toggles_per_fan=3)  # odd number of toggles: every fan ends up liking
+
+        self.post.refresh_from_db()
+        profile = UserProfile.objects.get(user=self.author)
+        self.assertEqual(Like.objects.count(), self.workers)
+        self.assertEqual(self.post.like_count, self.workers)
+        self.assertEqual(profile.total_karma, 5 * self.workers)
@@ -0,0 +1,52 @@
+from django.db.models import Prefetch
+
+from .models import Comment
+
+# How much of each thread is embedded in feed and post responses; the rest
+# is loaded on demand through the thread/replies endpoints
+PREVIEW_ROOTS = 5
+PREVIEW_REPLIES = 3
+
+
+def thread_comments():
+    return Comment.objects.select_related('author', 'author__profile').order_by('created_at', 'id')
+
+
+def reply_preview_prefetch(lookup, replies=PREVIEW_REPLIES):
+    """
+    Prefetch the first ``replies`` direct replies of every comment reached
+    through ``lookup`` into ``preview_replies``. Django runs the sliced
+    prefetch as one windowed query over the parent index.
+    """
+    return Prefetch(lookup, queryset=thread_comments()[:replies], to_attr='preview_replies')
+
+
+def comment_preview_prefetches(roots=PREVIEW_ROOTS, replies=PREVIEW_REPLIES):
+    """
+    Prefetches for a Post queryset that load a bounded preview of each thread:
+    the first ``roots`` top-level comments (plus one, to tell whether more
+    exist) into ``preview_comments``, each with its first ``replies`` replies.
+    """
+    return [
+        Prefetch(
+            'comments',
+            queryset=thread_comments().filter(parent__isnull=True)[:roots + 1],
+            to_attr='preview_comments',
+        ),
+        reply_preview_prefetch('preview_comments__replies', replies),
+    ]
+
+
+def preview_comments(post, roots=PREVIEW_ROOTS):
+    """The previewed top-level comments of a post and whether more exist"""
+    loaded = getattr(post, 'preview_comments', [])
+    return loaded[:roots], len(loaded) > roots
+
+
+def flatten_preview(comments):
+    """Comments followed by their previewed replies, ready for one list serializer"""
+    flat = []
+    for comment in comments:
+        flat.append(comment)
+        flat.extend(getattr(comment, 'preview_replies', []))
+    return flat
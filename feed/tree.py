@@ -0,0 +1,30 @@
+from collections import defaultdict
+
+
+def build_comment_forest(comments):
+    """
+    Assemble serialized comments into nested reply trees.
+
+    ``comments`` is an iterable of serialized comment dicts carrying at least
+    ``id``, ``post`` and ``parent`` keys (the shape CommentSerializer emits).
+    Returns a mapping of post id to that post's list of root comments, each
+    with its ``replies`` filled in.
+
+    Comments are grouped by (post, parent) in a single pass and every node
+    is then linked to its children list by reference, so the whole build is
+    O(n) and never recurses, however deep a thread goes. Sibling order
+    follows the order of the input.
+    """
+    comments = list(comments)
+    children = defaultdict(list)
+    for comment in comments:
+        children[(comment['post'], comment['parent'])].append(comment)
+
+    for comment in comments:
+        comment['replies'] = children.get((comment['post'], comment['id']), [])
+
+    return {
+        post_id: siblings
+        for (post_id, parent_id), siblings in children.items()
+        if parent_id is None
+    }
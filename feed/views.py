@@ -1,22 +1,44 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
-from django.contrib.contenttypes.models import ContentType
-from django.db import transaction
-from django.db.models import Prefetch, Q, Count
-from django.db.models import Case, When, IntegerField
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, IsAdminUser
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views import View
+
+from backend.instrumentation import span
+from backend.replicas import ReplicaReadsMixin, primary_pinned, reading_replica, replica_reads, use_replica
 
-from .models import Post, Comment, Like
-from .serializers import PostSerializer, CommentSerializer
-from users.models import UserProfile
+from .cache import feed_cache
+from .models import Post, Comment
+from .live import Subscriber, live_hub
+from .likes import (
+    LikedSetMixin, aliked_context, amark_liked, apply_liked, bulk_set_likes, liked_context, mark_liked, toggle_like,
+)
+from .rows import POST_COLUMNS, afetch_previews, fetch_previews, render_posts
+from .pagination import FeedCursorPagination, ThreadCursorPagination
+from .serializers import PostSerializer, CommentSerializer, BulkLikeSerializer
+from .streaming import dumps, json_response, stream_feed_page, stream_thread
+from .threads import (
+    PREVIEW_REPLIES, comment_preview_prefetches, flatten_preview, preview_comments, reply_preview_prefetch,
+)
+from .tree import build_comment_forest
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(ReplicaReadsMixin, LikedSetMixin, viewsets.ModelViewSet):
     """
     ViewSet for Posts with optimized queries and thread-safe liking
     """
+    replica_actions = ('list', 'retrieve')
     queryset = Post.objects.all().select_related('author', 'author__profile')
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -25,83 +47,56 @@ class PostViewSet(viewsets.ModelViewSet):
         """Optimized queryset for posts with all related data"""
         queryset = super().get_queryset()
         
-        # Prefetch likes with user information
-        queryset = queryset.prefetch_related(
-            Prefetch('likes', queryset=Like.objects.select_related('user')),
-            Prefetch('comments', 
-                queryset=Comment.objects.select_related('author', 'author__profile')
-                .prefetch_related('likes')
-                .order_by('created_at')
-            )
-        )
+        # Prefetch a bounded preview of each thread; like and comment counts are stored columns
+        queryset = queryset.prefetch_related(*comment_preview_prefetches())
         
         return queryset
     
+    def get_liked_ids(self, posts):
+        # Previewed comments come from the prefetch cache, so this costs no query
+        comment_ids = [
+            comment.id for post in posts for comment in flatten_preview(preview_comments(post)[0])
+        ]
+        return [post.id for post in posts], comment_ids
+    
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
     
+    @action(detail=True, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request, pk=None):
+        """Stream every comment of the post as one JSON array (admins only)"""
+        post = get_object_or_404(Post.objects.only('id'), id=pk)
+        return json_response(stream_thread(request, post.id), request)
+    
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
-    @transaction.atomic
     def like(self, request, pk=None):
         """
         Thread-safe like/unlike for posts
-        Uses select_for_update to prevent race conditions
+        One idempotent Like insert/delete plus atomic F() updates, no row locks
         """
-        # Get post with row lock to prevent concurrent modifications
-        post = Post.objects.select_for_update().get(id=pk)
-        user = request.user
-        
-        content_type = ContentType.objects.get_for_model(Post)
-        
-        # Check if user already liked this post
-        existing_like = Like.objects.filter(
-            user=user,
-            content_type=content_type,
-            object_id=post.id
-        ).first()
-        
-        if existing_like:
-            # Unlike: delete the like
-            existing_like.delete()
-            
-            # Update author's karma (atomic operation)
-            profile = UserProfile.objects.select_for_update().get(user=post.author)
-            profile.total_karma -= 5
-            profile.save()
-            
-            liked = False
-            message = 'Post unliked'
-        else:
-            # Like: create new like
-            Like.objects.create(
-                user=user,
-                content_type=content_type,
-                object_id=post.id
-            )
-            
-            # Update author's karma (atomic operation)
-            profile = UserProfile.objects.select_for_update().get(user=post.author)
-            profile.total_karma += 5
-            profile.save()
-            
-            liked = True
-            message = 'Post liked'
+        post = get_object_or_404(Post.objects.only('id', 'author_id'), id=pk)
+        with span('toggle-like'):
+            liked = toggle_like(request.user, post)
         
-        # Refresh like count
-        post.refresh_from_db()
+        # Read back the counters as committed, including concurrent likes
+        with span('read-counters'):
+            like_count, author_karma = Post.objects.filter(id=post.id).values_list(
+                'like_count', 'author__profile__total_karma'
+            ).get()
         
         return Response({
             'liked': liked,
-            'like_count': post.like_count,
-            'message': message,
-            'author_karma': post.author.profile.total_karma
+            'like_count': like_count,
+            'message': 'Post liked' if liked else 'Post unliked',
+            'author_karma': author_karma or 0
         })
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(ReplicaReadsMixin, LikedSetMixin, viewsets.ModelViewSet):
     """
     ViewSet for Comments with optimized queries and thread-safe liking
     """
+    replica_actions = ('list', 'retrieve')
     queryset = Comment.objects.all().select_related('author', 'author__profile', 'post')
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -110,190 +105,293 @@ class CommentViewSet(viewsets.ModelViewSet):
         """Optimized queryset for comments"""
         queryset = super().get_queryset()
         
-        # Prefetch likes with user information
-        queryset = queryset.prefetch_related(
-            Prefetch('likes', queryset=Like.objects.select_related('user'))
-        )
-        
         post_id = self.request.query_params.get('post_id')
         if post_id:
             queryset = queryset.filter(post_id=post_id)
         
         return queryset
     
+    def get_liked_ids(self, comments):
+        return [], [comment.id for comment in comments]
+    
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
     
+    @action(detail=False, methods=['get'])
+    def thread(self, request):
+        """
+        Top-level comments of one post (?post_id=), oldest first and cursor
+        paginated, each with its first replies and a link to the rest
+        """
+        post_id = request.query_params.get('post_id')
+        if not post_id or not post_id.isdigit():
+            raise ValidationError({'post_id': 'A numeric post_id query parameter is required.'})
+        return self.thread_page(Comment.objects.filter(post_id=post_id, parent__isnull=True))
+    
+    @action(detail=True, methods=['get'])
+    def replies(self, request, pk=None):
+        """Direct replies of one comment, paginated like thread, to expand a subtree on demand"""
+        parent = get_object_or_404(Comment.objects.only('id', 'post_id'), pk=pk)
+        return self.thread_page(Comment.objects.filter(post_id=parent.post_id, parent_id=parent.id))
+    
+    def thread_page(self, queryset):
+        """One keyset page of comments with a bounded preview of their replies"""
+        try:
+            replies = min(int(self.request.query_params.get('replies', PREVIEW_REPLIES)), 20)
+        except ValueError:
+            replies = PREVIEW_REPLIES
+        queryset = queryset.select_related('author', 'author__profile').prefetch_related(
+            reply_preview_prefetch('replies', max(replies, 0))
+        )
+        paginator = ThreadCursorPagination()
+        comments = paginator.paginate_queryset(queryset, self.request, view=self)
+        
+        data = self.get_serializer(flatten_preview(comments), many=True).data
+        build_comment_forest(data)
+        page_ids = {comment.id for comment in comments}
+        return paginator.get_paginated_response([node for node in data if node['id'] in page_ids])
+    
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
-    @transaction.atomic
     def like(self, request, pk=None):
         """
         Thread-safe like/unlike for comments
-        Uses select_for_update to prevent race conditions
+        One idempotent Like insert/delete plus atomic F() updates, no row locks
         """
-        # Get comment with row lock to prevent concurrent modifications
-        comment = Comment.objects.select_for_update().get(id=pk)
-        user = request.user
-        
-        content_type = ContentType.objects.get_for_model(Comment)
-        
-        # Check if user already liked this comment
-        existing_like = Like.objects.filter(
-            user=user,
-            content_type=content_type,
-            object_id=comment.id
-        ).first()
+        comment = get_object_or_404(Comment.objects.only('id', 'author_id'), id=pk)
+        with span('toggle-like'):
+            liked = toggle_like(request.user, comment)
         
-        if existing_like:
-            # Unlike: delete the like
-            existing_like.delete()
-            
-            # Update author's karma (atomic operation)
-            profile = UserProfile.objects.select_for_update().get(user=comment.author)
-            profile.total_karma -= 1
-            profile.save()
-            
-            liked = False
-            message = 'Comment unliked'
-        else:
-            # Like: create new like
-            Like.objects.create(
-                user=user,
-                content_type=content_type,
-                object_id=comment.id
-            )
-            
-            # Update author's karma (atomic operation)
-            profile = UserProfile.objects.select_for_update().get(user=comment.author)
-            profile.total_karma += 1
-            profile.save()
-            
-            liked = True
-            message = 'Comment liked'
-        
-        # Refresh like count
-        comment.refresh_from_db()
+        # Read back the counters as committed, including concurrent likes
+        with span('read-counters'):
+            like_count, author_karma = Comment.objects.filter(id=comment.id).values_list(
+                'like_count', 'author__profile__total_karma'
+            ).get()
         
         return Response({
             'liked': liked,
-            'like_count': comment.like_count,
-            'message': message,
-            'author_karma': comment.author.profile.total_karma
+            'like_count': like_count,
+            'message': 'Comment liked' if liked else 'Comment unliked',
+            'author_karma': author_karma or 0
         })
 
 
-class FeedView(APIView):
+class BulkLikeView(APIView):
+    """
+    Apply a batch of like/unlike operations in one request and one transaction
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        serializer = BulkLikeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = bulk_set_likes(request.user, serializer.validated_data['operations'])
+        return Response({'results': results})
+
+
+class FeedView(ReplicaReadsMixin, APIView):
     """
-    Main feed view with optimized queries to avoid N+1 problem
+    Main feed view with optimized queries to avoid N+1 problem.
+    Posts are cursor paginated so every page costs a bounded number of rows.
+    Rendered pages are shared through feed_cache; signed-in users get the
+    shared page with their own has_liked flags filled in.
+    Pages are built from values() rows (see feed/rows.py) unless the
+    FEED_ENGINE setting selects the model serializers.
+    With ?stream=1 the page is streamed instead, allowing much larger pages.
+    Reads go to the read replica when one is configured (backend/replicas.py),
+    except for pages rendered to fill the page cache.
     """
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = FeedCursorPagination
+    cache = feed_cache
+    # None: the FEED_ENGINE setting, read per request
+    engine = None
+    stream_max_page_size = 5000
     
     def get(self, request):
         """
-        Efficiently loads feed with all nested comments in minimal queries
+        Efficiently loads one page of the feed with nested comments in minimal queries
         """
-        # Get content types for efficient filtering
-        post_content_type = ContentType.objects.get_for_model(Post)
-        comment_content_type = ContentType.objects.get_for_model(Comment)
-        
-        # Step 1: Get all posts with authors, profiles, and prefetched likes
-        posts = Post.objects.all().select_related(
-            'author', 'author__profile'
-        ).prefetch_related(
-            Prefetch('likes', queryset=Like.objects.select_related('user'))
-        ).order_by('-created_at')
-        
-        # Get all post IDs for batch comment loading
-        post_ids = list(posts.values_list('id', flat=True))
-        
-        if not post_ids:
-            return Response([])
+        paginator = self.pagination_class()
+        if request.query_params.get('stream') in ('1', 'true'):
+            return self.stream(paginator, request)
+        cursor = request.query_params.get(paginator.cursor_query_param)
+        page_size = paginator.get_page_size(request)
         
-        # Step 2: Get all comments for these posts with authors, profiles, and prefetched likes
-        all_comments = Comment.objects.filter(
-            post_id__in=post_ids
-        ).select_related(
-            'author', 'author__profile', 'post'
-        ).prefetch_related(
-            Prefetch('likes', queryset=Like.objects.select_related('user'))
-        ).order_by('created_at')
-        
-        # Step 3: Build data structures for efficient tree building
-        comments_by_post = {}
-        comments_by_parent = {}
-        
-        for comment in all_comments:
-            # Group by post
-            if comment.post_id not in comments_by_post:
-                comments_by_post[comment.post_id] = []
-            comments_by_post[comment.post_id].append(comment)
-            
-            # Group by parent for tree building
-            parent_key = comment.parent_id if comment.parent_id else 'root'
-            if parent_key not in comments_by_parent:
-                comments_by_parent[parent_key] = []
-            comments_by_parent[parent_key].append(comment)
-        
-        # Step 4: Check which posts/comments the current user has liked
-        user_liked_posts = set()
-        user_liked_comments = set()
+        with span('feed-cache'):
+            # A page rendered while this client's write was committing may
+            # predate it: read it from the primary and replace the cached copy
+            entry = None if primary_pinned(request) else self.cache.get(cursor, page_size)
+        if entry is not None:
+            paginator.restore_page(request, entry['next'])
+            posts_data = entry['results']
+        else:
+            # A page rendered from a lagging replica would be cached under the
+            # versions its missing writes already bumped: fill the cache from the primary
+            with span('feed-page'), replica_reads(reading_replica() and not self.cache.enabled):
+                posts_data = self.render_page(paginator, request)
+            with span('feed-cache'):
+                self.cache.set(cursor, page_size, posts_data, paginator.next_cursor)
         
+        # The shared page is rendered as seen by an anonymous visitor
         if request.user.is_authenticated:
-            # Get post likes by current user
-            post_likes = Like.objects.filter(
-                user=request.user,
-                content_type=post_content_type,
-                object_id__in=post_ids
-            ).values_list('object_id', flat=True)
-            user_liked_posts = set(post_likes)
-            
-            # Get comment likes by current user
-            comment_ids = list(all_comments.values_list('id', flat=True))
-            if comment_ids:
-                comment_likes = Like.objects.filter(
-                    user=request.user,
-                    content_type=comment_content_type,
-                    object_id__in=comment_ids
-                ).values_list('object_id', flat=True)
-                user_liked_comments = set(comment_likes)
-        
-        # Step 5: Helper function to build nested comment tree
-        def build_comment_tree(post_id, parent_id=None):
-            """Recursively build nested comment structure for a specific post"""
-            tree_comments = []
-            key = parent_id if parent_id else 'root'
-            
-            for comment in comments_by_parent.get(key, []):
-                # Only include comments for this post
-                if comment.post_id == post_id and (parent_id is None or comment.parent_id == parent_id):
-                    # Serialize comment
-                    comment_data = CommentSerializer(comment, context={'request': request}).data
-                    
-                    # Add has_liked flag
-                    comment_data['has_liked'] = comment.id in user_liked_comments if request.user.is_authenticated else False
-                    
-                    # Recursively add replies
-                    comment_data['replies'] = build_comment_tree(post_id, comment.id)
-                    
-                    tree_comments.append(comment_data)
-            
-            return tree_comments
+            with span('has-liked'):
+                mark_liked(posts_data, request.user)
         
-        # Step 6: Build response data
-        posts_data = []
-        for post in posts:
-            # Get post data
-            post_data = PostSerializer(post, context={'request': request}).data
-            
-            # Add has_liked flag
-            post_data['has_liked'] = post.id in user_liked_posts if request.user.is_authenticated else False
-            
-            # Build comments tree for this post
-            if post.id in comments_by_post:
-                post_data['comments'] = build_comment_tree(post.id)
-            else:
-                post_data['comments'] = []
-            
-            posts_data.append(post_data)
+        response = paginator.get_paginated_response(posts_data)
+        response['X-Feed-Cache'] = 'HIT' if entry is not None else 'MISS'
+        return response
+    
+    def stream(self, paginator, request):
+        """Stream a (possibly large) page straight from the database, bypassing the page cache"""
+        paginator.max_page_size = self.stream_max_page_size
+        page_size = paginator.get_page_size(request)
+        # Decode up front so a bad cursor is a 404 rather than a broken stream
+        paginator.decode_cursor(request)
+        return json_response(stream_feed_page(paginator, request, Post.objects.all(), page_size), request)
+    
+    def render_page(self, paginator, request):
+        """Render one page of posts from the database, without per-user data"""
+        engine = self.engine or getattr(settings, 'FEED_ENGINE', 'values')
+        if engine == 'values':
+            return self.render_rows_page(paginator, request)
+        return self.render_serializer_page(paginator, request)
+    
+    def render_rows_page(self, paginator, request):
+        """
+        Fetch only the rendered columns as dicts: no Post, Comment, User or
+        UserProfile instances. Counts are stored columns, so this is three
+        queries: the page, its root comments and their first replies.
+        """
+        rows = paginator.paginate_queryset(
+            Post.objects.values(*POST_COLUMNS), request, view=self
+        )
+        previews = fetch_previews([row['id'] for row in rows])
+        return render_posts(rows, previews, request)
+    
+    def render_serializer_page(self, paginator, request):
+        """Serialize one page of model instances with PostSerializer"""
+        # Step 1: Get one page of posts with authors, profiles and a bounded thread preview;
+        # like and comment counts are stored columns so they cost no extra queries
+        posts = Post.objects.all().select_related(
+            'author', 'author__profile'
+        ).prefetch_related(*comment_preview_prefetches())
+        posts = paginator.paginate_queryset(posts, request, view=self)
         
-        return Response(posts_data)
\ No newline at end of file
+        # Step 2: Serialize the page once; nested comment trees come from the prefetch.
+        # has_liked is left False here and filled in per user by get()
+        context = {'request': request}
+        context.update(liked_context(None))
+        return [dict(post) for post in PostSerializer(posts, many=True, context=context).data]
+
+
+class AsyncFeedView(View):
+    """
+    FeedView for ASGI servers: the same JSON from the same page cache, read
+    with the async ORM so the worker serves other requests while this one
+    waits on the database.
+
+    On a cache miss the posts are read first. Their comment previews and
+    the user's likes then only depend on the page's post ids, and both are
+    awaited together with asyncio.gather. Django still sends one request's
+    queries over its one connection in turn, so the gain is in throughput
+    across requests, not in the latency of a single one.
+    ?stream=1 is handed to the synchronous FeedView, which streams the page
+    through an async iterator under ASGI. Reads use the replica like
+    FeedView's.
+    """
+    pagination_class = FeedCursorPagination
+    cache = feed_cache
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+
+    async def get(self, request):
+        if request.GET.get('stream') in ('1', 'true'):
+            return await sync_to_async(FeedView.as_view())(request)
+        request = Request(request, authenticators=[auth() for auth in self.authentication_classes])
+        try:
+            # Authenticators may read the session or token tables
+            user = await sync_to_async(lambda: request.user)()
+            with replica_reads(use_replica(request)):
+                return await self.page(request, user)
+        except APIException as exc:
+            return HttpResponse(dumps({'detail': exc.detail}), status=exc.status_code,
+                                content_type='application/json')
+
+    async def page(self, request, user):
+        paginator = self.pagination_class()
+        cursor = request.query_params.get(paginator.cursor_query_param)
+        page_size = paginator.get_page_size(request)
+        # A bad cursor is a 404 before any lookup
+        paginator.decode_cursor(request)
+
+        with span('feed-cache'):
+            entry = None if primary_pinned(request) else await sync_to_async(self.cache.get)(cursor, page_size)
+        if entry is not None:
+            paginator.restore_page(request, entry['next'])
+            posts_data = entry['results']
+            if user.is_authenticated:
+                with span('has-liked'):
+                    await amark_liked(posts_data, user)
+        else:
+            # Pages that fill the cache come from the primary, as in FeedView
+            with span('feed-page'), replica_reads(reading_replica() and not self.cache.enabled):
+                rows = await paginator.apaginate_queryset(Post.objects.values(*POST_COLUMNS), request, view=self)
+                # Concrete ids: a subquery re-run by each lookup could see a different page
+                page_ids = [row['id'] for row in rows]
+                previews, liked = await asyncio.gather(
+                    afetch_previews(page_ids),
+                    aliked_context(user, page_ids, Comment.objects.filter(post_id__in=page_ids).values('id')),
+                )
+                posts_data = render_posts(rows, previews, request)
+            with span('feed-cache'):
+                await sync_to_async(self.cache.set)(cursor, page_size, posts_data, paginator.next_cursor)
+            # The cache holds its own copy, rendered as seen anonymously
+            apply_liked(posts_data, liked)
+
+        body = dumps({'next': paginator.get_next_link(), 'results': posts_data})
+        response = HttpResponse(body, content_type='application/json')
+        response['X-Feed-Cache'] = 'HIT' if entry is not None else 'MISS'
+        return response
+
+
+class LiveUpdatesView(View):
+    """
+    Server-sent events replacing feed and leaderboard polling (ASGI only).
+
+    ?posts=1,2&comments=3 name the like counts to follow (at most
+    MAX_WATCHED of each) and ?leaderboard=1 adds the top 5. The stream
+    opens with the current values, then sends a ``likes`` event with the
+    counts that changed, ``{"posts": {"<id>": count}, "comments": {...}}``,
+    and a ``leaderboard`` event with the same list as /api/leaderboard/
+    whenever it changes. See feed/live.py for batching and slow clients.
+    """
+    MAX_WATCHED = 200
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            # Under WSGI every stream would hold a worker thread for its lifetime
+            return self.error('Live updates are served by the ASGI application only.', 503)
+        try:
+            posts, comments = (self.parse_ids(request.GET.get(kind, '')) for kind in ('posts', 'comments'))
+        except ValueError:
+            return self.error('posts and comments must be comma-separated ids.', 400)
+        if len(posts) > self.MAX_WATCHED or len(comments) > self.MAX_WATCHED:
+            return self.error(f'Watch at most {self.MAX_WATCHED} posts and {self.MAX_WATCHED} comments.', 400)
+        if live_hub.full():
+            response = self.error('Too many live clients, try again later.', 503)
+            response['Retry-After'] = '30'
+            return response
+
+        subscriber = Subscriber(posts, comments, leaderboard=request.GET.get('leaderboard') in ('1', 'true'))
+        response = StreamingHttpResponse(live_hub.stream(subscriber), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Keep nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @staticmethod
+    def parse_ids(value):
+        return {int(part) for part in value.split(',') if part} if value else set()
+
+    @staticmethod
+    def error(detail, status_code):
+        return HttpResponse(dumps({'detail': detail}), status=status_code, content_type='application/json')
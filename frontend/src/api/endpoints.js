@@ -2,7 +2,7 @@ import apiClient from './client';
 
 export const feedAPI = {
   // Posts
-  getFeed: () => apiClient.get('/feed/'),
+  getFeed: (params) => apiClient.get('/feed/', { params }),
   getPosts: () => apiClient.get('/posts/'),
   getPost: (id) => apiClient.get(`/posts/${id}/`),
   createPost: (data) => apiClient.post('/posts/', data),
@@ -12,11 +12,18 @@ export const feedAPI = {
   
   // Comments
   getComments: (params) => apiClient.get('/comments/', { params }),
+  getCommentThread: (postId, params) => apiClient.get('/comments/thread/', { params: { post_id: postId, ...params } }),
+  getCommentReplies: (id, params) => apiClient.get(`/comments/${id}/replies/`, { params }),
+  // Follow a `next` / `more_replies` / `more_comments` link returned by the API
+  getPage: (url) => apiClient.get(url),
   createComment: (data) => apiClient.post('/comments/', data),
   updateComment: (id, data) => apiClient.put(`/comments/${id}/`, data),
   deleteComment: (id) => apiClient.delete(`/comments/${id}/`),
   likeComment: (id) => apiClient.post(`/comments/${id}/like/`),
   
+  // Batch of { type: 'post' | 'comment', id, liked } operations
+  bulkLike: (operations) => apiClient.post('/likes/bulk/', { operations }),
+  
   // Leaderboard
   getLeaderboard: () => apiClient.get('/leaderboard/'),
 };
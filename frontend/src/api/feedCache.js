@@ -0,0 +1,15 @@
+// The ['feed'] query is an infinite query: { pages: [axios response], pageParams },
+// each page's data being { results, next } from /api/feed/.
+
+export const feedPosts = (feed) => feed?.pages.flatMap((page) => page.data.results) ?? [];
+
+// Replace every loaded post with update(post)
+export const updateFeedPosts = (queryClient, update) => {
+  queryClient.setQueryData(['feed'], (old) => old && {
+    ...old,
+    pages: old.pages.map((page) => ({
+      ...page,
+      data: { ...page.data, results: page.data.results.map(update) },
+    })),
+  });
+};
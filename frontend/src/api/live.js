@@ -0,0 +1,50 @@
+import { useEffect, useState } from 'react';
+import { useQuery, useQueryClient } from '@tanstack/react-query';
+import { API_BASE_URL } from './client';
+import { updateFeedPosts } from './feedCache';
+
+// Server-sent like counts and leaderboard from /api/live/ (ASGI deployments).
+// Events patch the ['feed'] and ['leaderboard'] queries in place; ['live']
+// holds whether the stream is open so components can stop polling meanwhile.
+// Under WSGI the endpoint answers 503, EventSource gives up and polling stays.
+export const useLiveUpdates = (postIds) => {
+  const queryClient = useQueryClient();
+  const [connected, setConnected] = useState(false);
+  const posts = postIds.join(',');
+
+  useEffect(() => {
+    if (typeof EventSource === 'undefined') return undefined;
+    const source = new EventSource(`${API_BASE_URL}/live/?leaderboard=1&posts=${posts}`);
+
+    source.onopen = () => setConnected(true);
+    // Reconnecting (CONNECTING) or given up (CLOSED)
+    source.onerror = () => setConnected(source.readyState === EventSource.OPEN);
+
+    source.addEventListener('likes', (event) => {
+      const { posts: counts = {} } = JSON.parse(event.data);
+      updateFeedPosts(queryClient, (post) => (
+        post.id in counts ? { ...post, like_count: counts[post.id] } : post
+      ));
+    });
+    source.addEventListener('leaderboard', (event) => {
+      queryClient.setQueryData(['leaderboard'], (old) => ({ ...old, data: JSON.parse(event.data) }));
+    });
+
+    return () => {
+      source.close();
+      setConnected(false);
+    };
+  }, [posts, queryClient]);
+
+  useEffect(() => {
+    queryClient.setQueryData(['live'], connected);
+  }, [connected, queryClient]);
+
+  return connected;
+};
+
+// Whether a live stream is open, for components that otherwise poll
+export const useLiveConnected = () => {
+  const { data } = useQuery({ queryKey: ['live'], queryFn: () => false, staleTime: Infinity });
+  return data;
+};
@@ -5,12 +5,29 @@ import { useAuth } from '../../contexts/AuthContext';
 import toast from 'react-hot-toast';
 import CommentItem from './CommentItem';
 
-const CommentSection = ({ postId, comments: initialComments }) => {
+const CommentSection = ({ postId, comments: initialComments, moreComments }) => {
   const { user } = useAuth();
   const [newComment, setNewComment] = useState('');
   const [replyingTo, setReplyingTo] = useState(null);
+  // Comments loaded on demand: { [parentId or 'root']: { comments, next } }
+  const [loaded, setLoaded] = useState({});
   const queryClient = useQueryClient();
 
+  const loadMore = async (key, url) => {
+    try {
+      const { data } = await api.feed.getPage(url);
+      setLoaded((prev) => ({
+        ...prev,
+        [key]: {
+          comments: [...(prev[key]?.comments || []), ...data.results],
+          next: data.next,
+        },
+      }));
+    } catch {
+      toast.error('Failed to load comments');
+    }
+  };
+
   const createCommentMutation = useMutation({
     mutationFn: (commentData) => api.feed.createComment(commentData),
     onSuccess: () => {
@@ -44,18 +61,33 @@ const CommentSection = ({ postId, comments: initialComments }) => {
   const renderComments = (comments, depth = 0) => {
     if (!comments || comments.length === 0) return null;
 
-    return comments.map((comment) => (
-      <div key={comment.id} className={`${depth > 0 ? 'ml-8 border-l-2 border-gray-200 pl-4' : ''}`}>
-        <CommentItem
-          comment={comment}
-          depth={depth}
-          onReply={() => setReplyingTo(comment.id)}
-        />
-        {comment.replies && renderComments(comment.replies, depth + 1)}
-      </div>
-    ));
+    return comments.map((comment) => {
+      const extra = loaded[comment.id];
+      const moreUrl = extra ? extra.next : comment.more_replies;
+      return (
+        <div key={comment.id} className={`${depth > 0 ? 'ml-8 border-l-2 border-gray-200 pl-4' : ''}`}>
+          <CommentItem
+            comment={comment}
+            depth={depth}
+            onReply={() => setReplyingTo(comment.id)}
+          />
+          {renderComments([...(comment.replies || []), ...(extra?.comments || [])], depth + 1)}
+          {moreUrl && (
+            <button
+              onClick={() => loadMore(comment.id, moreUrl)}
+              className="ml-8 text-sm text-blue-500 hover:text-blue-700"
+            >
+              Show more replies
+            </button>
+          )}
+        </div>
+      );
+    });
   };
 
+  const rootComments = [...(initialComments || []), ...(loaded.root?.comments || [])];
+  const moreRootsUrl = loaded.root ? loaded.root.next : moreComments;
+
   return (
     <div>
       {/* Comment form */}
@@ -118,9 +150,18 @@ const CommentSection = ({ postId, comments: initialComments }) => {
 
       {/* Comments list */}
       <div className="space-y-4">
-        {renderComments(initialComments || [])}
+        {renderComments(rootComments)}
+        
+        {moreRootsUrl && (
+          <button
+            onClick={() => loadMore('root', moreRootsUrl)}
+            className="text-sm text-blue-500 hover:text-blue-700"
+          >
+            Show more comments
+          </button>
+        )}
         
-        {(!initialComments || initialComments.length === 0) && (
+        {rootComments.length === 0 && (
           <div className="text-center py-8 text-gray-500">
             <p>No comments yet. Be the first to comment!</p>
           </div>
@@ -3,6 +3,7 @@ import { formatDistanceToNow } from 'date-fns';
 import { FaHeart, FaComment, FaShare, FaEllipsisH, FaTrash, FaEdit } from 'react-icons/fa';
 import CommentSection from '../comments/CommentSection';
 import api from '../../api/endpoints';
+import { updateFeedPosts } from '../../api/feedCache';
 import { useAuth } from '../../contexts/AuthContext';
 import { useMutation, useQueryClient } from '@tanstack/react-query';
 import toast from 'react-hot-toast';
@@ -21,21 +22,11 @@ const PostCard = ({ post }) => {
       
       const previousFeed = queryClient.getQueryData(['feed']);
       
-      queryClient.setQueryData(['feed'], (old) => {
-        return {
-          ...old,
-          data: old.data.map((p) => {
-            if (p.id === post.id) {
-              return {
-                ...p,
-                like_count: p.has_liked ? p.like_count - 1 : p.like_count + 1,
-                has_liked: !p.has_liked,
-              };
-            }
-            return p;
-          }),
-        };
-      });
+      updateFeedPosts(queryClient, (p) => (p.id === post.id ? {
+        ...p,
+        like_count: p.has_liked ? p.like_count - 1 : p.like_count + 1,
+        has_liked: !p.has_liked,
+      } : p));
 
       return { previousFeed };
     },
@@ -137,7 +128,7 @@ const PostCard = ({ post }) => {
       {/* Comment section */}
       {showComments && (
         <div className="mt-4 pt-4 border-t border-gray-200">
-          <CommentSection postId={post.id} comments={post.comments} />
+          <CommentSection postId={post.id} comments={post.comments} moreComments={post.more_comments} />
         </div>
       )}
     </div>
@@ -1,13 +1,16 @@
 import React from 'react';
 import { useQuery } from '@tanstack/react-query';
 import api from '../../api/endpoints';
+import { useLiveConnected } from '../../api/live';
 import { FaTrophy, FaCrown, FaMedal, FaChartLine } from 'react-icons/fa';
 
 const Leaderboard = () => {
+  const live = useLiveConnected();
   const { data: leaderboard, isLoading, error } = useQuery({
     queryKey: ['leaderboard'],
     queryFn: () => api.feed.getLeaderboard(),
-    refetchInterval: 30000, // Refresh every 30 seconds
+    // Pushed over the live stream when it is open; otherwise refresh every 30 seconds
+    refetchInterval: live ? false : 30000,
   });
 
   const trophyColors = ['text-yellow-500', 'text-gray-400', 'text-amber-700'];
@@ -1,15 +1,25 @@
 import React from 'react';
-import { useQuery } from '@tanstack/react-query';
+import { useInfiniteQuery } from '@tanstack/react-query';
 import api from '../api/endpoints';
+import { feedPosts } from '../api/feedCache';
+import { useLiveUpdates } from '../api/live';
 import PostCard from '../components/feed/PostCard';
 import CreatePostModal from '../components/feed/CreatePostModal';
 import { FaPlus, FaSpinner, FaExclamationTriangle } from 'react-icons/fa';
 
 const FeedPage = () => {
-  const { data: feed, isLoading, error, refetch } = useQuery({
+  const {
+    data: feed, isLoading, error, refetch, fetchNextPage, hasNextPage, isFetchingNextPage,
+  } = useInfiniteQuery({
     queryKey: ['feed'],
-    queryFn: () => api.feed.getFeed(),
+    // Later pages follow the cursor link the previous page returned
+    queryFn: ({ pageParam }) => (pageParam ? api.feed.getPage(pageParam) : api.feed.getFeed()),
+    initialPageParam: null,
+    getNextPageParam: (lastPage) => lastPage.data.next ?? undefined,
   });
+  const posts = feedPosts(feed);
+  // Like counts of the loaded posts (the server follows at most 200), and the leaderboard, pushed by the server
+  const live = useLiveUpdates(posts.slice(0, 200).map((post) => post.id));
 
   if (isLoading) {
     return (
@@ -50,17 +60,17 @@ const FeedPage = () => {
       <div className="flex items-center justify-between mb-6">
         <h1 className="text-2xl font-bold text-gray-800">Community Feed</h1>
         <div className="text-sm text-gray-500">
-          {feed?.data?.length || 0} posts • Real-time updates
+          {posts.length} posts{live && ' • Real-time updates'}
         </div>
       </div>
 
       {/* Posts */}
       <div className="space-y-6">
-        {feed?.data?.map((post) => (
+        {posts.map((post) => (
           <PostCard key={post.id} post={post} />
         ))}
 
-        {(!feed?.data || feed.data.length === 0) && (
+        {posts.length === 0 && (
           <div className="card text-center py-12">
             <div className="w-16 h-16 bg-gradient-to-r from-blue-100 to-purple-100 rounded-full flex items-center justify-center mx-auto mb-4">
               <FaPlus className="w-8 h-8 text-blue-500" />
@@ -77,6 +87,19 @@ const FeedPage = () => {
         )}
       </div>
 
+      {hasNextPage && (
+        <div className="mt-6 text-center">
+          <button
+            onClick={() => fetchNextPage()}
+            disabled={isFetchingNextPage}
+            className="btn-primary inline-flex items-center space-x-2"
+          >
+            {isFetchingNextPage && <FaSpinner className="animate-spin" />}
+            <span>{isFetchingNextPage ? 'Loading...' : 'Load more posts'}</span>
+          </button>
+        </div>
+      )}
+
       {/* Create Post Modal */}
       <CreatePostModal />
     </div>
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+
+from backend.metrics import metrics
+
+
+class SingleFlightCache:
+    """
+    A cached value that at most one caller recomputes at a time.
+
+    On a miss the first caller takes a short-lived lock with ``cache.add``
+    (atomic on every Django backend) and recomputes; concurrent callers wait
+    for the fresh entry instead of all hitting the database. Entries carry
+    an ETag derived from their content so views can answer conditional
+    requests with 304 Not Modified. Lookups are counted under the ``metric``
+    counter (see backend/metrics.py) when one is given.
+    """
+    poll_interval = 0.02
+
+    def __init__(self, key, ttl, alias='default', lock_timeout=10, metric=None):
+        self.key = key
+        self.lock_key = f"{key}:lock"
+        self.ttl = ttl
+        self.alias = alias
+        self.lock_timeout = lock_timeout
+        self.metric = metric
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, compute):
+        """Return the cached ``{'data': ..., 'etag': ...}`` entry, computing it if needed"""
+        entry = self.cache.get(self.key)
+        if entry is not None:
+            self.count('hit')
+            return entry
+
+        # Waiting for another caller's result still counts as a miss
+        self.count('miss')
+        if self.cache.add(self.lock_key, 1, timeout=self.lock_timeout):
+            try:
+                return self.refresh(compute)
+            finally:
+                self.cache.delete(self.lock_key)
+
+        # Someone else is recomputing; wait for their result
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            entry = self.cache.get(self.key)
+            if entry is not None:
+                return entry
+        # The lock holder died or is too slow; compute without caching contention
+        return self.refresh(compute)
+
+    async def aget(self, acompute):
+        """get() for async views: ``acompute`` is a coroutine function and waiting never blocks the event loop"""
+        entry = await self.cache.aget(self.key)
+        if entry is not None:
+            self.count('hit')
+            return entry
+
+        self.count('miss')
+        if await self.cache.aadd(self.lock_key, 1, timeout=self.lock_timeout):
+            try:
+                return await self.arefresh(acompute)
+            finally:
+                await self.cache.adelete(self.lock_key)
+
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            entry = await self.cache.aget(self.key)
+            if entry is not None:
+                return entry
+        return await self.arefresh(acompute)
+
+    def refresh(self, compute):
+        entry = self.entry(compute())
+        self.cache.set(self.key, entry, self.ttl)
+        return entry
+
+    async def arefresh(self, acompute):
+        entry = self.entry(await acompute())
+        await self.cache.aset(self.key, entry, self.ttl)
+        return entry
+
+    @staticmethod
+    def entry(data):
+        body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+        return {'data': data, 'etag': hashlib.md5(body, usedforsecurity=False).hexdigest()}
+
+    def invalidate(self):
+        self.cache.delete(self.key)
+
+    def count(self, result):
+        if self.metric:
+            metrics.inc(self.metric, result=result)
+
+
+leaderboard_cache = SingleFlightCache(
+    'leaderboard:top5',
+    ttl=getattr(settings, 'LEADERBOARD_CACHE_TTL', 30),
+    alias=getattr(settings, 'LEADERBOARD_CACHE_ALIAS', 'default'),
+    metric='leaderboard_cache_requests_total',
+)
@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from feed.models import Like, Post, Comment
+from .models import KarmaBucket
+
+# (liked model, bucket counter field, karma per like)
+LIKE_KARMA = (
+    (Post, 'post_likes', 5),
+    (Comment, 'comment_likes', 1),
+)
+
+
+def leaderboard_window_start(now=None):
+    """First hourly bucket inside the 24h window (24 buckets including the current hour)"""
+    now = now or timezone.now()
+    return KarmaBucket.bucket_for(now) - timedelta(hours=23)
+
+
+def rebuild_ledger(since=None):
+    """
+    Recompute karma buckets from the Like table for every hour from ``since``
+    (default: the current leaderboard window) onwards.
+
+    Likes are grouped by the liked content's author and hour in one query per
+    content type; the affected buckets are then replaced in one transaction.
+    Returns the number of buckets written.
+    """
+    since = KarmaBucket.bucket_for(since or leaderboard_window_start())
+    buckets = {}
+    for model, counter, karma in LIKE_KARMA:
+        content_type = ContentType.objects.get_for_model(model)
+        rows = Like.objects.filter(
+            content_type=content_type, created_at__gte=since
+        ).annotate(
+            author_id=Subquery(model.objects.filter(pk=OuterRef('object_id')).values('author_id')[:1]),
+            bucket=TruncHour('created_at'),
+        ).order_by().values('author_id', 'bucket').annotate(likes=Count('id'))
+
+        for row in rows:
+            if row['author_id'] is None:
+                continue
+            bucket = buckets.setdefault(
+                (row['author_id'], row['bucket']),
+                KarmaBucket(user_id=row['author_id'], hour=row['bucket']),
+            )
+            setattr(bucket, counter, getattr(bucket, counter) + row['likes'])
+            bucket.karma += row['likes'] * karma
+
+    with transaction.atomic():
+        KarmaBucket.objects.filter(hour__gte=since).delete()
+        KarmaBucket.objects.bulk_create(buckets.values(), batch_size=1000)
+    return len(buckets)
+
+
+def prune_ledger(keep_hours=None, now=None):
+    """
+    Delete buckets older than the leaderboard window plus ``keep_hours``
+    (default: the KARMA_BUCKET_MARGIN_HOURS setting). The leaderboard never
+    reads them, and rebuild_ledger can recreate them from the Like table.
+    Returns the number of buckets deleted.
+    """
+    if keep_hours is None:
+        keep_hours = getattr(settings, 'KARMA_BUCKET_MARGIN_HOURS', 24)
+    cutoff = leaderboard_window_start(now) - timedelta(hours=keep_hours)
+    return KarmaBucket.objects.filter(hour__lt=cutoff).delete()[0]
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from leaderboard.ledger import prune_ledger
+
+
+class Command(BaseCommand):
+    help = 'Delete hourly karma buckets that fell out of the 24h leaderboard window (plus a margin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--margin-hours', type=int, default=None,
+                            help='Hours of buckets to keep before the window (default: KARMA_BUCKET_MARGIN_HOURS)')
+
+    def handle(self, *args, **options):
+        deleted = prune_ledger(options['margin_hours'])
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} karma buckets"))
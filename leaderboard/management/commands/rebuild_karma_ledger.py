@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from leaderboard.ledger import rebuild_ledger
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly karma buckets behind the leaderboard from the Like table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24,
+                            help='How many hours back to rebuild (default: 24)')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options['hours'])
+        written = rebuild_ledger(since)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} karma buckets"))
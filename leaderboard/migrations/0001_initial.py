@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KarmaBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('karma', models.IntegerField(default=0)),
+                ('post_likes', models.IntegerField(default=0)),
+                ('comment_likes', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='karma_buckets', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour', 'user'], name='leaderboard_hour_ed25f0_idx')],
+                'unique_together': {('user', 'hour')},
+            },
+        ),
+    ]
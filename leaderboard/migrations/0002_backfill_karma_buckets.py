@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+
+def backfill_karma_buckets(apps, schema_editor):
+    """Seed the current 24h window from existing likes"""
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Like = apps.get_model('feed', 'Like')
+    KarmaBucket = apps.get_model('leaderboard', 'KarmaBucket')
+
+    since = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=23)
+    buckets = {}
+    for model_name, counter, karma in (('post', 'post_likes', 5), ('comment', 'comment_likes', 1)):
+        content_type = ContentType.objects.filter(app_label='feed', model=model_name).first()
+        if content_type is None:
+            continue
+        model = apps.get_model('feed', model_name)
+        rows = Like.objects.filter(
+            content_type=content_type, created_at__gte=since
+        ).annotate(
+            author_id=Subquery(model.objects.filter(pk=OuterRef('object_id')).values('author_id')[:1]),
+            bucket=TruncHour('created_at'),
+        ).order_by().values('author_id', 'bucket').annotate(likes=Count('id'))
+        for row in rows:
+            if row['author_id'] is None:
+                continue
+            bucket = buckets.setdefault(
+                (row['author_id'], row['bucket']),
+                KarmaBucket(user_id=row['author_id'], hour=row['bucket']),
+            )
+            setattr(bucket, counter, getattr(bucket, counter) + row['likes'])
+            bucket.karma += row['likes'] * karma
+    KarmaBucket.objects.bulk_create(buckets.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('feed', '0004_denormalized_counters'),
+        ('leaderboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_karma_buckets, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,53 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.contrib.auth.models import User
 
-# Create your models here.
+
+class KarmaBucket(models.Model):
+    """
+    Karma earned by one author within one clock hour.
+
+    The like/unlike paths adjust the bucket of the hour the like was created
+    in, so the 24h leaderboard only has to sum at most 24 small rows per
+    author instead of scanning every recent Like.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='karma_buckets')
+    hour = models.DateTimeField()
+    karma = models.IntegerField(default=0)
+    post_likes = models.IntegerField(default=0)
+    comment_likes = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['user', 'hour']
+        indexes = [
+            models.Index(fields=['hour', 'user']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} @ {self.hour:%Y-%m-%d %H:00}: {self.karma}"
+    
+    @staticmethod
+    def bucket_for(moment):
+        """Truncate a datetime to the start of its hour"""
+        return moment.replace(minute=0, second=0, microsecond=0)
+    
+    @classmethod
+    def record(cls, user_id, moment, karma, post_likes=0, comment_likes=0):
+        """Atomically add to the author's bucket for the hour containing ``moment``"""
+        hour = cls.bucket_for(moment)
+        changes = {
+            'karma': F('karma') + karma,
+            'post_likes': F('post_likes') + post_likes,
+            'comment_likes': F('comment_likes') + comment_likes,
+        }
+        if cls.objects.filter(user_id=user_id, hour=hour).update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    user_id=user_id, hour=hour, karma=karma,
+                    post_likes=post_likes, comment_likes=comment_likes,
+                )
+        except IntegrityError:
+            # Another request created the bucket first
+            cls.objects.filter(user_id=user_id, hour=hour).update(**changes)
@@ -1,3 +1,122 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from feed.models import Post, Comment, Like
+from users.models import UserProfile
+from .ledger import prune_ledger, rebuild_ledger
+from .models import KarmaBucket
+from .views import LeaderboardView
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class LeaderboardTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.fan = User.objects.create_user(username='fan', password='pass12345')
+        for user in (self.author, self.fan):
+            UserProfile.objects.create(user=user)
+        self.post = Post.objects.create(author=self.author, content='post')
+        self.comment = Comment.objects.create(post=self.post, author=self.author, content='comment')
+
+    def test_karma_is_credited_to_the_author(self):
+        Like.objects.create(user=self.fan, content_object=self.post)
+        Like.objects.create(user=self.fan, content_object=self.comment)
+
+        response = self.client.get('/api/leaderboard/')
+
+        self.assertEqual(response.data, [{
+            'user_id': self.author.id,
+            'username': 'author',
+            'daily_karma': 6,
+            'post_likes_24h': 1,
+            'comment_likes_24h': 1,
+        }])
+
+    def test_unlike_removes_karma_from_the_bucket(self):
+        like = Like.objects.create(user=self.fan, content_object=self.post)
+        like.delete()
+
+        self.assertEqual(KarmaBucket.objects.get(user=self.author).karma, 0)
+        self.assertEqual(self.client.get('/api/leaderboard/').data, [])
+
+    def test_old_buckets_fall_out_of_the_window(self):
+        KarmaBucket.record(self.author.id, timezone.now() - timedelta(hours=30), 50, post_likes=10)
+        self.assertEqual(self.client.get('/api/leaderboard/').data, [])
+
+    def test_buckets_past_the_window_and_margin_are_pruned(self):
+        now = timezone.now()
+        for hours_ago in (0, 23, 30, 47, 49, 200):
+            KarmaBucket.record(self.author.id, now - timedelta(hours=hours_ago), 5, post_likes=1)
+        out = StringIO()
+        call_command('prune_karma_buckets', stdout=out)
+        self.assertIn('Pruned 2 karma buckets', out.getvalue())
+        self.assertEqual(KarmaBucket.objects.count(), 4)
+        self.assertEqual(prune_ledger(keep_hours=0, now=now), 2)
+        self.assertEqual(self.client.get('/api/leaderboard/').data[0]['daily_karma'], 10)
+
+    def test_rebuild_ledger_matches_incremental_updates(self):
+        Like.objects.create(user=self.fan, content_object=self.post)
+        Like.objects.create(user=self.author, content_object=self.comment)
+        incremental = list(KarmaBucket.objects.values_list('user_id', 'hour', 'karma', 'post_likes', 'comment_likes'))
+
+        rebuild_ledger()
+
+        rebuilt = list(KarmaBucket.objects.values_list('user_id', 'hour', 'karma', 'post_likes', 'comment_likes'))
+        self.assertEqual(rebuilt, incremental)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class LeaderboardCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+    def slow_compute(self):
+        with self.calls_lock:
+            self.calls += 1
+        time.sleep(0.2)
+        return [{'user_id': 1, 'username': 'author', 'daily_karma': 5,
+                 'post_likes_24h': 1, 'comment_likes_24h': 0}]
+
+    def test_concurrent_misses_compute_once(self):
+        responses = []
+        barrier = threading.Barrier(12)
+
+        def fetch():
+            barrier.wait()
+            responses.append(self.client.get('/api/leaderboard/'))
+
+        with mock.patch.object(LeaderboardView, 'compute_leaderboard', lambda view: self.slow_compute()):
+            threads = [threading.Thread(target=fetch) for _ in range(12)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual({r.status_code for r in responses}, {200})
+        self.assertEqual(len({r['ETag'] for r in responses}), 1)
+
+    def test_matching_etag_returns_not_modified(self):
+        with mock.patch.object(LeaderboardView, 'compute_leaderboard', lambda view: self.slow_compute()):
+            first = self.client.get('/api/leaderboard/')
+            second = self.client.get('/api/leaderboard/', HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(self.calls, 1)
@@ -1,78 +1,115 @@
+import logging
+
+from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.utils import timezone
-from django.db.models import Count, Q, Sum, Case, When, IntegerField
-from datetime import timedelta
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.utils.http import parse_etags, quote_etag
+from django.views import View
+
+from backend.replicas import ReplicaReadsMixin, replica_reads, use_replica
+from feed.streaming import dumps
+from .cache import leaderboard_cache
+from .ledger import leaderboard_window_start
+from .models import KarmaBucket
+
+logger = logging.getLogger(__name__)
+
+
+def leaderboard_rows():
+    """
+    Sum at most 24 hourly buckets per author with a single indexed query
+    """
+    return KarmaBucket.objects.filter(
+        hour__gte=leaderboard_window_start()
+    ).values(
+        'user__id',
+        'user__username'
+    ).annotate(
+        post_likes=Sum('post_likes'),
+        comment_likes=Sum('comment_likes'),
+        daily_karma=Sum('karma'),
+    ).filter(
+        daily_karma__gt=0
+    ).order_by('-daily_karma', 'user__id')[:5]
+
+
+def format_leaderboard(rows):
+    result = []
+    for item in rows:
+        result.append({
+            'user_id': item['user__id'],
+            'username': item['user__username'],
+            'daily_karma': item['daily_karma'] or 0,
+            'post_likes_24h': item['post_likes'] or 0,
+            'comment_likes_24h': item['comment_likes'] or 0,
+        })
+    return result
+
+
+def not_modified(request, etag):
+    return etag in parse_etags(request.headers.get('If-None-Match', ''))
+
 
+def set_cache_headers(response, etag):
+    response['ETag'] = etag
+    # Let clients keep their copy but revalidate it on every poll
+    response['Cache-Control'] = 'no-cache'
+    return response
 
-class LeaderboardView(APIView):
+
+class LeaderboardView(ReplicaReadsMixin, APIView):
     """
     Dynamic leaderboard showing top 5 users by karma earned in last 24 hours
-    Calculates karma on-the-fly without storing daily karma
+    Reads the hourly karma buckets maintained by the like/unlike paths
     Post like = 5 karma, Comment like = 1 karma
+    Results are cached briefly and served with an ETag for conditional polling
+    Recomputations read from the read replica when one is configured
     """
-    
+    cache = leaderboard_cache
+
     def get(self, request):
-        """
-        Calculate leaderboard with a single optimized query
-        """
         try:
-            # Calculate time threshold (24 hours ago)
-            time_threshold = timezone.now() - timedelta(hours=24)
-            
-            # Import models inside function
-            from feed.models import Like
-            from django.contrib.contenttypes.models import ContentType
-            from feed.models import Post, Comment
-            
-            # Get content types for filtering
-            post_content_type = ContentType.objects.get_for_model(Post)
-            comment_content_type = ContentType.objects.get_for_model(Comment)
-            
-            # Single optimized query for leaderboard
-            leaderboard_data = Like.objects.filter(
-                created_at__gte=time_threshold
-            ).values(
-                'user__id', 
-                'user__username'
-            ).annotate(
-                post_likes=Count(
-                    'id',
-                    filter=Q(content_type=post_content_type)
-                ),
-                comment_likes=Count(
-                    'id',
-                    filter=Q(content_type=comment_content_type)
-                ),
-                daily_karma=Sum(
-                    Case(
-                        When(content_type=post_content_type, then=5),
-                        When(content_type=comment_content_type, then=1),
-                        default=0,
-                        output_field=IntegerField()
-                    )
-                )
-            ).filter(
-                Q(post_likes__gt=0) | Q(comment_likes__gt=0)
-            ).order_by('-daily_karma')[:5]
-            
-            # Format response
-            result = []
-            for item in leaderboard_data:
-                result.append({
-                    'user_id': item['user__id'],
-                    'username': item['user__username'],
-                    'daily_karma': item['daily_karma'] or 0,
-                    'post_likes_24h': item['post_likes'] or 0,
-                    'comment_likes_24h': item['comment_likes'] or 0,
-                })
-            
-            return Response(result)
-            
-        except Exception as e:
-            # Log error for debugging
-            import traceback
-            print(f"Leaderboard error: {e}")
-            print(traceback.format_exc())
+            entry = self.cache.get(self.compute_leaderboard)
+        except Exception:
+            logger.exception('Leaderboard error')
             # Return empty array on error
-            return Response([])
\ No newline at end of file
+            return Response([])
+
+        etag = quote_etag(entry['etag'])
+        if not_modified(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(entry['data'])
+        return set_cache_headers(response, etag)
+
+    def compute_leaderboard(self):
+        return format_leaderboard(leaderboard_rows())
+
+
+class AsyncLeaderboardView(View):
+    """
+    LeaderboardView for ASGI servers: same JSON, ETag and cache, but the
+    cache lookup and the bucket query run on the async ORM and cache API,
+    so a worker keeps serving other requests while they wait.
+    """
+    cache = leaderboard_cache
+
+    async def get(self, request):
+        try:
+            with replica_reads(use_replica(request)):
+                entry = await self.cache.aget(self.compute_leaderboard)
+        except Exception:
+            logger.exception('Leaderboard error')
+            return HttpResponse(dumps([]), content_type='application/json')
+
+        etag = quote_etag(entry['etag'])
+        if not_modified(request, etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(dumps(entry['data']), content_type='application/json')
+        return set_cache_headers(response, etag)
+
+    async def compute_leaderboard(self):
+        return format_leaderboard([row async for row in leaderboard_rows()])
@@ -0,0 +1,136 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from feed.events import KARMA_PER_LIKE
+from feed.models import LikeEvent
+from feed.streaming import chunked
+from .models import UserProfile
+
+PROCESSED = Q(processed_at__isnull=False)
+PENDING = Q(processed_at__isnull=True)
+
+
+def karma_from_likes():
+    """
+    Karma every author should have according to the Like table.
+
+    One grouped query per liked model joins the likes to their posts or
+    comments and counts them per author.
+    """
+    expected = defaultdict(int)
+    for model, karma in KARMA_PER_LIKE.items():
+        rows = model.objects.values('author_id').annotate(likes=Count('likes')).filter(likes__gt=0)
+        for row in rows:
+            expected[row['author_id']] += row['likes'] * karma
+    return expected
+
+
+def karma_from_events():
+    """``{author_id: (processed karma, pending karma)}`` of the like event ledger, in one grouped query"""
+    rows = LikeEvent.objects.order_by().values('author_id').annotate(
+        processed=Coalesce(Sum('karma', filter=PROCESSED), 0),
+        pending=Coalesce(Sum('karma', filter=PENDING), 0),
+    )
+    return {row['author_id']: (row['processed'], row['pending']) for row in rows}
+
+
+def compare_karma():
+    """
+    Compare the Like table, the processed like events and the stored
+    karma of every author.
+
+    Returns ``(drift, ledger_drifted)``. ``drift`` lists
+    ``(user_id, profile_id, stored, expected)`` for every profile whose
+    stored karma or processed events differ from what the likes imply,
+    plus authors without a profile (``profile_id`` and ``stored`` None) who
+    should have karma. Karma of events still queued for the worker is left
+    out of ``expected``, since total_karma only includes it once they are
+    applied. ``ledger_drifted`` holds the authors whose events need a
+    correction.
+    """
+    expected = karma_from_likes()
+    ledger = karma_from_events()
+    ledger_drifted = set()
+    for author_id in expected.keys() | ledger.keys():
+        processed, pending = ledger.get(author_id, (0, 0))
+        expected[author_id] -= pending
+        if processed != expected[author_id]:
+            ledger_drifted.add(author_id)
+
+    drift = []
+    for profile_id, user_id, stored in UserProfile.objects.values_list('id', 'user_id', 'total_karma').iterator():
+        should = expected.pop(user_id, 0)
+        if stored != should or user_id in ledger_drifted:
+            drift.append((user_id, profile_id, stored, should))
+    drift.extend((user_id, None, None, should) for user_id, should in expected.items() if should)
+    return drift, ledger_drifted
+
+
+def karma_drift():
+    """The ``drift`` half of compare_karma()"""
+    return compare_karma()[0]
+
+
+def ledger_corrections(author_ids):
+    """
+    Processed LikeEvents that make the events of ``author_ids`` add up to
+    their likes again: one per post or comment whose processed events
+    differ from its likes minus its queued events.
+    """
+    content_types = ContentType.objects.get_for_models(*KARMA_PER_LIKE)
+    karma_per_type = {content_types[model].id: karma for model, karma in KARMA_PER_LIKE.items()}
+
+    # (content_type_id, object_id) -> [author_id, likes, processed, pending]
+    objects = {}
+    for model in KARMA_PER_LIKE:
+        rows = model.objects.filter(author_id__in=author_ids).annotate(like_rows=Count('likes'))
+        for object_id, author_id, likes in rows.filter(like_rows__gt=0).values_list('id', 'author_id', 'like_rows'):
+            objects[content_types[model].id, object_id] = [author_id, likes, 0, 0]
+    rows = LikeEvent.objects.filter(author_id__in=author_ids).order_by().values(
+        'content_type_id', 'object_id', 'author_id',
+    ).annotate(
+        processed=Coalesce(Sum('delta', filter=PROCESSED), 0),
+        pending=Coalesce(Sum('delta', filter=PENDING), 0),
+    )
+    for row in rows:
+        entry = objects.setdefault((row['content_type_id'], row['object_id']), [row['author_id'], 0, 0, 0])
+        entry[2:] = row['processed'], row['pending']
+
+    now = timezone.now()
+    corrections = []
+    for (content_type_id, object_id), (author_id, likes, processed, pending) in objects.items():
+        delta = likes - pending - processed
+        if delta:
+            corrections.append(LikeEvent(
+                author_id=author_id, content_type_id=content_type_id, object_id=object_id,
+                delta=delta, karma=delta * karma_per_type[content_type_id], liked_at=now, processed_at=now,
+            ))
+    return corrections
+
+
+def recompute_karma(batch_size=1000):
+    """
+    Fix the drift compare_karma() finds. total_karma is the sum of processed
+    events (see UserProfile.rebuild_karma), so authors whose events
+    drifted first get corrective events. Then drifted profiles are written
+    with batched bulk_update and missing ones created with bulk_create.
+    Returns the drift that was fixed.
+    """
+    drift, ledger_drifted = compare_karma()
+    for author_ids in chunked(sorted(ledger_drifted), batch_size):
+        LikeEvent.objects.bulk_create(ledger_corrections(author_ids), batch_size=batch_size)
+    UserProfile.objects.bulk_update(
+        [UserProfile(id=profile_id, total_karma=should) for _, profile_id, _, should in drift if profile_id],
+        ['total_karma'],
+        batch_size=batch_size,
+    )
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=user_id, total_karma=should) for user_id, profile_id, _, should in drift if not profile_id],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+    return drift
@@ -0,0 +1,43 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from users.karma import karma_drift, recompute_karma
+
+
+class Command(BaseCommand):
+    help = (
+        "Check every author's like events and total karma against the Like table with grouped "
+        "queries; write corrective events for drifted authors and fix profiles in batched updates. "
+        "With --verify, only report drift (and exit non-zero if there is any)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Report drift without writing')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Profiles per bulk UPDATE')
+        parser.add_argument('--show', type=int, default=20, help='How many drifted users to list')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options['verify']:
+            drift = karma_drift()
+        else:
+            with transaction.atomic():
+                drift = recompute_karma(options['batch_size'])
+        elapsed = time.perf_counter() - start
+
+        shown = drift[:options['show']]
+        usernames = dict(User.objects.filter(id__in=[row[0] for row in shown]).values_list('id', 'username'))
+        for user_id, _, stored, expected in shown:
+            self.stdout.write(f"  {usernames.get(user_id, user_id)}: stored {stored}, expected {expected}")
+        if len(drift) > len(shown):
+            self.stdout.write(f"  ... and {len(drift) - len(shown)} more")
+
+        if options['verify']:
+            if drift:
+                raise CommandError(f"{len(drift)} profiles have drifted karma ({elapsed:.2f}s)")
+            self.stdout.write(self.style.SUCCESS(f"All karma consistent ({elapsed:.2f}s)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Corrected karma of {len(drift)} users in {elapsed:.2f}s"))
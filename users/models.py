@@ -1,8 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models import Count
-from django.contrib.contenttypes.models import ContentType
-from feed.models import Like, Post, Comment
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from feed.models import LikeEvent
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -13,22 +13,35 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.username}'s Profile"
     
+    @classmethod
+    def adjust_karma(cls, user_id, delta):
+        """Atomically add ``delta`` to a user's karma, creating the profile if needed"""
+        if not cls.objects.filter(user_id=user_id).update(total_karma=F('total_karma') + delta):
+            cls.objects.get_or_create(user_id=user_id)
+            cls.objects.filter(user_id=user_id).update(total_karma=F('total_karma') + delta)
+    
     def update_total_karma(self):
-        """Update total karma from all likes"""
-        # Calculate post karma (5 points per like)
-        post_content_type = ContentType.objects.get_for_model(Post)
-        post_likes_count = Like.objects.filter(
-            content_type=post_content_type,
-            object_id__in=self.user.posts.values_list('id', flat=True)
-        ).count()
-        
-        # Calculate comment karma (1 point per like)
-        comment_content_type = ContentType.objects.get_for_model(Comment)
-        comment_likes_count = Like.objects.filter(
-            content_type=comment_content_type,
-            object_id__in=self.user.comments.values_list('id', flat=True)
-        ).count()
-        
-        self.total_karma = (post_likes_count * 5) + comment_likes_count
-        self.save()
-        return self.total_karma
\ No newline at end of file
+        """
+        Reconcile total karma with the processed like events for this user.
+        Pending events are left to the worker, which will add them on top.
+        compact_like_events keeps this to about one row per liked object.
+        """
+        self.total_karma = LikeEvent.objects.filter(
+            author=self.user, processed_at__isnull=False
+        ).aggregate(total=Sum('karma'))['total'] or 0
+        self.save(update_fields=['total_karma', 'updated_at'])
+        return self.total_karma
+    
+    @classmethod
+    def rebuild_karma(cls, user_ids=None):
+        """
+        update_total_karma for every profile (or those of ``user_ids``) in a
+        single UPDATE. Returns the number of profiles rewritten.
+        """
+        totals = LikeEvent.objects.filter(
+            author_id=OuterRef('user_id'), processed_at__isnull=False
+        ).order_by().values('author_id').annotate(total=Sum('karma')).values('total')
+        profiles = cls.objects.all()
+        if user_ids is not None:
+            profiles = profiles.filter(user_id__in=user_ids)
+        return profiles.update(total_karma=Coalesce(Subquery(totals[:1]), Value(0)))
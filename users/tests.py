@@ -1,3 +1,71 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from feed.models import Post, Comment, Like, LikeEvent
+from .karma import karma_drift
+from .models import UserProfile
+
+
+class RecomputeKarmaTests(TestCase):
+
+    def setUp(self):
+        self.authors = [User.objects.create_user(username=f'author{i}') for i in range(3)]
+        fans = [User.objects.create_user(username=f'fan{i}') for i in range(4)]
+        for i, author in enumerate(self.authors):
+            post = Post.objects.create(author=author, content='post')
+            comment = Comment.objects.create(post=post, author=author, content='comment')
+            for fan in fans[:i + 1]:
+                Like.objects.create(user=fan, content_object=post)
+                Like.objects.create(user=fan, content_object=comment)
+        # Karma as the like path kept it: 6 per fan
+        self.expected = {author.id: 6 * (i + 1) for i, author in enumerate(self.authors)}
+
+    def karma(self):
+        return dict(UserProfile.objects.filter(user__in=self.authors).values_list('user_id', 'total_karma'))
+
+    def test_verify_passes_when_consistent(self):
+        self.assertEqual(self.karma(), self.expected)
+        self.assertEqual(karma_drift(), [])
+        out = StringIO()
+        call_command('recompute_karma', '--verify', stdout=out)
+        self.assertIn('consistent', out.getvalue())
+
+    def test_drift_is_reported_then_fixed_in_bulk(self):
+        UserProfile.objects.filter(user=self.authors[0]).update(total_karma=999)
+        UserProfile.objects.filter(user=self.authors[1]).delete()
+
+        with self.assertRaises(CommandError):
+            call_command('recompute_karma', '--verify', stdout=StringIO())
+        self.assertEqual(self.karma()[self.authors[0].id], 999)
+
+        events = LikeEvent.objects.count()
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('recompute_karma', stdout=StringIO())
+        self.assertEqual(self.karma(), self.expected)
+        self.assertLessEqual(len(ctx.captured_queries), 10)
+        # The events were right, so there was nothing to drill into or correct
+        self.assertEqual(LikeEvent.objects.count(), events)
+
+    def test_event_drift_is_fixed_with_corrective_events(self):
+        # Profiles still agree with the likes, but rebuilding them from the events would not
+        author = self.authors[2]
+        LikeEvent.objects.filter(author=author, content_type__model='post').delete()
+        self.assertEqual(len(karma_drift()), 1)
+
+        call_command('recompute_karma', stdout=StringIO())
+        self.assertEqual(karma_drift(), [])
+        UserProfile.rebuild_karma()
+        self.assertEqual(self.karma(), self.expected)
+        correction = LikeEvent.objects.get(author=author, content_type__model='post')
+        self.assertEqual((correction.delta, correction.karma), (3, 15))
+        self.assertIsNotNone(correction.processed_at)
+
+    @override_settings(LIKE_EVENTS_ASYNC=True)
+    def test_queued_events_are_not_drift(self):
+        Like.objects.create(user=self.authors[1], content_object=Post.objects.get(author=self.authors[0]))
+        self.assertEqual(karma_drift(), [])